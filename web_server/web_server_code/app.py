@@ -1,485 +1,223 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
-import json
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import AbstractSet, Any, Callable, Dict, Iterator, List, Optional
+import json
+import logging
+import time
 import config
+from event_log import log_event
+import http_cache
+import live_tail
+import metrics
+import serializer
+from log_reader import TailReader
+from log_source import checkpoint_stats, compression_of
+from log_stats import get_log_stats
+from log_window import LogWindow
+from frame_cache import OPTIONAL_FIELDS, build_log_entries, frame_cache, parse_log_lines
+from projection import Projection, dictionary, parse_fields
+from frame_store import frame_store_stats, get_frame_store
+from frame_query import QueryError, run_query, where_from_args
+from frame_export import EXPORT_FORMATS, FrameExport, export_formats, export_path
+from timeseries import DOWNSAMPLE_METHODS, downsample, extract_series, series_summary
+from sequence_analyzer import EVENT_KINDS, get_sequence_analysis
+from log_correlation import correlate_logs, find_peer_log
+from file_catalog import catalog_stats, format_file_size, get_catalog
+import search_index
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify 等使用 serializer 的 JSON 后端（调试模式下的缩进输出仍由标准库完成）"""
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs.keys() - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        with metrics.timed(metrics.STAGE_SECONDS, 'serialize'):
+            return serializer.dumps(obj, default=self.default)
+    
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return serializer.loads(s)
+
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app, origins=config.CORS_ORIGINS)
 
-# IEC104 帧类型定义
-IEC104_FRAME_TYPES = {
-    'I': 'I帧(信息传输)',
-    'S': 'S帧(监视)',
-    'U': 'U帧(控制)',
-}
-
-# IEC104 U帧功能
-U_FRAME_FUNCTIONS = {
-    0x07: 'STARTDT act',
-    0x0B: 'STARTDT con',
-    0x13: 'STOPDT act',
-    0x23: 'STOPDT con',
-    0x43: 'TESTFR act',
-    0x83: 'TESTFR con'
-}
-
-# IEC104 类型标识
-TYPE_IDENTIFICATION = {
-    0x01: 'M_SP_NA_1 单点信息',
-    0x03: 'M_DP_NA_1 双点信息',
-    0x09: 'M_ME_NA_1 测量值,归一化值',
-    0x0B: 'M_ME_TB_1 测量值,标度化值,带时标',
-    0x0D: 'M_ME_NC_1 测量值,短浮点数',
-    0x0F: 'M_IT_NA_1 累计量',
-    0x1E: 'M_SP_TB_1 带时标的单点信息',
-    0x1F: 'M_DP_TB_1 带时标的双点信息',
-    0x24: 'M_ME_TF_1 带时标的测量值,短浮点数',
-    0x2D: 'C_SC_NA_1 单命令',
-    0x2E: 'C_DC_NA_1 双命令',
-    0x2F: 'C_RC_NA_1 调节命令',
-    0x30: 'C_SE_NA_1 设定值命令,归一化值',
-    0x31: 'C_SE_NB_1 设定值命令,标度化值',
-    0x32: 'C_SE_NC_1 设定值命令,短浮点数',
-    0x64: 'C_IC_NA_1 总召唤命令',
-    0x65: 'C_CI_NA_1 电能脉冲召唤命令',
-    0x67: 'C_CS_NA_1 时钟同步命令',
-    0x68: 'C_TS_NA_1 测试命令',
-    0x69: 'C_RP_NA_1 复位进程命令',
-    0x6A: 'C_CD_NA_1 延时获得命令'
-}
-
-# 传输原因
-CAUSE_OF_TRANSMISSION = {
-    1: '周期循环',
-    2: '背景扫描',
-    3: '突发',
-    4: '初始化',
-    5: '被请求',
-    6: '激活',
-    7: '激活确认',
-    8: '停止激活',
-    9: '停止激活确认',
-    10: '激活终止',
-    11: '远程命令引起的返送信息',
-    12: '当地命令引起的返送信息',
-    13: '文件传输',
-    20: '响应总召唤',
-    21: '响应第1组召唤',
-    36: '响应计数量总召唤',
-    37: '响应第1组计数量召唤',
-    44: '未知类型标识',
-    45: '未知传送原因',
-    46: '未知公共地址',
-    47: '未知信息对象地址'
-}
-
-class IEC104FrameParser:
-    """IEC104帧解析器"""
-    
-    APCI_START = 0x68
-    MIN_FRAME_LENGTH = 6
-    ASDU_MIN_LENGTH = 12
-    
-    @staticmethod
-    def parse_hex_string(data_str: str) -> Optional[List[int]]:
-        """解析十六进制字符串为字节数组"""
-        try:
-            # 支持多种格式并去除首尾空格
-            data_str = data_str.strip()  # 添加这行
-            # 过滤空字符串
-            parts = [x for x in data_str.split() if x]  # 修改这行
-            return [int(x, 16) for x in parts]
-        except (ValueError, IndexError) as e:
-            print(f"十六进制解析错误: {e}")
-            return None
-    
-    @staticmethod
-    def parse_i_frame(bytes_data: List[int], frame_info: Dict[str, Any]) -> None:
-        """解析I帧"""
-        ctrl1, ctrl2, ctrl3, ctrl4 = bytes_data[2:6]
-        
-        frame_info['type'] = 'I'
-        frame_info['type_desc'] = IEC104_FRAME_TYPES['I']
-        frame_info['send_seq'] = ((ctrl1 & 0xFE) >> 1) | ((ctrl2 & 0xFF) << 7)
-        frame_info['recv_seq'] = ((ctrl3 & 0xFE) >> 1) | ((ctrl4 & 0xFF) << 7)
-        
-        # 解析ASDU
-        if len(bytes_data) >= IEC104FrameParser.ASDU_MIN_LENGTH:
-            IEC104FrameParser.parse_asdu(bytes_data, frame_info)
-    
-    @staticmethod
-    def parse_s_frame(bytes_data: List[int], frame_info: Dict[str, Any]) -> None:
-        """解析S帧"""
-        ctrl3, ctrl4 = bytes_data[4:6]
-        
-        frame_info['type'] = 'S'
-        frame_info['type_desc'] = IEC104_FRAME_TYPES['S']
-        frame_info['recv_seq'] = ((ctrl3 & 0xFE) >> 1) | ((ctrl4 & 0xFF) << 7)
-    
-    @staticmethod
-    def parse_u_frame(bytes_data: List[int], frame_info: Dict[str, Any]) -> None:
-        """解析U帧"""
-        ctrl1 = bytes_data[2]
-        
-        frame_info['type'] = 'U'
-        frame_info['type_desc'] = IEC104_FRAME_TYPES['U']
-        frame_info['function'] = U_FRAME_FUNCTIONS.get(ctrl1, f'未知功能(0x{ctrl1:02X})')
-    
-    @staticmethod
-    def parse_asdu(bytes_data: List[int], frame_info: Dict[str, Any]) -> None:
-        """解析ASDU（应用服务数据单元）"""
-        type_id = bytes_data[6]
-        vsq = bytes_data[7]
-        cause = bytes_data[8]
-        
-        frame_info['type_id'] = f'0x{type_id:02X}'
-        frame_info['type_id_desc'] = TYPE_IDENTIFICATION.get(type_id, '未知类型')
-        frame_info['sq'] = (vsq & 0x80) >> 7  # 顺序标志
-        frame_info['num_obj'] = vsq & 0x7F   # 信息对象数量
-        frame_info['cause'] = cause & 0x3F    # 传输原因（低6位）
-        frame_info['cause_desc'] = CAUSE_OF_TRANSMISSION.get(
-            cause & 0x3F, 
-            f'未知原因({cause & 0x3F})'
-        )
-        frame_info['test'] = (cause & 0x80) >> 7  # 测试标志
-        frame_info['pn'] = (cause & 0x40) >> 6     # 肯定/否定标志
-        
-        # ASDU地址（2字节）
-        if len(bytes_data) >= 12:
-            frame_info['asdu_addr'] = bytes_data[10] | (bytes_data[11] << 8)
-        
-        # 信息对象地址（如果有）
-        if len(bytes_data) >= 15:
-            frame_info['ioa'] = (bytes_data[12] | 
-                               (bytes_data[13] << 8) | 
-                               (bytes_data[14] << 16))
-            
-        # 尝试解析信息元素
-        if len(bytes_data) >= 16:
-            IEC104FrameParser.parse_information_elements(bytes_data, frame_info, type_id)
-    
-    @staticmethod
-    def parse_information_elements(bytes_data: List[int], frame_info: Dict[str, Any], type_id: int) -> None:
-        """解析信息元素"""
-        try:
-            if type_id == 0x64:  # 总召唤
-                if len(bytes_data) >= 16:
-                    qoi = bytes_data[15]
-                    frame_info['qoi'] = qoi
-                    frame_info['qoi_desc'] = '总召唤' if qoi == 20 else f'召唤{qoi}'
-            
-            elif type_id in [0x01, 0x1E]:  # 单点信息
-                if len(bytes_data) >= 16:
-                    siq = bytes_data[15]
-                    frame_info['value'] = siq & 0x01
-                    frame_info['quality'] = {
-                        'blocked': (siq & 0x10) >> 4,
-                        'substituted': (siq & 0x20) >> 5,
-                        'not_topical': (siq & 0x40) >> 6,
-                        'invalid': (siq & 0x80) >> 7
-                    }
-            
-            elif type_id in [0x0D, 0x24]:  # 短浮点数
-                if len(bytes_data) >= 19:
-                    import struct
-                    value_bytes = bytes(bytes_data[15:19])
-                    value = struct.unpack('<f', value_bytes)[0]
-                    frame_info['value'] = round(value, 4)
-                    if len(bytes_data) >= 20:
-                        qds = bytes_data[19]
-                        frame_info['quality'] = {
-                            'overflow': qds & 0x01,
-                            'blocked': (qds & 0x10) >> 4,
-                            'substituted': (qds & 0x20) >> 5,
-                            'not_topical': (qds & 0x40) >> 6,
-                            'invalid': (qds & 0x80) >> 7
-                        }
-        except Exception as e:
-            print(f"解析信息元素失败: {e}")
-    
-    @classmethod
-    def parse(cls, data_str: str) -> Dict[str, Any]:
-        """解析IEC104帧"""
-        if not data_str or not data_str.strip():
-            return {'type': 'INVALID', 'description': '空数据'}
-        
-        bytes_data = cls.parse_hex_string(data_str)
-        if bytes_data is None:
-            return {'type': 'INVALID', 'description': '十六进制格式错误'}
-        
-        if len(bytes_data) < cls.MIN_FRAME_LENGTH:
-            return {
-                'type': 'INVALID', 
-                'description': f'帧长度不足（需要至少{cls.MIN_FRAME_LENGTH}字节，实际{len(bytes_data)}字节）'
-            }
-        
-        # 检查启动字符
-        if bytes_data[0] != cls.APCI_START:
-            return {
-                'type': 'INVALID', 
-                'description': f'无效的启动字符: 0x{bytes_data[0]:02X} (期望 0x68)'
-            }
-        
-        # 获取APDU长度
-        apdu_len = bytes_data[1]
-        
-        # 验证实际长度
-        expected_len = apdu_len + 2  # APDU长度 + 启动字符 + 长度字节
-        if len(bytes_data) < expected_len:
-            print(f"警告: 实际长度({len(bytes_data)}) < 期望长度({expected_len})")
-        
-        ctrl1 = bytes_data[2]
-        
-        frame_info = {
-            'apdu_len': apdu_len,
-            'ctrl': ' '.join(f'{b:02X}' for b in bytes_data[2:6] if len(bytes_data) > 5),
-            'raw_bytes': ' '.join(f'{b:02X}' for b in bytes_data),
-            'byte_count': len(bytes_data)
-        }
-        
-        try:
-            # 判断帧类型
-            if (ctrl1 & 0x01) == 0:  # I帧
-                cls.parse_i_frame(bytes_data, frame_info)
-            elif (ctrl1 & 0x03) == 0x01:  # S帧
-                cls.parse_s_frame(bytes_data, frame_info)
-            elif (ctrl1 & 0x03) == 0x03:  # U帧
-                cls.parse_u_frame(bytes_data, frame_info)
-            else:
-                frame_info['type'] = 'UNKNOWN'
-                frame_info['description'] = f'未知帧类型: 0x{ctrl1:02X}'
-        
-        except Exception as e:
-            return {'type': 'ERROR', 'description': f'解析错误: {str(e)}'}
-        
-        return frame_info
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
 
-def parse_log_line_json(line: str) -> Optional[Dict[str, Any]]:
-    """解析JSON格式的日志行"""
-    try:
-        # 去除首尾空白字符
-        line = line.strip()
-        if not line:
-            return None
-            
-        log_data = json.loads(line)
-        
-        # 转换时间戳
-        timestamp_ms = log_data.get('time_ms', 0)
-        if timestamp_ms > 0:
-            timestamp = datetime.fromtimestamp(timestamp_ms / 1000)
-            timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-        else:
-            timestamp_str = 'N/A'
-        
-        # 解析方向
-        direction = log_data.get('dir', '')
-        if 'ser -> cli' in direction or 'server' in direction.lower():
-            dir_type = 'TX'
-            dir_desc = '服务端→客户端'
-        elif 'cli -> ser' in direction or 'client' in direction.lower():
-            dir_type = 'RX'
-            dir_desc = '客户端→服务端'
-        else:
-            dir_type = 'UNKNOWN'
-            dir_desc = direction or '未知方向'
-        
-        # 解析IEC104帧
-        data_hex = log_data.get('data', '').strip()
-        frame_info = IEC104FrameParser.parse(data_hex) if data_hex else {}
-        
-        return {
-            'timestamp': timestamp_str,
-            'timestamp_ms': timestamp_ms,
-            'direction': dir_type,
-            'direction_desc': dir_desc,
-            'length': log_data.get('len', len(data_hex.split()) if data_hex else 0),
-            'data': data_hex,
-            'frame_info': frame_info,
-            'raw': line
-        }
-    
-    except json.JSONDecodeError as e:
-        # 添加更详细的错误信息
-        print(f"JSON解析错误: {e}")
-        print(f"错误位置: 第{e.lineno}行, 第{e.colno}列")
-        print(f"问题行内容: {line[:100]}...")  # 只显示前100个字符
-        return None
-    except Exception as e:
-        print(f"解析日志行失败: {e}, 行内容: {line[:100]}")
-        return None
 
-def parse_iec104_log_file(filepath: str, tail_lines: Optional[int] = None, 
-                          filter_type: Optional[str] = None) -> List[Dict[str, Any]]:
-    """解析IEC104 JSON格式日志文件"""
+@app.after_request
+def record_request_metrics(response):
+    """按路由模板记录请求耗时（流式响应只计到开始发送）"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint,
+                                             request.method, str(response.status_code))
+    return response
+
+
+app.after_request(http_cache.compress_response)  # 在记录耗时之前执行，耗时包含压缩
+
+
+def parse_iec104_log_file(window: LogWindow) -> List[Dict[str, Any]]:
+    """解析IEC104 JSON格式日志文件（尾部）"""
     logs = []
+    filepath = window.filepath
     
     if not os.path.exists(filepath):
-        print(f"文件不存在: {filepath}")
+        log_event('log_file_missing', path=filepath)
         return logs
     
     # 检查文件大小
     file_size = os.path.getsize(filepath)
     if file_size > config.MAX_FILE_SIZE:
-        print(f"警告: 文件过大 ({format_file_size(file_size)}), 可能影响性能")
+        log_event('log_file_too_large', path=filepath, size=file_size, limit=config.MAX_FILE_SIZE)
     
     try:
-        with open(filepath, 'r', encoding=config.LOG_ENCODING, errors='ignore') as f:
-            lines = f.readlines()
-            
-            # 确定要读取的行数
-            if tail_lines and tail_lines > 0:
-                lines = lines[-min(tail_lines, len(lines)):]
-            else:
-                max_lines = config.MAX_LOG_LINES
-                lines = lines[-min(max_lines, len(lines)):]
-            
-            # 添加原始行号跟踪
-            for original_line_num, (line_num, line) in enumerate(enumerate(lines, 1), 1):
-                line = line.strip()
-                if not line:
-                    continue
-                
-                log_entry = parse_log_line_json(line)
-                if log_entry:
-                    # 应用过滤器
-                    if filter_type:
-                        frame_type = log_entry.get('frame_info', {}).get('type', '')
-                        if frame_type != filter_type:
-                            continue
-                    
-                    log_entry['line_num'] = line_num
-                    log_entry['file_line_num'] = original_line_num  # 添加文件中的实际行号
-                    logs.append(log_entry)
-                else:
-                    # 记录解析失败的行号
-                    print(f"行 {original_line_num} 解析失败")
-    
+        logs = list(window)
     except Exception as e:
-        print(f"读取日志文件失败 {filepath}: {e}")
+        log_event('log_read_failed', logging.ERROR, path=filepath, error=str(e))
     # logs.sort(key=lambda x: x.get('timestamp_ms', 0), reverse=True)
     return logs
 
-def parse_iec104_log_file_incremental(filepath: str, last_position: int = 0) -> Dict[str, Any]:
-    """增量读取日志文件（只读取新增部分）"""
-    logs = []
-    new_position = last_position
+
+def stream_log_window(window: LogWindow, file_info: Dict[str, Any], fmt: str) -> Iterator[str]:
+    """边读边输出日志条目
+    
+    ndjson: 首行 {"file_info": ...}，随后每行一个日志条目，末行 {"done": true, "total_lines": N, "position": ...}
+    （position 在读取后才确定，放在末行）；
+    json: 与非流式响应结构相同的 JSON 对象，logs 数组逐条输出，file_info/pagination 放在数组之后。
+    读取中途出错时，ndjson 末行为 {"done": true, "success": false, "error": ...}。
+    序列化耗时逐条累加，输出结束后记为一次 serialize 阶段耗时。
+    """
+    clock = time.perf_counter
+    elapsed = 0.0
     
+    def dumps(obj: Any) -> str:
+        nonlocal elapsed
+        start = clock()
+        text = serializer.dumps(obj)
+        elapsed += clock() - start
+        return text
+    
+    try:
+        yield from _stream_log_window(window, file_info, fmt, dumps)
+    finally:
+        metrics.STAGE_SECONDS.observe(elapsed, 'serialize')
+
+
+def _stream_log_window(window: LogWindow, file_info: Dict[str, Any], fmt: str,
+                       dumps: Callable[[Any], str]) -> Iterator[str]:
+    error = None
+    if fmt == 'ndjson':
+        yield dumps({'file_info': file_info}) + '\n'
+        try:
+            for entry in window:
+                yield dumps(entry) + '\n'
+        except Exception as e:
+            log_event('log_stream_failed', logging.ERROR, path=window.filepath, error=str(e))
+            error = str(e)
+        trailer: Dict[str, Any] = {'done': True, 'success': error is None, 'total_lines': window.count,
+                                   'position': window.position}
+        if error is not None:
+            trailer['error'] = error
+        if window.pagination is not None:
+            trailer['pagination'] = window.pagination
+        yield dumps(trailer) + '\n'
+        return
+    
+    yield '{"success":true,"logs":['
+    separator = ''
+    try:
+        for entry in window:
+            yield separator + dumps(entry)
+            separator = ','
+    except Exception as e:
+        log_event('log_stream_failed', logging.ERROR, path=window.filepath, error=str(e))
+        error = str(e)
+    file_info = dict(file_info, total_lines=window.count, position=window.position)
+    tail = ']' + ',"file_info":' + dumps(file_info)
+    if window.pagination is not None:
+        tail += ',"pagination":' + dumps(window.pagination)
+    if error is not None:
+        tail += ',"error":' + dumps(error)
+    yield tail + '}'
+
+
+def parse_iec104_log_file_incremental(filepath: str, last_position: int = 0,
+                                      inode: Optional[int] = None,
+                                      exclude: AbstractSet[str] = frozenset(),
+                                      projection: Optional[Projection] = None,
+                                      since_ms: int = 0) -> Dict[str, Any]:
+    """增量读取日志文件（只读取新增的完整行，单次读取量有上限）
+    
+    只返回时间戳晚于 since_ms 的条目（在投影之前过滤，条目中可以不含 timestamp_ms）。
+    """
     if not os.path.exists(filepath):
-        return {'logs': logs, 'position': 0, 'file_size': 0}
+        return {'logs': [], 'position': 0, 'file_size': 0, 'inode': None,
+                'reset': False, 'more': False}
     
     try:
-        file_size = os.path.getsize(filepath)
-        
-        # 如果文件变小了（可能是新文件），从头读取
-        if file_size < last_position:
-            last_position = 0
-        
-        # 如果没有新内容
-        if file_size == last_position:
-            return {'logs': logs, 'position': last_position, 'file_size': file_size}
-        
-        with open(filepath, 'rb') as f:
-            # 移动到上次读取的位置
-            f.seek(last_position)
-            
-            # 读取新增内容
-            new_content = f.read()
-            new_position = f.tell()
-            
-            try:
-                text = new_content.decode(config.LOG_ENCODING)
-            except UnicodeDecodeError:
-                text = new_content.decode(config.LOG_ENCODING, errors='ignore')
-            
-            lines = text.splitlines()
-            
-            # 如果第一行不完整（上次读取可能截断），跳过
-            if last_position > 0 and len(lines) > 0:
-                # 检查第一行是否完整
-                first_line = lines[0].strip()
-                if not (first_line.startswith('{') and first_line.endswith('}')):
-                    lines = lines[1:]  # 跳过第一行
-            
-            # 解析每一行
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                log_entry = parse_log_line_json(line)
-                if log_entry:
-                    logs.append(log_entry)
-        
-        # 按时间戳倒序排列
-        # logs.sort(key=lambda x: x.get('timestamp_ms', 0), reverse=True)
+        # 读到最后一个换行为止，未写完的行留到下次；inode 变化或文件变小时从头读取
+        result = TailReader(filepath, last_position, inode).read()
+        level = projection.parse_level() if projection is not None else 'full'
+        lines = [line for line in parse_log_lines(result.lines, filepath, level)
+                 if line.entry is not None and line.entry.get('timestamp_ms', 0) > since_ms]
+        logs = build_log_entries(lines, exclude=exclude, projection=projection)
         
         return {
             'logs': logs,
-            'position': new_position,
-            'file_size': file_size
+            'position': result.position,
+            'file_size': result.file_size,
+            'inode': result.inode,
+            'reset': result.reset,
+            'more': result.more
         }
     
     except Exception as e:
-        print(f"增量读取日志文件失败 {filepath}: {e}")
-        return {'logs': [], 'position': last_position, 'file_size': 0}
-
-def get_log_files() -> Dict[str, List[Dict[str, Any]]]:
-    """获取所有日志文件列表"""
-    files = {
-        'client': [],
-        'server': []
-    }
-    
-    def scan_directory(directory: str, file_type: str) -> List[Dict[str, Any]]:
-        """扫描目录获取日志文件"""
-        result = []
-        if not os.path.exists(directory):
-            print(f"目录不存在: {directory}")
-            os.makedirs(directory, exist_ok=True)
+        log_event('log_tail_failed', logging.ERROR, path=filepath, error=str(e))
+        return {'logs': [], 'position': last_position, 'file_size': 0, 'inode': inode,
+                'reset': False, 'more': False}
+
+
+def wait_for_logs(subscriber: 'live_tail.Subscriber', timeout: float, result: Dict[str, Any],
+                  inode: Optional[int] = None, exclude: AbstractSet[str] = frozenset(),
+                  projection: Optional[Projection] = None, since_ms: int = 0) -> Dict[str, Any]:
+    """长轮询：等待监视线程推送 result['position'] 之后的新增日志，超时返回原结果
+
+    直接使用监视线程已解析的行，只按本请求的 exclude/projection/since_ms 生成条目，
+    同一次追加对所有等待中的请求只读取和解析一次。文件被截断或轮转时改为重新增量读取。
+    """
+    position = result['position']
+    deadline = time.monotonic() + timeout
+    while True:
+        batch = subscriber.get(deadline - time.monotonic())
+        if batch is None:
             return result
-        
-        try:
-            for filename in os.listdir(directory):
-                if filename.endswith('.log'):
-                    filepath = os.path.join(directory, filename)
-                    try:
-                        stats = os.stat(filepath)
-                        result.append({
-                            'name': filename,
-                            'path': filepath,
-                            'size': stats.st_size,
-                            'size_formatted': format_file_size(stats.st_size),
-                            'modified': datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                            'modified_ts': stats.st_mtime,
-                            'type': file_type
-                        })
-                    except OSError as e:
-                        print(f"获取文件信息失败 {filepath}: {e}")
-        except OSError as e:
-            print(f"扫描目录失败 {directory}: {e}")
-        
-        return sorted(result, key=lambda x: x['modified_ts'], reverse=True)
-    
-    # 获取客户端和服务端日志文件
-    files['client'] = scan_directory(config.CLIENT_LOGS_DIR, 'client')
-    files['server'] = scan_directory(config.SERVER_LOGS_DIR, 'server')
-    
-    return files
-
-
-def format_file_size(size_bytes: int) -> str:
-    """格式化文件大小"""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.2f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.2f} TB"
+        if batch.event == 'reset':
+            return parse_iec104_log_file_incremental(subscriber.watcher.filepath, position, inode,
+                                                     exclude, projection, since_ms)
+        if batch.position <= position:
+            continue  # 监视线程落后于客户端，推送的是客户端已有的内容
+        lines = [line for line in batch.lines
+                 if line.offset >= position and line.entry is not None
+                 and line.entry.get('timestamp_ms', 0) > since_ms]
+        return {
+            'logs': build_log_entries(lines, exclude=exclude, projection=projection),
+            'position': batch.position,
+            'file_size': batch.file_size,
+            'inode': batch.inode,
+            'reset': False,
+            'more': batch.more
+        }
 
 
 def validate_file_path(filepath: str, base_dir: str) -> Optional[str]:
@@ -496,8 +234,16 @@ def validate_file_path(filepath: str, base_dir: str) -> Optional[str]:
         
         return None
     except Exception as e:
-        print(f"路径验证失败: {e}")
+        log_event('path_validation_failed', path=filepath, error=str(e))
+        return None
+
+
+def parse_exclude(value: Optional[str]) -> Optional[AbstractSet[str]]:
+    """解析 exclude 参数（逗号分隔的可省略字段），含未知字段时返回 None"""
+    fields = frozenset(name.strip() for name in (value or '').split(',') if name.strip())
+    if not fields <= set(OPTIONAL_FIELDS):
         return None
+    return fields
 
 
 # ==================== API 路由 ====================
@@ -513,9 +259,6 @@ def index():
 def send_static(path):
     """静态文件"""
     static_dir = os.path.join(os.path.dirname(__file__), 'static')
-    print(f"请求静态文件: {path}")  # 添加
-    print(f"静态文件目录: {static_dir}")  # 添加
-    print(f"文件是否存在: {os.path.exists(os.path.join(static_dir, path))}")  # 添加
     return send_from_directory(static_dir, path)
 
 
@@ -534,19 +277,110 @@ def get_config():
     })
 
 
+@app.route('/api/dictionary', methods=['GET'])
+def get_dictionary():
+    """代码到描述文字的对照表（内容只随程序版本变化，客户端取一次后缓存）"""
+    response = jsonify({'success': True, 'dictionary': dictionary()})
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """获取解析缓存与列式帧存储的统计"""
+    return jsonify({
+        'success': True,
+        'cache': frame_cache.stats(),
+        'frame_store': frame_store_stats(),
+        'search_index': search_index.search_index_stats(),
+        'compressed_checkpoints': checkpoint_stats(),
+        'file_catalog': catalog_stats()
+    })
+
+
+def cache_metric_families() -> Iterator[metrics.Family]:
+    """各缓存已有的统计，转为指标族附加到 /api/metrics"""
+    cache = frame_cache.stats()
+    yield ('iec104_frame_cache_lookups_total', 'counter',
+           '已解析块缓存的查找次数（extend 为复用已缓存前缀、只解析追加的行）',
+           [({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses']),
+            ({'result': 'extend'}, cache['extends'])])
+    yield ('iec104_frame_cache_evictions_total', 'counter', '已解析块缓存的淘汰次数',
+           [({}, cache['evictions'])])
+    yield ('iec104_frame_cache_bytes', 'gauge', '已解析块缓存的估算内存（字节）', [({}, cache['bytes'])])
+    store = frame_store_stats()
+    yield ('iec104_frame_store_frames', 'gauge', '列式帧存储中的帧数', [({}, store['frames'])])
+    yield ('iec104_frame_store_bytes', 'gauge', '列式帧存储的内存（字节）', [({}, store['bytes'])])
+    search = search_index.search_index_stats()
+    yield ('iec104_search_index_bytes', 'gauge', '内存中检索索引的大小（字节）', [({}, search['bytes'])])
+    checkpoints = checkpoint_stats()
+    yield ('iec104_compressed_checkpoint_bytes', 'gauge', '压缩日志随机访问检查点的内存（字节）',
+           [({}, checkpoints['bytes'])])
+    yield ('iec104_log_files', 'gauge', '日志目录中的文件数',
+           [({'type': file_type}, item['files']) for file_type, item in catalog_stats().items()])
+    yield ('iec104_live_tail_watchers', 'gauge', '实时推送的文件监视线程数',
+           [({}, live_tail.watcher_count())])
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式的运行指标"""
+    return Response(metrics.render(cache_metric_families()), content_type=metrics.CONTENT_TYPE)
+
+
 @app.route('/api/files', methods=['GET'])
 def get_files():
-    """获取文件列表"""
+    """获取文件列表（可按类型、文件名、时间范围过滤并分页）"""
     try:
-        files = get_log_files()
-        return jsonify({
+        log_type = request.args.get('type')  # client / server，缺省为两者
+        name = request.args.get('name')  # 文件名包含的字符串（不区分大小写）
+        from_ms = request.args.get('from_ms', type=int)
+        to_ms = request.args.get('to_ms', type=int)
+        page = request.args.get('page', type=int)
+        page_size = request.args.get('page_size', type=int, default=config.DEFAULT_PAGE_SIZE)
+        
+        if log_type not in (None, 'client', 'server'):
+            return jsonify({
+                'success': False,
+                'error': '无效的日志类型'
+            }), 400
+        if page is not None and page < 1:
+            return jsonify({
+                'success': False,
+                'error': '页码必须从1开始'
+            }), 400
+        page_size = max(1, min(page_size, config.MAX_PAGE_SIZE))
+        
+        file_types = [log_type] if log_type else ['client', 'server']
+        validators = [get_catalog(file_type).validator() for file_type in file_types]
+        validator = (http_cache.make_etag(*[signature for signature, _ in validators]),
+                     max(last_modified for _, last_modified in validators))
+        cached = http_cache.not_modified(validator)
+        if cached is not None:
+            return cached
+        
+        files = {}
+        total = {}
+        for file_type in file_types:
+            if page is None:
+                files[file_type], total[file_type] = get_catalog(file_type).list_files(name, from_ms, to_ms)
+            else:
+                files[file_type], total[file_type] = get_catalog(file_type).list_files(
+                    name, from_ms, to_ms, (page - 1) * page_size, page_size)
+        
+        response = {
             'success': True,
             'data': files,
-            'total': {
-                'client': len(files['client']),
-                'server': len(files['server'])
+            'total': total
+        }
+        if page is not None:
+            response['pagination'] = {
+                'page': page,
+                'page_size': page_size,
+                'total_pages': {file_type: (count + page_size - 1) // page_size
+                                for file_type, count in total.items()}
             }
-        })
+        return http_cache.set_validators(jsonify(response), validator)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -562,6 +396,14 @@ def get_logs():
         log_type = request.args.get('type', 'client')
         tail_lines = request.args.get('tail', type=int)
         filter_type = request.args.get('filter')  # I, S, U
+        page = request.args.get('page', type=int)
+        page_size = request.args.get('page_size', type=int, default=config.DEFAULT_PAGE_SIZE)
+        from_ms = request.args.get('from_ms', type=int)
+        to_ms = request.args.get('to_ms', type=int)
+        after_offset = request.args.get('after_offset', type=int)
+        stream_format = request.args.get('stream')  # ndjson / json，缺省为一次性返回
+        exclude = parse_exclude(request.args.get('exclude'))  # 省略的冗余字段，如 raw,raw_bytes
+        projection, fields_error = parse_fields(request.args.get('fields'))  # 只返回的字段，如 timestamp_ms,frame_info.type
         
         if not filepath:
             return jsonify({
@@ -587,25 +429,81 @@ def get_logs():
                 'error': f'文件不存在或路径无效: {filepath}'
             }), 404
         
-        # 解析日志
-        logs = parse_iec104_log_file(full_path, tail_lines, filter_type)
+        if page is not None and page < 1:
+            return jsonify({
+                'success': False,
+                'error': '页码必须从1开始'
+            }), 400
+        if page is not None and (from_ms is not None or to_ms is not None or after_offset is not None):
+            return jsonify({
+                'success': False,
+                'error': 'page 不能与 from_ms/to_ms/after_offset 同时使用'
+            }), 400
+        if after_offset is not None and after_offset < 0:
+            return jsonify({
+                'success': False,
+                'error': '无效的游标位置'
+            }), 400
+        if stream_format not in (None, 'ndjson', 'json'):
+            return jsonify({
+                'success': False,
+                'error': '无效的流式格式'
+            }), 400
+        if exclude is None:
+            return jsonify({
+                'success': False,
+                'error': f'exclude 只能包含: {", ".join(OPTIONAL_FIELDS)}'
+            }), 400
+        if fields_error is not None:
+            return jsonify({
+                'success': False,
+                'error': fields_error
+            }), 400
+        page_size = max(1, min(page_size, config.MAX_PAGE_SIZE))
+        window = LogWindow(full_path, tail_lines, filter_type, page, page_size,
+                           from_ms, to_ms, after_offset, exclude, projection)
+        
+        # 文件、查询参数和（尾部读取时的）索引状态都没有变化时不必重新解析
+        validator = http_cache.file_validator(full_path, state=window.index_state)
+        cached = http_cache.not_modified(validator)
+        if cached is not None:
+            return cached
         
         # 文件信息
         file_stats = os.stat(full_path)
         file_info = {
             'name': os.path.basename(filepath),
             'type': log_type,
-            'total_lines': len(logs),
             'file_size': file_stats.st_size,
             'file_size_formatted': format_file_size(file_stats.st_size),
+            'compression': compression_of(full_path),
             'modified': datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        return jsonify({
+        # 流式输出：边读边发送，不在内存中构造完整响应
+        if stream_format:
+            mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+            response = Response(stream_with_context(stream_log_window(window, file_info, stream_format)),
+                                mimetype=mimetype, headers={'X-Accel-Buffering': 'no'})
+            return http_cache.set_validators(response, validator)
+        
+        # 解析日志
+        if window.paged:
+            logs = list(window)
+        else:
+            logs = parse_iec104_log_file(window)
+        pagination = window.pagination
+        file_info['total_lines'] = len(logs)
+        file_info['position'] = window.position  # 增量读取从最后一个完整行之后开始
+        
+        response = {
             'success': True,
             'file_info': file_info,
             'logs': logs
-        })
+        }
+        if pagination is not None:
+            response['pagination'] = pagination
+        return http_cache.set_validators(jsonify(response), validator)
     
     except Exception as e:
         import traceback
@@ -616,6 +514,295 @@ def get_logs():
         }), 500
 
 
+@app.route('/api/query', methods=['GET', 'POST'])
+def query_frames():
+    """按条件查询帧（在列式帧存储上做向量化过滤）
+    
+    GET 时条件来自查询参数（见 where_from_args）或 JSON 格式的 where 参数；
+    POST 时请求体为 {"file", "type", "where", "offset", "limit", "order", "format"}。
+    """
+    try:
+        params = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+        filepath = params.get('file', request.args.get('file'))
+        log_type = params.get('type', request.args.get('type', 'client'))
+        offset = params.get('offset', request.args.get('offset', type=int, default=0))
+        limit = params.get('limit', request.args.get('limit', type=int, default=config.DEFAULT_PAGE_SIZE))
+        order = params.get('order', request.args.get('order', 'asc'))
+        fmt = params.get('format', request.args.get('format', 'entries'))
+        
+        if not filepath:
+            return jsonify({'success': False, 'error': '未指定文件'}), 400
+        if log_type not in ['client', 'server']:
+            return jsonify({'success': False, 'error': '无效的日志类型'}), 400
+        if not isinstance(offset, int) or offset < 0 or not isinstance(limit, int):
+            return jsonify({'success': False, 'error': '无效的 offset/limit'}), 400
+        if order not in ('asc', 'desc') or fmt not in ('entries', 'columns'):
+            return jsonify({'success': False, 'error': '无效的 order/format'}), 400
+        
+        base_dir = config.CLIENT_LOGS_DIR if log_type == 'client' else config.SERVER_LOGS_DIR
+        full_path = validate_file_path(filepath, base_dir)
+        if not full_path:
+            return jsonify({'success': False, 'error': f'文件不存在或路径无效: {filepath}'}), 404
+        
+        if 'where' in params:
+            where = params['where']
+        elif request.args.get('where'):
+            try:
+                where = json.loads(request.args['where'])
+            except ValueError as e:
+                return jsonify({'success': False, 'error': f'where 不是有效的JSON: {e}'}), 400
+        else:
+            where = where_from_args(request.args)
+        
+        start = time.perf_counter()
+        store = get_frame_store(full_path)
+        synced = time.perf_counter()
+        result = run_query(store, where, offset, max(1, min(limit, config.MAX_PAGE_SIZE)),
+                           order == 'desc', fmt)
+        result.update({
+            'success': True,
+            'frames': len(store),
+            'sync_ms': round((synced - start) * 1000, 3),
+            'query_ms': round((time.perf_counter() - synced) * 1000, 3)
+        })
+        return jsonify(result)
+    
+    except QueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/export', methods=['GET'])
+def export_frames():
+    """把日志文件（或其上的查询结果）中解码后的帧导出为 CSV / Parquet / Arrow（流式输出）
+    
+    format 为 csv（缺省）、parquet 或 arrow（后两者需安装 pyarrow）；条件来自查询参数
+    （见 where_from_args）或 JSON 格式的 where 参数，同 /api/query。
+    """
+    try:
+        filepath = request.args.get('file')
+        log_type = request.args.get('type', 'client')
+        fmt = request.args.get('format', 'csv')
+        
+        if not filepath:
+            return jsonify({'success': False, 'error': '未指定文件'}), 400
+        if log_type not in ['client', 'server']:
+            return jsonify({'success': False, 'error': '无效的日志类型'}), 400
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'error': f'无效的导出格式: {fmt}'}), 400
+        if fmt not in export_formats():
+            return jsonify({'success': False, 'error': f'导出 {fmt} 需要安装 pyarrow'}), 400
+        
+        base_dir = config.CLIENT_LOGS_DIR if log_type == 'client' else config.SERVER_LOGS_DIR
+        full_path = validate_file_path(filepath, base_dir)
+        if not full_path:
+            return jsonify({'success': False, 'error': f'文件不存在或路径无效: {filepath}'}), 404
+        
+        if request.args.get('where'):
+            try:
+                where = json.loads(request.args['where'])
+            except ValueError as e:
+                return jsonify({'success': False, 'error': f'where 不是有效的JSON: {e}'}), 400
+        else:
+            where = where_from_args(request.args)
+        export = FrameExport(full_path, fmt, where)
+        
+        validator = http_cache.file_validator(full_path)
+        cached = http_cache.not_modified(validator)
+        if cached is not None:
+            return cached
+        
+        name = os.path.basename(export_path(full_path, fmt))
+        response = Response(stream_with_context(iter(export)), mimetype=EXPORT_FORMATS[fmt][0],
+                            headers={'Content-Disposition': f'attachment; filename="{name}"'})
+        return http_cache.set_validators(response, validator)
+    
+    except QueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/timeseries', methods=['GET'])
+def get_timeseries():
+    """单个信息对象 (asdu, ioa) 的测量值序列，按 points 降采样"""
+    try:
+        filepath = request.args.get('file')
+        log_type = request.args.get('type', 'client')
+        asdu_addr = request.args.get('asdu', type=int)
+        ioa = request.args.get('ioa', type=int)
+        points = request.args.get('points', type=int, default=config.TIMESERIES_DEFAULT_POINTS)
+        method = request.args.get('method', 'lttb')
+        from_ms = request.args.get('from_ms', type=int)
+        to_ms = request.args.get('to_ms', type=int)
+        
+        if not filepath:
+            return jsonify({'success': False, 'error': '未指定文件'}), 400
+        if log_type not in ['client', 'server']:
+            return jsonify({'success': False, 'error': '无效的日志类型'}), 400
+        if asdu_addr is None or ioa is None or not 0 <= ioa <= 0xFFFFFF:
+            return jsonify({'success': False, 'error': '需要有效的 asdu 和 ioa 参数'}), 400
+        if method not in DOWNSAMPLE_METHODS:
+            return jsonify({
+                'success': False,
+                'error': f'无效的降采样方法（可选 {", ".join(DOWNSAMPLE_METHODS)}）'
+            }), 400
+        points = max(1, min(points, config.TIMESERIES_MAX_POINTS))
+        
+        base_dir = config.CLIENT_LOGS_DIR if log_type == 'client' else config.SERVER_LOGS_DIR
+        full_path = validate_file_path(filepath, base_dir)
+        if not full_path:
+            return jsonify({'success': False, 'error': f'文件不存在或路径无效: {filepath}'}), 404
+        
+        start = time.perf_counter()
+        series = extract_series(get_frame_store(full_path), asdu_addr, ioa, from_ms, to_ms)
+        if method == 'none' and len(series['time']) > config.TIMESERIES_MAX_POINTS:
+            method = 'lttb'  # 不降采样时也不超过单次上限
+            points = config.TIMESERIES_MAX_POINTS
+        sampled = downsample(series['time'], series['value'], points, method)
+        
+        return jsonify({
+            'success': True,
+            'asdu_addr': asdu_addr,
+            'ioa': ioa,
+            'type_ids': [f'0x{type_id:02X}' for type_id in series['type_ids']],
+            'method': method,
+            'count': len(series['time']),
+            'summary': series_summary(series['value']),
+            'points': [[time_ms, value] for time_ms, value in sampled],
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)
+        })
+    
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/sequence', methods=['GET'])
+def get_sequence():
+    """I帧序号分析：跳号、重复、回绕、k/w 窗口深度与 STARTDT/STOPDT/TESTFR 会话"""
+    try:
+        filepath = request.args.get('file')
+        log_type = request.args.get('type', 'client')
+        event_limit = request.args.get('events', type=int, default=100)
+        event_offset = request.args.get('events_offset', type=int, default=0)
+        kinds = [kind.strip() for kind in request.args.get('kind', '').split(',') if kind.strip()]
+        include_window = request.args.get('window', '').lower() in ('1', 'true', 'yes')
+        
+        if not filepath:
+            return jsonify({'success': False, 'error': '未指定文件'}), 400
+        if log_type not in ['client', 'server']:
+            return jsonify({'success': False, 'error': '无效的日志类型'}), 400
+        unknown = [kind for kind in kinds if kind not in EVENT_KINDS]
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': f'未知的事件类型: {", ".join(unknown)}（可选 {", ".join(EVENT_KINDS)}）'
+            }), 400
+        event_limit = max(0, min(event_limit, config.MAX_PAGE_SIZE))
+        event_offset = max(0, event_offset)
+        
+        base_dir = config.CLIENT_LOGS_DIR if log_type == 'client' else config.SERVER_LOGS_DIR
+        full_path = validate_file_path(filepath, base_dir)
+        if not full_path:
+            return jsonify({'success': False, 'error': f'文件不存在或路径无效: {filepath}'}), 404
+        
+        start = time.perf_counter()
+        analysis = get_sequence_analysis(full_path)
+        with analysis.lock:
+            result = analysis.analyzer.summary(event_limit, event_offset, kinds, include_window)
+        result['success'] = True
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        return jsonify(result)
+    
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/correlate', methods=['GET'])
+def get_correlation():
+    """关联同一连接的客户端/服务端日志：单向时延与请求→确认时延"""
+    try:
+        client_file = request.args.get('client')
+        server_file = request.args.get('server')
+        window_ms = request.args.get('window_ms', type=int, default=config.CORRELATION_WINDOW_MS)
+        offset = request.args.get('offset', type=int, default=0)
+        limit = request.args.get('limit', type=int, default=100)
+        
+        if not client_file and not server_file:
+            return jsonify({'success': False, 'error': '未指定文件'}), 400
+        if window_ms <= 0:
+            return jsonify({'success': False, 'error': 'window_ms 必须大于0'}), 400
+        offset = max(0, offset)
+        limit = max(0, min(limit, config.MAX_PAGE_SIZE))
+        
+        # 只给出一端时按文件名中的时间戳找另一端
+        if not server_file:
+            server_file = find_peer_log(client_file, config.SERVER_LOGS_DIR)
+        elif not client_file:
+            client_file = find_peer_log(server_file, config.CLIENT_LOGS_DIR)
+        client_path = validate_file_path(client_file, config.CLIENT_LOGS_DIR) if client_file else None
+        server_path = validate_file_path(server_file, config.SERVER_LOGS_DIR) if server_file else None
+        if not client_path or not server_path:
+            return jsonify({
+                'success': False,
+                'error': f'文件不存在或路径无效: {client_file if not client_path else server_file}'
+            }), 404
+        
+        start = time.perf_counter()
+        result = correlate_logs(client_path, server_path, window_ms, offset, limit)
+        result['success'] = True
+        result['client_file'] = os.path.basename(client_path)
+        result['server_file'] = os.path.basename(server_path)
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        return jsonify(result)
+    
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/search', methods=['GET'])
+def search_logs():
+    """跨文件检索：按类型标识/传输原因/公共地址/IOA 和报文十六进制子串查找包含匹配帧的文件"""
+    try:
+        log_type = request.args.get('type')
+        from_ms = request.args.get('from_ms', type=int)
+        to_ms = request.args.get('to_ms', type=int)
+        limit = request.args.get('limit', type=int, default=100)
+        
+        if log_type and log_type not in ['client', 'server']:
+            return jsonify({'success': False, 'error': '无效的日志类型'}), 400
+        try:
+            criteria, pattern = search_index.criteria_from_args(request.args)
+        except QueryError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if not criteria and not pattern:
+            return jsonify({'success': False, 'error': '未指定检索条件'}), 400
+        limit = max(0, min(limit, config.MAX_PAGE_SIZE))
+        
+        search_index.start_indexer()
+        start = time.perf_counter()
+        result = search_index.search(criteria, pattern, from_ms, to_ms, log_type, limit)
+        result['success'] = True
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        return jsonify(result)
+    
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """获取统计信息"""
@@ -638,42 +825,19 @@ def get_stats():
                 'error': '文件不存在'
             }), 404
         
-        logs = parse_iec104_log_file(full_path)
+        validator = http_cache.file_validator(full_path)
+        cached = http_cache.not_modified(validator)
+        if cached is not None:
+            return cached
         
-        # 统计信息
-        stats = {
-            'total': len(logs),
-            'frame_types': {},
-            'type_ids': {},
-            'causes': {},
-            'directions': {'TX': 0, 'RX': 0, 'UNKNOWN': 0}
-        }
+        # 累计统计覆盖整个文件，只折叠上次之后新增的行
+        include_buckets = request.args.get('buckets', type=int, default=0) == 1
+        stats = get_log_stats(full_path).summary(include_buckets)
         
-        for log in logs:
-            # 方向统计
-            direction = log.get('direction', 'UNKNOWN')
-            stats['directions'][direction] = stats['directions'].get(direction, 0) + 1
-            
-            frame_info = log.get('frame_info', {})
-            
-            # 帧类型统计
-            frame_type = frame_info.get('type', 'UNKNOWN')
-            stats['frame_types'][frame_type] = stats['frame_types'].get(frame_type, 0) + 1
-            
-            # 类型标识统计 (仅I帧)
-            if frame_type == 'I' and 'type_id_desc' in frame_info:
-                type_id = frame_info['type_id_desc']
-                stats['type_ids'][type_id] = stats['type_ids'].get(type_id, 0) + 1
-            
-            # 传输原因统计 (仅I帧)
-            if frame_type == 'I' and 'cause_desc' in frame_info:
-                cause = frame_info['cause_desc']
-                stats['causes'][cause] = stats['causes'].get(cause, 0) + 1
-        
-        return jsonify({
+        return http_cache.set_validators(jsonify({
             'success': True,
             'stats': stats
-        })
+        }), validator)
     
     except Exception as e:
         return jsonify({
@@ -708,9 +872,17 @@ def get_logs_tail():
         log_type = request.args.get('type', 'client')
         since_ms = request.args.get('since', type=int, default=0)
         last_position = request.args.get('position', type=int, default=0)  # 添加：上次读取位置
+        inode = request.args.get('inode', type=int)  # 上次读取时的文件 inode，用于识别轮转
+        wait = min(request.args.get('wait', type=float, default=0), config.LIVE_TAIL_HEARTBEAT)  # 长轮询等待秒数
+        exclude = parse_exclude(request.args.get('exclude'))
+        projection, fields_error = parse_fields(request.args.get('fields'))
         
         if not filepath:
             return jsonify({'success': False, 'error': '未指定文件'}), 400
+        if exclude is None:
+            return jsonify({'success': False, 'error': f'exclude 只能包含: {", ".join(OPTIONAL_FIELDS)}'}), 400
+        if fields_error is not None:
+            return jsonify({'success': False, 'error': fields_error}), 400
         
         base_dir = config.CLIENT_LOGS_DIR if log_type == 'client' else config.SERVER_LOGS_DIR
         full_path = validate_file_path(filepath, base_dir)
@@ -718,18 +890,30 @@ def get_logs_tail():
         if not full_path:
             return jsonify({'success': False, 'error': '文件不存在'}), 404
         
-        # 使用增量读取
-        result = parse_iec104_log_file_incremental(full_path, last_position)
-        
-        # 按时间戳过滤（双重保险）
-        new_logs = [log for log in result['logs'] if log.get('timestamp_ms', 0) > since_ms]
+        # 长轮询：先订阅共享的文件监视线程再读取，读取之后追加的行一定会收到推送
+        subscriber = live_tail.subscribe(full_path, stream=False)[0] if wait > 0 else None
+        try:
+            # 使用增量读取
+            result = parse_iec104_log_file_incremental(full_path, last_position, inode, exclude,
+                                                       projection, since_ms)
+            # 没有新内容时等待监视线程读取并解析好的下一批
+            if subscriber is not None and not result['logs'] and result['position'] == last_position:
+                result = wait_for_logs(subscriber, wait, result, inode, exclude, projection, since_ms)
+        finally:
+            if subscriber is not None:
+                subscriber.close()
+        
+        new_logs = result['logs']  # 已按 since 过滤
         
         return jsonify({
             'success': True,
             'logs': new_logs,
             'count': len(new_logs),
             'position': result['position'],  # 返回新的读取位置
-            'file_size': result['file_size']
+            'file_size': result['file_size'],
+            'inode': result['inode'],
+            'reset': result['reset'],  # 文件被截断或轮转，已从头读取
+            'more': result['more']     # 达到单次读取上限，还有未读内容
         })
     
     except Exception as e:
@@ -743,6 +927,42 @@ def get_logs_tail():
             'error': str(e)
         }), 200
 
+
+@app.route('/api/logs/stream', methods=['GET'])
+def stream_logs():
+    """以 Server-Sent Events 推送新增日志（同一文件的所有连接共享一个监视线程）"""
+    filepath = request.args.get('file')
+    log_type = request.args.get('type', 'client')
+    position = request.args.get('position', type=int)
+    
+    if not filepath:
+        return jsonify({'success': False, 'error': '未指定文件'}), 400
+    
+    base_dir = config.CLIENT_LOGS_DIR if log_type == 'client' else config.SERVER_LOGS_DIR
+    full_path = validate_file_path(filepath, base_dir)
+    
+    if not full_path:
+        return jsonify({'success': False, 'error': '文件不存在'}), 404
+    
+    subscriber, backlog = live_tail.subscribe(full_path, position)
+    
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            for batch in backlog:
+                yield batch.message
+            while True:
+                batch = subscriber.get(config.LIVE_TAIL_HEARTBEAT)
+                yield batch.message if batch is not None else ': keepalive\n\n'
+        finally:
+            subscriber.close()
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 if __name__ == '__main__':
     # 确保目录存在
     os.makedirs(config.CLIENT_LOGS_DIR, exist_ok=True)
@@ -751,6 +971,9 @@ if __name__ == '__main__':
     static_dir = os.path.join(os.path.dirname(__file__), 'static')
     os.makedirs(static_dir, exist_ok=True)
     
+    # 后台建立跨文件检索索引
+    search_index.start_indexer()
+    
     # 启动应用
     print("\n" + "="*60)
     print("IEC104 日志查看器启动中...")
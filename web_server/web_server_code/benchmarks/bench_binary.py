@@ -0,0 +1,110 @@
+"""文本日志与二进制日志的读取基准测试
+
+把文本日志转换为二进制日志（.i104）放到临时目录，分别测量：建立行偏移索引、整文件统计、
+列式帧存储导入、整文件解析为响应条目、随机分页，校验两种格式的结果一致并输出耗时。
+
+用法: python benchmarks/bench_binary.py [--pages N] [--page-size N] 日志文件
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from binary_log import convert_log  # noqa: E402
+from frame_cache import frame_cache, iter_parsed_range  # noqa: E402
+from frame_store import FrameStore  # noqa: E402
+from log_index import LogIndex  # noqa: E402
+from log_stats import LogStats  # noqa: E402
+
+
+def run(path, pages, page_size, seed):
+    """返回 ({阶段: 耗时}, 用于校验的结果)"""
+    timings = {}
+    # 索引每个 sidecar 都从头建立；分页经由缓存读取，先清空缓存
+    index = LogIndex(path)
+    start = time.perf_counter()
+    index.refresh()
+    timings['index'] = time.perf_counter() - start
+
+    stats = LogStats(path)
+    start = time.perf_counter()
+    stats.refresh()
+    timings['stats'] = time.perf_counter() - start
+
+    store = FrameStore(path)
+    start = time.perf_counter()
+    store.refresh()
+    timings['store'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    entries = [line.entry for line in iter_parsed_range(path, 0, index.indexed_size)]
+    timings['parse'] = time.perf_counter() - start
+
+    frame_cache.clear()
+    rng = random.Random(seed)
+    starts = [rng.randrange(max(index.line_count - page_size, 1)) for _ in range(pages)]
+    start = time.perf_counter()
+    result = [[line.entry for line in frame_cache.get_lines(index, line, page_size)] for line in starts]
+    timings['pages'] = time.perf_counter() - start
+
+    summary = stats.summary()
+    for key in ('covered_bytes', 'file_size'):
+        summary.pop(key)
+    columns = {name: list(store.column(name)) for name in ('time_ms', 'direction', 'frame_type',
+                                                           'type_id', 'send_seq', 'recv_seq', 'ioa')}
+    for entry in entries + [entry for page in result for entry in page]:
+        if entry is not None:
+            entry.pop('raw', None)
+    return timings, (summary, columns, [entry for entry in entries if entry is not None], result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文本日志与二进制日志的读取基准测试')
+    parser.add_argument('file', help='文本日志文件')
+    parser.add_argument('--pages', type=int, default=200, help='随机分页读取次数')
+    parser.add_argument('--page-size', type=int, default=config.DEFAULT_PAGE_SIZE, help='每页行数')
+    parser.add_argument('--seed', type=int, default=1, help='随机分页的种子')
+    args = parser.parse_args()
+
+    config.ENABLE_PARALLEL_PARSE = False  # 只比较单进程解析开销
+    workdir = tempfile.mkdtemp(prefix='bench_binary_')
+    try:
+        text_path = os.path.join(workdir, 'bench.log')
+        binary_path = os.path.join(workdir, 'bench' + config.BINARY_LOG_SUFFIX)
+        shutil.copyfile(args.file, text_path)
+        start = time.perf_counter()
+        counts = convert_log(text_path, binary_path)
+        convert_time = time.perf_counter() - start
+        sizes = os.path.getsize(text_path), os.path.getsize(binary_path)
+        text = run(text_path, args.pages, args.page_size, args.seed)
+        binary = run(binary_path, args.pages, args.page_size, args.seed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if counts['skipped']:
+        print(f"转换时跳过 {counts['skipped']} 行无法解析的行，结果不做一致性校验")
+    elif text[1] != binary[1]:
+        print('二进制日志的结果与文本日志不一致')
+        return 1
+
+    print(f"文件: {args.file} ({counts['records']} 帧, 转换耗时 {convert_time:.2f}s)")
+    print(f'大小: 文本 {sizes[0] / 1024 / 1024:.1f} MB, 二进制 {sizes[1] / 1024 / 1024:.1f} MB '
+          f'({sizes[1] / sizes[0]:.1%})')
+    labels = [('index', '建索引'), ('stats', '统计'), ('store', '帧存储导入'), ('parse', '整文件解析')]
+    for key, label in labels:
+        print(f'{label}: 文本 {text[0][key]:.2f}s, 二进制 {binary[0][key]:.2f}s, '
+              f'加速比 {text[0][key] / binary[0][key]:.1f}x')
+    print(f'随机分页（{args.pages} 次 x {args.page_size} 行）: '
+          f'文本 {text[0]["pages"] / args.pages * 1000:.2f} ms/页, '
+          f'二进制 {binary[0]["pages"] / args.pages * 1000:.2f} ms/页')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
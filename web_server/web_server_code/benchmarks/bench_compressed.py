@@ -0,0 +1,111 @@
+"""压缩日志读取吞吐基准测试
+
+把日志文件压缩为 .log.gz（以及安装了 zstandard 时的多帧 .log.zst）放到临时目录，
+分别对普通文件和压缩文件测量：顺序读取、建立行偏移索引、整文件统计、随机分页读取，
+校验结果一致并输出耗时与吞吐（按解压后字节数计）。
+
+用法: python benchmarks/bench_compressed.py [--pages N] [--page-size N] 日志文件
+"""
+import argparse
+import gzip
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from log_index import LogIndex  # noqa: E402
+from log_source import open_log, zstandard  # noqa: E402
+from log_stats import LogStats  # noqa: E402
+
+ZSTD_FRAME_BYTES = 1024 * 1024  # 多帧 zstd 每帧的原始字节数
+
+
+def make_copies(path, workdir):
+    """返回 [(名称, 路径)]，压缩副本写入 workdir"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    copies = [('plain', os.path.join(workdir, 'bench.log'))]
+    with open(copies[0][1], 'wb') as f:
+        f.write(data)
+
+    copies.append(('gzip', os.path.join(workdir, 'bench.log.gz')))
+    with open(copies[-1][1], 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=6))
+
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor()
+        copies.append(('zstd', os.path.join(workdir, 'bench.log.zst')))
+        with open(copies[-1][1], 'wb') as f:
+            for start in range(0, len(data), ZSTD_FRAME_BYTES):
+                f.write(compressor.compress(data[start:start + ZSTD_FRAME_BYTES]))
+    return copies
+
+
+def run(path, pages, page_size, seed):
+    """返回 {阶段: 耗时}，以及用于校验的 (分页结果, 统计结果)"""
+    timings = {}
+
+    start = time.perf_counter()
+    with open_log(path) as f:
+        while f.read(1024 * 1024):
+            pass
+    timings['read'] = time.perf_counter() - start
+
+    index = LogIndex(path)  # 不加载已有 sidecar，从头建立
+    start = time.perf_counter()
+    index.refresh()
+    timings['index'] = time.perf_counter() - start
+
+    stats = LogStats(path)
+    start = time.perf_counter()
+    with open_log(path) as f:
+        stats._fold(f, index.indexed_size)
+    timings['stats'] = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    starts = [rng.randrange(max(index.line_count - page_size, 1)) for _ in range(pages)]
+    start = time.perf_counter()
+    result = [index.read_lines(line, page_size) for line in starts]
+    timings['pages'] = time.perf_counter() - start
+    return timings, index.indexed_size, (result, stats.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='压缩日志读取吞吐基准测试')
+    parser.add_argument('file', help='日志文件（未压缩）')
+    parser.add_argument('--pages', type=int, default=200, help='随机分页读取次数')
+    parser.add_argument('--page-size', type=int, default=config.DEFAULT_PAGE_SIZE, help='每页行数')
+    parser.add_argument('--seed', type=int, default=1, help='随机分页的种子')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_compressed_')
+    try:
+        copies = make_copies(args.file, workdir)
+        results = [(name, os.path.getsize(path)) + run(path, args.pages, args.page_size, args.seed)
+                   for name, path in copies]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    plain = results[0]
+    for name, _, _, _, check in results[1:]:
+        if check != plain[4]:
+            print(f'{name} 的结果与普通文件不一致')
+            return 1
+
+    size_mb = plain[3] / 1024 / 1024
+    print(f'文件: {args.file} ({size_mb:.1f} MB, 随机分页 {args.pages} 次 x {args.page_size} 行)')
+    for name, file_size, timings, _, _ in results:
+        print(f'{name:>6} ({file_size / 1024 / 1024:5.1f} MB): 顺序读取 {size_mb / timings["read"]:7.1f} MB/s, '
+              f'建索引 {size_mb / timings["index"]:6.1f} MB/s, '
+              f'统计 {size_mb / timings["stats"]:5.1f} MB/s, '
+              f'分页 {timings["pages"] / args.pages * 1000:6.2f} ms/页')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
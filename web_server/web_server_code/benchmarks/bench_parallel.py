@@ -0,0 +1,84 @@
+"""整文件解析/统计的并行加速基准测试
+
+分别以单进程和进程池（--workers 个进程）解析整个日志文件（条目传回主进程）、
+在子进程中解析并汇总（fold_parsed_blocks，只传回计数）、重新统计整个文件，
+校验两者结果一致并输出耗时与加速比。
+
+用法: python benchmarks/bench_parallel.py [--workers N] 日志文件
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import parallel_parse  # noqa: E402
+from frame_cache import fold_parsed_blocks, iter_parsed_range  # noqa: E402
+from log_index import get_log_index  # noqa: E402
+from log_stats import LogStats  # noqa: E402
+
+
+def count_frame_types(lines):
+    """汇总任务示例：各帧类型的帧数"""
+    return Counter(line.entry['frame_info'].get('type') for line in lines if line.entry is not None)
+
+
+def run(path, end):
+    """返回 (解析结果, 解析耗时, 统计结果, 统计耗时, 汇总结果, 汇总耗时)"""
+    start = time.perf_counter()
+    lines = [(line.line_no, line.offset, line.entry) for line in iter_parsed_range(path, 0, end)]
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    counts = sum(fold_parsed_blocks(get_log_index(path), count_frame_types), Counter())
+    fold_time = time.perf_counter() - start
+
+    stats = LogStats(path)  # 直接折叠，不读写 sidecar 统计文件
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        if parallel_parse.parallel_enabled(end):
+            stats._fold_parallel(end)
+        else:
+            stats._fold(f, end)
+    stats._merge_seconds()
+    stats_time = time.perf_counter() - start
+    return lines, parse_time, stats.summary(), stats_time, counts, fold_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='整文件解析/统计的并行加速基准测试')
+    parser.add_argument('file', help='日志文件')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='进程数')
+    args = parser.parse_args()
+
+    end = get_log_index(args.file).indexed_size
+
+    config.ENABLE_PARALLEL_PARSE = False
+    serial = run(args.file, end)
+
+    config.ENABLE_PARALLEL_PARSE = True
+    config.PARALLEL_WORKERS = args.workers
+    config.PARALLEL_MIN_BYTES = 0
+    parallel_parse.get_pool()  # 进程启动时间不计入
+    parallel = run(args.file, end)
+    parallel_parse.shutdown_pool()
+
+    if serial[0] != parallel[0] or serial[2] != parallel[2] or serial[4] != parallel[4]:
+        print('并行结果与单进程结果不一致')
+        return 1
+
+    print(f'文件: {args.file} ({end / 1024 / 1024:.1f} MB, {len(serial[0])} 行)')
+    print(f'解析: 单进程 {serial[1]:.2f}s, {args.workers} 进程 {parallel[1]:.2f}s, '
+          f'加速比 {serial[1] / parallel[1]:.2f}x')
+    print(f'汇总: 单进程 {serial[5]:.2f}s, {args.workers} 进程 {parallel[5]:.2f}s, '
+          f'加速比 {serial[5] / parallel[5]:.2f}x')
+    print(f'统计: 单进程 {serial[3]:.2f}s, {args.workers} 进程 {parallel[3]:.2f}s, '
+          f'加速比 {serial[3] / parallel[3]:.2f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""IEC104 帧解析器基准测试
+
+对比 IEC104FrameParser（逐字节 int 列表）与 FastIEC104FrameParser（bytes/memoryview）
+的吞吐量（帧/秒），并校验快速解析器输出覆盖原解析器的全部字段。
+
+用法: python benchmarks/bench_parser.py [--repeat N] [日志文件 ...]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from iec104_parser import IEC104FrameParser, FastIEC104FrameParser  # noqa: E402
+
+
+def load_frames(paths):
+    """从日志文件中提取 data 字段"""
+    frames = []
+    for path in paths:
+        with open(path, 'r', encoding=config.LOG_ENCODING, errors='ignore') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line).get('data', '').strip()
+                except json.JSONDecodeError:
+                    continue
+                if data:
+                    frames.append(data)
+    return frames
+
+
+def default_log_files():
+    """默认使用客户端/服务端目录下的全部日志"""
+    paths = []
+    for directory in (config.CLIENT_LOGS_DIR, config.SERVER_LOGS_DIR):
+        if os.path.isdir(directory):
+            paths.extend(os.path.join(directory, name)
+                         for name in sorted(os.listdir(directory)) if name.endswith('.log'))
+    return paths
+
+
+def is_compatible(legacy, fast):
+    """快速解析器可以多出字段（如 objects），但原有字段必须一致"""
+    return all(fast.get(key) == value for key, value in legacy.items())
+
+
+def measure(parse, frames, repeat):
+    """返回最快一轮的帧/秒"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for data in frames:
+            parse(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(frames) / best if best else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IEC104 帧解析器基准测试')
+    parser.add_argument('files', nargs='*', help='日志文件（默认使用日志目录下全部文件）')
+    parser.add_argument('--repeat', type=int, default=5, help='重复轮数，取最快一轮')
+    args = parser.parse_args()
+
+    frames = load_frames(args.files or default_log_files())
+    if not frames:
+        print('没有可用的帧数据')
+        return 1
+
+    mismatches = sum(1 for data in frames
+                     if not is_compatible(IEC104FrameParser.parse(data), FastIEC104FrameParser.parse(data)))
+    if mismatches:
+        print(f'输出不一致: {mismatches}/{len(frames)} 帧')
+        return 1
+
+    legacy = measure(IEC104FrameParser.parse, frames, args.repeat)
+    fast = measure(FastIEC104FrameParser.parse, frames, args.repeat)
+
+    print(f'帧数: {len(frames)}')
+    print(f'IEC104FrameParser:     {legacy:12,.0f} 帧/秒')
+    print(f'FastIEC104FrameParser: {fast:12,.0f} 帧/秒')
+    print(f'加速比: {fast / legacy:.2f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""日志查看器热点路径的基准测试套件
+
+用 gen_capture 生成（或复用 --data-dir 中已生成的）各个大小的合成日志，每个数据集在单独的
+子进程中测量，峰值内存互不影响：
+  - 吞吐（帧/秒）：FastIEC104FrameParser.parse_bytes（完整与精简）、parse_log_line_json、
+    建立行偏移索引、整文件统计、整文件解析为响应条目
+  - 接口延迟（Flask 测试客户端）：/api/logs（尾部、随机分页、按前端字段投影的分页）、/api/logs/tail（增量读取）、
+    /api/stats、/api/files；第一个请求（sidecar 和缓存都不存在）单独记为 cold_ms，
+    其余请求统计 p50/p99/平均值
+  - 峰值 RSS（本进程及进程池子进程）
+结果连同提交号、Python 版本、JSON 后端等环境信息写入 JSON 文件，--compare 与之前的结果对比。
+
+用法: python benchmarks/bench_suite.py [--sizes 1MB,10MB] [--requests N] [--output 结果.json]
+                                      [--data-dir 目录] [--compare 旧结果.json]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEB_DIR)
+
+import gen_capture  # noqa: E402
+
+PARSER_SAMPLE_LINES = 200000  # 解析器吞吐只取前若干行
+TAIL_LINES = 1000
+SIDECAR_SUFFIXES = ('.idx', '.stats', '.search')
+# 前端日志列表请求的字段（static/script.js 的 LOG_FIELDS）
+CLIENT_FIELDS = ('timestamp_ms,direction,data,frame_info.type,frame_info.send_seq,frame_info.recv_seq,'
+                 'frame_info.type_id,frame_info.cause,frame_info.asdu_addr,frame_info.ioa,frame_info.value,'
+                 'frame_info.num_obj,frame_info.function,frame_info.description')
+
+
+# ---------- 子进程：测量一个数据集 ----------
+
+def percentile(values, fraction):
+    """最近秩百分位数"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def peak_rss_mb(children=False):
+    """峰值 RSS（MB），没有 resource 模块时为 None"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    return round(usage.ru_maxrss / 1024, 1)  # Linux 上单位为 KB
+
+
+def remove_sidecars(path):
+    for suffix in SIDECAR_SUFFIXES:
+        for name in (path + suffix, path + suffix + '.tmp'):
+            if os.path.exists(name):
+                os.remove(name)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def consume(func, items):
+    """逐个调用 func，不保留结果（避免测量本身占用内存）"""
+    for item in items:
+        func(item)
+
+
+def measure_throughput(path):
+    from frame_cache import iter_parsed_range
+    from iec104_parser import FastIEC104FrameParser, extract_log_fields, parse_log_line_json
+    from log_index import LogIndex
+    from log_stats import LogStats
+
+    with open(path, 'rb') as f:
+        lines = [line.decode('utf-8', errors='ignore') for _, line in zip(range(PARSER_SAMPLE_LINES), f)]
+    payloads = []
+    for line in lines:
+        fields = extract_log_fields(line.encode('utf-8'))
+        payload = FastIEC104FrameParser.decode_hex(fields[2]) if fields and fields[2] else None
+        if payload:
+            payloads.append(payload)
+
+    result = {}
+    _, elapsed = timed(lambda: consume(FastIEC104FrameParser.parse_bytes, payloads))
+    result['parse_bytes'] = len(payloads) / elapsed
+    _, elapsed = timed(lambda: consume(
+        lambda payload: FastIEC104FrameParser.parse_bytes(payload, describe=False, objects=False), payloads))
+    result['parse_bytes_compact'] = len(payloads) / elapsed
+    _, elapsed = timed(lambda: consume(parse_log_line_json, lines))
+    result['parse_log_line_json'] = len(lines) / elapsed
+
+    index = LogIndex(path)
+    _, elapsed = timed(index.refresh)
+    result['index'] = index.line_count / elapsed
+    stats = LogStats(path)
+    _, elapsed = timed(stats.refresh)
+    result['stats'] = index.line_count / elapsed
+    count, elapsed = timed(lambda: sum(1 for line in iter_parsed_range(path, 0, index.indexed_size)
+                                       if line.entry is not None))
+    result['full_parse'] = count / elapsed
+    return {name: round(value) for name, value in result.items()}, index.line_count
+
+
+def measure_endpoints(path, requests, seed):
+    import app
+    from log_index import get_log_index
+
+    client = app.app.test_client()
+    name = os.path.basename(path)
+    rng = random.Random(seed)
+
+    def logs_page():
+        total = get_log_index(path).line_count
+        page = rng.randrange(max(total // 100, 1)) + 1
+        return f'/api/logs?file={name}&page={page}&page_size=100'
+
+    def logs_page_fields():
+        return logs_page() + f'&fields={CLIENT_FIELDS}'
+
+    def logs_incremental():
+        # 从最后一个索引块起点增量读取（客户端落后约一个块时的追赶请求）
+        return f'/api/logs/tail?file={name}&position={get_log_index(path).offsets[-1]}'
+
+    scenarios = {
+        'logs_tail': lambda: f'/api/logs?file={name}&tail={TAIL_LINES}',
+        'logs_page': logs_page,
+        'logs_page_fields': logs_page_fields,
+        'logs_incremental': logs_incremental,
+        'stats': lambda: f'/api/stats?file={name}',
+        'files': lambda: '/api/files',
+    }
+    result = {}
+    for scenario, make_url in scenarios.items():
+        timings = []
+        for _ in range(requests + 1):
+            url = make_url()
+            start = time.perf_counter()
+            response = client.get(url)
+            body = response.get_data()
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200 or not response.get_json().get('success'):
+                raise RuntimeError(f'{url} 请求失败: {response.status_code} {body[:200]!r}')
+        cold, warm = timings[0], timings[1:]
+        result[scenario] = {
+            'cold_ms': round(cold, 3),
+            'p50_ms': round(percentile(warm, 0.5), 3),
+            'p99_ms': round(percentile(warm, 0.99), 3),
+            'mean_ms': round(sum(warm) / len(warm), 3),
+            'requests': len(warm),
+            'response_bytes': len(body)
+        }
+    return result
+
+
+def run_worker(args):
+    """在子进程中测量一个数据集，结果写入 args.result"""
+    import config
+    data_dir = os.path.dirname(os.path.dirname(os.path.abspath(args.worker)))
+    config.CLIENT_LOGS_DIR = os.path.join(data_dir, 'client')
+    config.SERVER_LOGS_DIR = os.path.join(data_dir, 'server')
+    config.ENABLE_SEARCH_INDEX = False
+    if args.no_parallel:
+        config.ENABLE_PARALLEL_PARSE = False
+
+    # 先导入应用：导入时查找 libc 会 fork 子进程，放在测量之后子进程峰值 RSS 会计入测量时的内存
+    import app  # noqa: F401
+    import parallel_parse
+
+    path = args.worker
+    remove_sidecars(path)
+    throughput, lines = measure_throughput(path)
+    remove_sidecars(path)  # 接口测量从冷状态开始
+    endpoints = measure_endpoints(path, args.requests, args.seed)
+    remove_sidecars(path)
+    parallel_parse.shutdown_pool()  # 进程池子进程退出后才计入子进程峰值 RSS
+
+    import serializer
+    result = {
+        'file_bytes': os.path.getsize(path),
+        'lines': lines,
+        'frames_per_sec': throughput,
+        'endpoints': endpoints,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_children_mb': peak_rss_mb(children=True),
+        'json_backend': serializer.backend,
+        'parallel_parse': config.ENABLE_PARALLEL_PARSE
+    }
+    with open(args.result, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    return 0
+
+
+# ---------- 主进程 ----------
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=WEB_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=WEB_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_dataset(data_dir, size_text, args):
+    """生成（或复用已有的）数据集，返回路径"""
+    client_dir = os.path.join(data_dir, 'client')
+    os.makedirs(client_dir, exist_ok=True)
+    os.makedirs(os.path.join(data_dir, 'server'), exist_ok=True)
+    path = os.path.join(client_dir, f'bench_{size_text}_seed{args.seed}.log')
+    if os.path.exists(path) and not args.regenerate:
+        return path
+    print(f'生成数据集 {path} ...', flush=True)
+    gen_capture.generate(path, gen_capture.parse_size(size_text), args.mix, args.malformed,
+                         args.objects, args.seed)
+    return path
+
+
+def print_summary(result):
+    for dataset in result['datasets']:
+        print(f"\n{dataset['name']}: {dataset['file_bytes'] / 1024 / 1024:.1f} MB, {dataset['lines']} 行, "
+              f"峰值 RSS {dataset['peak_rss_mb']} MB (子进程 {dataset['peak_rss_children_mb']} MB)")
+        print('  吞吐（帧/秒）: ' + ', '.join(f'{name} {value:,}'
+                                          for name, value in dataset['frames_per_sec'].items()))
+        for scenario, item in dataset['endpoints'].items():
+            print(f"  {scenario:<18} cold {item['cold_ms']:9.2f} ms  p50 {item['p50_ms']:8.2f} ms  "
+                  f"p99 {item['p99_ms']:8.2f} ms")
+
+
+def print_comparison(old, new):
+    """按数据集名称对比两次结果（比值 >1 表示新结果更好）"""
+    old_sets = {dataset['name']: dataset for dataset in old['datasets']}
+    print(f"\n对比 {old.get('commit')} -> {new.get('commit')}（比值 >1 表示变快）")
+    for dataset in new['datasets']:
+        base = old_sets.get(dataset['name'])
+        if base is None:
+            continue
+        print(f"{dataset['name']}:")
+        for name, value in dataset['frames_per_sec'].items():
+            if base['frames_per_sec'].get(name):
+                print(f"  {name:<20} {base['frames_per_sec'][name]:>12,} -> {value:>12,} 帧/秒 "
+                      f"({value / base['frames_per_sec'][name]:.2f}x)")
+        for scenario, item in dataset['endpoints'].items():
+            before = base['endpoints'].get(scenario)
+            if before and item['p50_ms']:
+                print(f"  {scenario:<20} p50 {before['p50_ms']:.2f} -> {item['p50_ms']:.2f} ms "
+                      f"({before['p50_ms'] / item['p50_ms']:.2f}x), "
+                      f"p99 {before['p99_ms']:.2f} -> {item['p99_ms']:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日志查看器热点路径的基准测试套件')
+    parser.add_argument('--sizes', default='1MB,10MB', help='数据集大小（逗号分隔），如 1MB,100MB,10GB')
+    parser.add_argument('--requests', type=int, default=50, help='每个接口场景的请求次数（不含 cold 请求）')
+    parser.add_argument('--output', help='结果文件（默认 benchmarks/results/<时间>_<提交号>.json）')
+    parser.add_argument('--data-dir', help='数据集目录（保留生成的日志供下次复用，默认使用临时目录）')
+    parser.add_argument('--regenerate', action='store_true', help='重新生成已存在的数据集')
+    parser.add_argument('--compare', help='与之前的结果文件对比')
+    parser.add_argument('--mix', default='i=85,s=10,u=5', help='生成数据集的 I/S/U 帧比例')
+    parser.add_argument('--malformed', type=float, default=0.001, help='生成数据集的错误行比例')
+    parser.add_argument('--objects', type=int, default=10, help='生成数据集每个 ASDU 最多的信息对象数')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    parser.add_argument('--no-parallel', action='store_true', help='关闭进程池并行解析')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return run_worker(args)
+
+    try:
+        sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+        for size in sizes:
+            gen_capture.parse_size(size)
+        gen_capture.parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='bench_suite_')
+    result = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'requests': args.requests,
+        'generator': {'mix': args.mix, 'malformed': args.malformed, 'objects': args.objects, 'seed': args.seed},
+        'datasets': []
+    }
+    try:
+        for size in sizes:
+            path = prepare_dataset(data_dir, size, args)
+            print(f'测量 {os.path.basename(path)} ...', flush=True)
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+                result_path = f.name
+            try:
+                command = [sys.executable, os.path.abspath(__file__), '--worker', path, '--result', result_path,
+                           '--requests', str(args.requests), '--seed', str(args.seed)]
+                if args.no_parallel:
+                    command.append('--no-parallel')
+                subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+                with open(result_path, encoding='utf-8') as f:
+                    dataset = json.load(f)
+            finally:
+                os.remove(result_path)
+            result['datasets'].append(dict(name=size, **dataset))
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"{time.strftime('%Y%m%d_%H%M%S')}_{result['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print_summary(result)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), result)
+    print(f'\n结果已写入 {output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,326 @@
+"""合成 IEC104 日志生成器
+
+按日志程序的格式（每行 {"dir":..,"time_ms":..,"len":..,"data":".."}）写出指定大小的日志，
+模拟一条客户端-服务端链路：STARTDT 握手和总召唤，之后是遥信/遥测上送（单点、双点、
+归一化值、标度化值、短浮点、累计量，带或不带 CP56Time2a 时标，SQ=0/1 的多对象 ASDU）、
+遥控和时钟同步、客户端的 S 帧确认、TESTFR 测试帧，并按比例插入各种格式错误的行。
+收发序号连续，客户端最迟收到 IEC104_W 个 I 帧后确认，序号分析不会报告跳号。
+
+用法: python benchmarks/gen_capture.py [--size 100MB] [--mix i=85,s=10,u=5]
+                                      [--malformed 0.001] [--objects 10] [--seed N] 输出文件
+输出文件以 .i104 结尾时写二进制日志（不插入错误行）。
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from binary_log import BinaryLogWriter  # noqa: E402
+
+SERVER_TO_CLIENT = 'ser -> cli'
+CLIENT_TO_SERVER = 'cli -> ser'
+
+# U 帧控制字节
+STARTDT_ACT, STARTDT_CON, TESTFR_ACT, TESTFR_CON = 0x07, 0x0B, 0x43, 0x83
+
+# 上送的类型标识: 类型 -> (权重, 信息元素长度, 是否带时标)
+MONITOR_TYPES = {
+    0x01: (20, 1, False),  # M_SP_NA_1 单点
+    0x03: (8, 1, False),   # M_DP_NA_1 双点
+    0x09: (10, 3, False),  # M_ME_NA_1 归一化值
+    0x0B: (10, 3, False),  # M_ME_NB_1 标度化值
+    0x0D: (25, 5, False),  # M_ME_NC_1 短浮点
+    0x0F: (4, 5, False),   # M_IT_NA_1 累计量
+    0x1E: (10, 1, True),   # M_SP_TB_1 带时标单点
+    0x1F: (5, 1, True),    # M_DP_TB_1 带时标双点
+    0x24: (8, 5, True),    # M_ME_TF_1 带时标短浮点
+}
+MAX_ASDU_LENGTH = 249  # APDU 长度字节最大 253，减去4字节控制域
+
+CP56_LENGTH = 7
+
+SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+    """'10MB'、'1.5GB'、'4096' 等转换为字节数"""
+    text = text.strip().upper()
+    number = text.rstrip('KMGB')
+    unit = text[len(number):]
+    if unit not in SIZE_UNITS:
+        raise ValueError(f'无法识别的大小: {text}')
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'i=85,s=10,u=5' 转换为各类帧的权重"""
+    mix = {'i': 0.0, 's': 0.0, 'u': 0.0}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip().lower()
+        if name not in mix:
+            raise ValueError(f'未知的帧类型: {name}')
+        mix[name] = float(weight)
+    if sum(mix.values()) <= 0:
+        raise ValueError('帧比例之和须大于0')
+    return mix
+
+
+def cp56time2a(time_ms: int) -> bytes:
+    """毫秒时间戳编码为 CP56Time2a（本地时间，与解析器一致）"""
+    dt = datetime.fromtimestamp(time_ms / 1000)
+    return struct.pack('<HBBBBB', dt.second * 1000 + dt.microsecond // 1000, dt.minute, dt.hour,
+                       dt.day | (dt.isoweekday() << 5), dt.month, dt.year - 2000)
+
+
+class LinkSimulator:
+    """生成一条链路上的帧序列 (方向, time_ms, APDU)"""
+
+    def __init__(self, rng: random.Random, mix: Dict[str, float], max_objects: int,
+                 start_ms: int, interval_ms: float, common_address: int = 1):
+        self.rng = rng
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.max_objects = max(1, min(max_objects, 127))
+        self.time_ms = start_ms
+        self.interval_ms = interval_ms
+        self.common_address = common_address
+        self.server_sent = 0   # 服务端已发送的 I 帧数（即服务端的发送序号）
+        self.client_sent = 0
+        self.unacked = 0       # 客户端尚未用 S 帧确认的 I 帧数
+        self.types = list(MONITOR_TYPES)
+        self.type_weights = [MONITOR_TYPES[type_id][0] for type_id in self.types]
+        self.values: Dict[int, float] = {}
+
+    # ---------- 帧构造 ----------
+
+    def _tick(self) -> int:
+        self.time_ms += max(1, int(self.rng.expovariate(1 / self.interval_ms)))
+        return self.time_ms
+
+    def _u_frame(self, code: int) -> bytes:
+        return bytes((0x68, 4, code, 0, 0, 0))
+
+    def _s_frame(self, recv_seq: int) -> bytes:
+        return bytes((0x68, 4, 0x01, 0)) + struct.pack('<H', (recv_seq % 32768) << 1)
+
+    def _i_frame(self, from_server: bool, asdu: bytes) -> bytes:
+        if from_server:
+            send, recv = self.server_sent, self.client_sent
+            self.server_sent += 1
+            self.unacked += 1
+        else:
+            send, recv = self.client_sent, self.server_sent
+            self.client_sent += 1
+            self.unacked = 0  # I 帧同时确认了对端已发送的帧
+        control = struct.pack('<HH', (send % 32768) << 1, (recv % 32768) << 1)
+        return bytes((0x68, len(asdu) + 4)) + control + asdu
+
+    def _asdu_header(self, type_id: int, count: int, sequence: bool, cot: int) -> bytes:
+        vsq = count | (0x80 if sequence else 0)
+        return struct.pack('<BBBBH', type_id, vsq, cot, 0, self.common_address)
+
+    def _element(self, type_id: int, ioa: int) -> bytes:
+        rng = self.rng
+        quality = 0x80 if rng.random() < 0.01 else 0  # 偶尔置 IV
+        if type_id in (0x01, 0x1E):
+            return bytes((rng.randint(0, 1) | quality,))
+        if type_id in (0x03, 0x1F):
+            return bytes((rng.choice((1, 2, 2, 2, 0, 3)) | quality,))
+        if type_id == 0x0F:
+            return struct.pack('<iB', rng.randint(0, 10 ** 6), rng.randint(0, 31))
+        # 测量值在上一个值附近随机游走
+        value = self.values.get(ioa, rng.uniform(-100, 400)) + rng.gauss(0, 1)
+        self.values[ioa] = value
+        if type_id in (0x0D, 0x24):
+            return struct.pack('<fB', value, quality)
+        if type_id == 0x09:
+            return struct.pack('<hB', max(-32768, min(32767, int(value * 80))), quality)
+        return struct.pack('<hB', max(-32768, min(32767, int(value))), quality)
+
+    def _monitor_asdu(self, cot: int) -> bytes:
+        rng = self.rng
+        type_id = rng.choices(self.types, self.type_weights)[0]
+        _, element_len, timed = MONITOR_TYPES[type_id]
+        # 对象数偏向小值：多数 ASDU 只有一两个对象；不超过 APDU 长度上限
+        count = min(self.max_objects, int(rng.paretovariate(1.2)))
+        sequence = count > 1 and rng.random() < 0.3
+        step = element_len + (CP56_LENGTH if timed else 0) + (0 if sequence else 3)
+        count = min(count, (MAX_ASDU_LENGTH - 6 - (3 if sequence else 0)) // step)
+        base = rng.randrange(1, 16000)
+        parts = [self._asdu_header(type_id, count, sequence, cot)]
+        for i in range(count):
+            ioa = base + i
+            if not sequence or i == 0:
+                parts.append(struct.pack('<HB', ioa & 0xFFFF, ioa >> 16))
+            parts.append(self._element(type_id, ioa))
+            if timed:
+                parts.append(cp56time2a(self.time_ms - rng.randrange(0, 50)))
+        return b''.join(parts)
+
+    def _command(self, type_id: int, cot: int, ioa: int, element: bytes) -> bytes:
+        return self._asdu_header(type_id, 1, False, cot) + struct.pack('<HB', ioa & 0xFFFF, ioa >> 16) + element
+
+    # ---------- 帧序列 ----------
+
+    def _from_server(self, asdu: bytes) -> Iterator[Tuple[str, int, bytes]]:
+        """服务端发送一个 I 帧；客户端最迟在收到 w 个 I 帧后用 S 帧确认"""
+        yield SERVER_TO_CLIENT, self._tick(), self._i_frame(True, asdu)
+        if self.unacked >= config.IEC104_W:
+            self.unacked = 0
+            yield CLIENT_TO_SERVER, self._tick(), self._s_frame(self.server_sent)
+
+    def _interrogation(self) -> Iterator[Tuple[str, int, bytes]]:
+        """总召唤：激活、确认、若干应答、激活终止"""
+        yield CLIENT_TO_SERVER, self._tick(), self._i_frame(False, self._command(0x64, 6, 0, b'\x14'))
+        yield from self._from_server(self._command(0x64, 7, 0, b'\x14'))
+        for _ in range(self.rng.randint(3, 20)):
+            yield from self._from_server(self._monitor_asdu(20))
+        yield from self._from_server(self._command(0x64, 10, 0, b'\x14'))
+
+    def _control(self) -> Iterator[Tuple[str, int, bytes]]:
+        """遥控或时钟同步：激活与确认"""
+        if self.rng.random() < 0.8:
+            type_id, ioa, element = 0x2D, self.rng.randrange(24577, 24700), bytes((self.rng.randint(0, 1),))
+        else:
+            type_id, ioa, element = 0x67, 0, cp56time2a(self.time_ms)
+        yield CLIENT_TO_SERVER, self._tick(), self._i_frame(False, self._command(type_id, 6, ioa, element))
+        yield from self._from_server(self._command(type_id, 7, ioa, element))
+
+    def frames(self) -> Iterator[Tuple[str, int, bytes]]:
+        """无限的帧序列"""
+        rng = self.rng
+        yield CLIENT_TO_SERVER, self._tick(), self._u_frame(STARTDT_ACT)
+        yield SERVER_TO_CLIENT, self._tick(), self._u_frame(STARTDT_CON)
+        yield from self._interrogation()
+        while True:
+            kind = rng.choices(self.kinds, self.weights)[0]
+            if kind == 'i':
+                roll = rng.random()
+                if roll < 0.002:
+                    yield from self._interrogation()
+                elif roll < 0.02:
+                    yield from self._control()
+                else:
+                    cot = 1 if rng.random() < 0.2 else 3  # 周期 / 突发
+                    yield from self._from_server(self._monitor_asdu(cot))
+            elif kind == 's':
+                if self.unacked:
+                    self.unacked = 0
+                    yield CLIENT_TO_SERVER, self._tick(), self._s_frame(self.server_sent)
+            else:
+                sender, receiver = ((CLIENT_TO_SERVER, SERVER_TO_CLIENT) if rng.random() < 0.5
+                                    else (SERVER_TO_CLIENT, CLIENT_TO_SERVER))
+                yield sender, self._tick(), self._u_frame(TESTFR_ACT)
+                yield receiver, self._tick(), self._u_frame(TESTFR_CON)
+
+
+def format_line(direction: str, time_ms: int, payload: bytes) -> bytes:
+    """日志程序格式的一行（data 末尾带空格，与实际日志一致）"""
+    data = payload.hex(' ') + ' ' if payload else ''
+    return (f'{{"dir":"{direction}","time_ms":{time_ms},"len":{len(payload)},'
+            f'"data":"{data}"}}\n').encode('ascii')
+
+
+def malformed_line(rng: random.Random, direction: str, time_ms: int, payload: bytes) -> Tuple[str, bytes]:
+    """由一帧构造一行格式错误的日志，返回 (错误种类, 行)"""
+    kind = rng.choice(('truncated', 'bad_hex', 'bad_start', 'short_apdu', 'garbage'))
+    line = format_line(direction, time_ms, payload)
+    if kind == 'truncated':
+        return kind, line[:rng.randrange(1, len(line) - 1)] + b'\n'
+    if kind == 'bad_hex':
+        return kind, line.replace(b'"data":"68', b'"data":"6g', 1)
+    if kind == 'bad_start':
+        return kind, format_line(direction, time_ms, b'\x69' + payload[1:])
+    if kind == 'short_apdu':
+        return kind, format_line(direction, time_ms, payload[:max(2, len(payload) // 2)])
+    return kind, b'\x00garbage ' + os.urandom(8).hex().encode('ascii') + b'\n'
+
+
+def generate(path: str, size: int, mix: str = 'i=85,s=10,u=5', malformed: float = 0.001,
+             max_objects: int = 10, seed: int = 1, start_ms: int = 1762768548176,
+             interval_ms: float = 50.0) -> Dict[str, int]:
+    """写出约 size 字节的日志（写满最后一行为止），返回各类计数"""
+    rng = random.Random(seed)
+    simulator = LinkSimulator(rng, parse_mix(mix), max_objects, start_ms, interval_ms)
+    counts = {'lines': 0, 'frames': 0, 'I': 0, 'S': 0, 'U': 0, 'malformed': 0, 'bytes': 0}
+    binary = path.endswith(config.BINARY_LOG_SUFFIX)
+    if os.path.exists(path):
+        os.remove(path)
+
+    def count_frame(payload: bytes) -> None:
+        counts['frames'] += 1
+        control = payload[2]
+        counts['I' if control & 0x01 == 0 else 'S' if control & 0x03 == 0x01 else 'U'] += 1
+
+    frames = simulator.frames()
+    if binary:
+        with BinaryLogWriter(path) as writer:
+            written = 0
+            while written < size:
+                direction, time_ms, payload = next(frames)
+                writer.write('TX' if direction == SERVER_TO_CLIENT else 'RX', time_ms, payload)
+                written += 11 + len(payload)
+                count_frame(payload)
+                counts['lines'] += 1
+        counts['bytes'] = os.path.getsize(path)
+        return counts
+
+    with open(path, 'wb', buffering=1024 * 1024) as f:
+        batch = []
+        written = 0
+        while written < size:
+            direction, time_ms, payload = next(frames)
+            if malformed and rng.random() < malformed:
+                _, line = malformed_line(rng, direction, time_ms, payload)
+                counts['malformed'] += 1
+            else:
+                line = format_line(direction, time_ms, payload)
+                count_frame(payload)
+            batch.append(line)
+            written += len(line)
+            counts['lines'] += 1
+            if len(batch) >= 4096:
+                f.write(b''.join(batch))
+                batch.clear()
+        f.write(b''.join(batch))
+    counts['bytes'] = written
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成 IEC104 日志生成器')
+    parser.add_argument('output', help='输出文件（.log 为文本日志，.i104 为二进制日志）')
+    parser.add_argument('--size', default='100MB', help='目标大小，如 1MB、500MB、10GB')
+    parser.add_argument('--mix', default='i=85,s=10,u=5', help='I/S/U 帧的比例')
+    parser.add_argument('--malformed', type=float, default=0.001, help='格式错误行的比例')
+    parser.add_argument('--objects', type=int, default=10, help='每个 ASDU 最多的信息对象数')
+    parser.add_argument('--interval-ms', type=float, default=50.0, help='相邻帧的平均间隔（毫秒）')
+    parser.add_argument('--start-ms', type=int, default=1762768548176, help='首帧时间（毫秒时间戳）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子（相同参数生成相同文件）')
+    args = parser.parse_args()
+
+    try:
+        size = parse_size(args.size)
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    counts = generate(args.output, size, args.mix, args.malformed, args.objects, args.seed,
+                      args.start_ms, args.interval_ms)
+    elapsed = time.perf_counter() - start
+    print(f"{args.output}: {counts['bytes'] / 1024 / 1024:.1f} MB, {counts['lines']} 行, "
+          f"I {counts['I']} / S {counts['S']} / U {counts['U']}, 错误行 {counts['malformed']}, "
+          f"耗时 {elapsed:.1f}s ({counts['bytes'] / 1024 / 1024 / elapsed:.1f} MB/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""二进制日志格式
+
+文本日志每帧一行 JSON（方向、时间、十六进制报文），体积约为报文本身的 4 倍，
+读取时每行都要 JSON 解析和十六进制解码。二进制日志（.i104）直接保存原始报文：
+
+    文件头（16 字节）: 魔数 b'IEC104BL', 版本 u16, 文件头长度 u16, 保留 u32
+    记录（11 字节记录头 + 报文）: 报文长度 u16, 方向 u8, time_ms i64, APDU 原始字节
+
+整数均为小端，方向编码为 DIRECTIONS 的下标。记录按时间顺序追加，最后一条记录不完整
+（正在写入）时读取方忽略它，日志程序可以直接追加写入（BinaryLogWriter）。
+块索引沿用行偏移索引（.idx）：每 INDEX_BLOCK_LINES 条记录一个块，记录块起始偏移和
+time_ms 范围，建立时只读记录头。上层模块把每条记录当作一"行"，行号、偏移、分页、
+增量读取等逻辑与文本日志相同。
+
+读取时把文件映射到内存（mmap），按记录头逐条取出报文的 memoryview 直接交给帧解析器，
+不经过 JSON 和十六进制解码，也不复制报文。
+
+命令行把文本日志（含 .log.gz/.log.zst）转换为二进制日志：
+    python binary_log.py 输入.log [输入2.log ...] [-o 输出.i104]
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import config
+from event_log import log_event
+from iec104_parser import (DIRECTION_DESC, FastIEC104FrameParser, classify_direction,
+                           extract_log_fields, format_timestamp)
+from log_source import open_log
+
+MAGIC = b'IEC104BL'
+VERSION = 1
+FILE_HEADER = struct.Struct('<8sHHI')
+RECORD_HEADER = struct.Struct('<HBq')
+MAX_PAYLOAD = 0xFFFF
+
+# 方向编码（记录中保存下标），以及转换回文本日志时使用的 dir 字段
+DIRECTIONS = ('TX', 'RX', 'UNKNOWN')
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+_DIR_TEXT = {'TX': 'ser -> cli', 'RX': 'cli -> ser', 'UNKNOWN': ''}
+
+# 记录: (记录偏移, 记录长度, 方向编码, time_ms, 报文)
+Record = Tuple[int, int, int, int, memoryview]
+
+
+def is_binary_log(filepath: str) -> bool:
+    return filepath.endswith(config.BINARY_LOG_SUFFIX)
+
+
+def direction_name(code: int) -> str:
+    return DIRECTIONS[code] if code < len(DIRECTIONS) else 'UNKNOWN'
+
+
+def iter_records(buf, start: int, end: int) -> Iterator[Record]:
+    """buf[start:end) 内的完整记录（start 须为记录起点），报文为 buf 的 memoryview，仅在迭代期间有效"""
+    view = memoryview(buf)
+    unpack = RECORD_HEADER.unpack_from
+    header_size = RECORD_HEADER.size
+    pos = start
+    while pos + header_size <= end:
+        length, direction, time_ms = unpack(buf, pos)
+        record_end = pos + header_size + length
+        if record_end > end:
+            break
+        yield pos, record_end - pos, direction, time_ms, view[pos + header_size:record_end]
+        pos = record_end
+
+
+class BinaryLogReader:
+    """以内存映射方式只读打开的二进制日志（映射范围为打开时的文件大小）"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.size = 0
+        self.data_start = FILE_HEADER.size
+        self._map: Optional[mmap.mmap] = None
+        with open(filepath, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < FILE_HEADER.size:
+                return  # 空文件或文件头尚未写完
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_size, _ = FILE_HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or header_size < FILE_HEADER.size:
+            log_event('binary_log_unsupported', path=filepath)
+            self.close()
+            return
+        self.size = size
+        self.data_start = header_size
+
+    def records(self, start: int = 0, end: Optional[int] = None) -> Iterator[Record]:
+        """[start, end) 内的完整记录（start 为0时从第一条记录开始）"""
+        if self._map is None:
+            return iter(())
+        end = self.size if end is None else min(end, self.size)
+        return iter_records(self._map, max(start, self.data_start), end)
+
+    def record(self, offset: int, length: int) -> bytes:
+        """记录的原始字节（复制）"""
+        return self._map[offset:offset + length]
+
+    def close(self) -> None:
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # 调用方仍持有报文视图，映射在视图释放后回收
+            self._map = None
+
+    def __enter__(self) -> 'BinaryLogReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def record_entry(dir_type: str, time_ms: int, payload) -> Dict[str, Any]:
+    """由方向（TX/RX/UNKNOWN）、时间和报文构造与 parse_log_line_json 相同结构的条目
+
+    raw 为等价的文本日志行。
+    """
+    data_hex = payload.hex(' ')
+    return {
+        'timestamp': format_timestamp(time_ms),
+        'timestamp_ms': time_ms,
+        'direction': dir_type,
+        'direction_desc': DIRECTION_DESC.get(dir_type) or '未知方向',
+        'length': len(payload),
+        'data': data_hex,
+        'frame_info': FastIEC104FrameParser.parse_bytes(payload) if payload else {},
+        'raw': (f'{{"dir":"{_DIR_TEXT[dir_type]}","time_ms":{time_ms},"len":{len(payload)},'
+                f'"data":"{data_hex + " " if data_hex else ""}"}}')
+    }
+
+
+def parse_record(record: bytes) -> Optional[Dict[str, Any]]:
+    """解析一条完整记录的原始字节，长度不符时返回 None"""
+    if len(record) < RECORD_HEADER.size:
+        return None
+    length, direction, time_ms = RECORD_HEADER.unpack_from(record)
+    if len(record) != RECORD_HEADER.size + length:
+        return None
+    return record_entry(direction_name(direction), time_ms, memoryview(record)[RECORD_HEADER.size:])
+
+
+class BinaryLogWriter:
+    """追加写入二进制日志（新文件先写文件头）"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._file = open(filepath, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(FILE_HEADER.pack(MAGIC, VERSION, FILE_HEADER.size, 0))
+            return
+        with open(filepath, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header)[:2] != (MAGIC, VERSION):
+            self._file.close()
+            raise ValueError(f'不是二进制日志或版本不受支持: {filepath}')
+
+    def write(self, direction: str, time_ms: int, payload: bytes) -> None:
+        """写入一帧，direction 为 TX/RX/UNKNOWN"""
+        if len(payload) > MAX_PAYLOAD:
+            raise ValueError(f'报文过长: {len(payload)} 字节')
+        code = DIRECTION_CODES.get(direction, DIRECTION_CODES['UNKNOWN'])
+        self._file.write(RECORD_HEADER.pack(len(payload), code, time_ms) + payload)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'BinaryLogWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def convert_log(source: str, target: str) -> Dict[str, int]:
+    """把文本日志转换为二进制日志（先写临时文件再替换）
+
+    只转换以换行结尾的完整行；无法解析或报文不是合法十六进制的行被跳过并计数，
+    非标准的 dir 字段按 TX/RX/UNKNOWN 归类保存。
+    """
+    counts = {'lines': 0, 'records': 0, 'skipped': 0}
+    tmp_path = target + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with open_log(source) as f, BinaryLogWriter(tmp_path) as writer:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            line = line.strip()
+            if not line:
+                continue
+            counts['lines'] += 1
+            fields = extract_log_fields(line, config.LOG_ENCODING)
+            payload = None
+            if fields is not None:
+                payload = FastIEC104FrameParser.decode_hex(fields[2]) if fields[2] else b''
+            if payload is None or len(payload) > MAX_PAYLOAD:
+                counts['skipped'] += 1
+                continue
+            writer.write(classify_direction(fields[0]), fields[1], payload)
+            counts['records'] += 1
+    os.replace(tmp_path, target)
+    return counts
+
+
+def binary_log_path(source: str) -> str:
+    """文本日志对应的二进制日志文件名（去掉 .log 及压缩后缀）"""
+    base = source
+    for suffix in ('.gz', '.zst', '.log'):
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+    return base + config.BINARY_LOG_SUFFIX
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='把文本日志转换为二进制日志')
+    parser.add_argument('inputs', nargs='+', help='文本日志文件（.log/.log.gz/.log.zst）')
+    parser.add_argument('-o', '--output', help='输出文件（仅转换单个文件时可用，默认与输入同目录）')
+    args = parser.parse_args()
+    if args.output and len(args.inputs) > 1:
+        parser.error('转换多个文件时不能指定 --output')
+
+    for source in args.inputs:
+        target = args.output or binary_log_path(source)
+        counts = convert_log(source, target)
+        source_size, target_size = os.path.getsize(source), os.path.getsize(target)
+        print(f"{source} -> {target}: {counts['records']} 帧, 跳过 {counts['skipped']} 行, "
+              f"{source_size} -> {target_size} 字节 ({target_size / max(source_size, 1):.1%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
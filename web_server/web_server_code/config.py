@@ -22,7 +22,87 @@ MAX_LOG_LINES = 1000  # 默认最多读取的日志行数
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
 
 # 允许的文件扩展名
-ALLOWED_EXTENSIONS = {'.log'}
+ALLOWED_EXTENSIONS = {'.log', '.log.gz', '.log.zst', '.i104'}  # .log.zst 需要安装 zstandard
+
+# 行偏移索引配置
+INDEX_BLOCK_LINES = 1000  # 每个索引块包含的行数
+INDEX_SUFFIX = '.idx'     # 索引文件后缀（与日志文件同目录）
+
+# 统计配置
+STATS_SUFFIX = '.stats'              # 累计统计文件后缀（与日志文件同目录）
+STATS_RATE_SUFFIX = '.rate'          # 每秒帧数文件后缀（只追加，见 log_stats.py）
+STATS_CHUNK_BYTES = 4 * 1024 * 1024  # 增量统计每次读取的字节数
+
+# 压缩日志配置
+COMPRESSED_CHECKPOINT_BYTES = 1024 * 1024  # 随机访问检查点间隔（解压后字节数，gzip 每个检查点约 40KB 内存）
+COMPRESSED_CHECKPOINT_MAX_BYTES = 64 * 1024 * 1024  # 全部压缩文件检查点的内存预算（估算值）
+
+# 二进制日志配置
+BINARY_LOG_SUFFIX = '.i104'  # 二进制日志文件后缀（格式见 binary_log.py）
+
+# 增量读取配置
+TAIL_MAX_BYTES = 1024 * 1024  # 单次增量读取的最大字节数，落后较多的客户端分多次追上
+TAIL_CHUNK_BYTES = 64 * 1024  # 增量读取的分块大小
+
+# JSON 序列化配置
+JSON_BACKEND = 'auto'  # auto / orjson / ujson / json，auto 按 orjson、ujson、json 顺序取第一个已安装的
+
+# 指标与日志配置
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # 耗时直方图各桶上界（秒）
+LOG_LEVEL = 'INFO'       # 结构化日志的最低级别
+LOG_RATE_INTERVAL = 10.0 # 同一事件的日志限频窗口（秒）
+LOG_RATE_BURST = 5       # 每个窗口内同一事件最多输出的条数，其余只计数
+
+# HTTP 缓存与压缩配置
+COMPRESS_MIN_BYTES = 1024            # 小于该大小的响应不压缩
+COMPRESS_FLUSH_BYTES = 64 * 1024     # 流式响应每累计该大小的输入刷新一次压缩输出
+GZIP_LEVEL = 6                       # gzip 压缩级别（1-9）
+BROTLI_QUALITY = 4                   # brotli 压缩质量（0-11，动态响应不宜过高）；brotli 为可选依赖
+
+# 实时推送配置
+LIVE_TAIL_POLL_INTERVAL = 0.5       # 无 inotify 时 stat 轮询间隔（秒）
+LIVE_TAIL_INOTIFY_TIMEOUT = 5.0     # inotify 等待超时，超时后兜底 stat 一次（秒）
+LIVE_TAIL_HEARTBEAT = 15.0          # SSE 心跳间隔（秒）
+LIVE_TAIL_QUEUE_SIZE = 256          # 每个订阅者最多积压的消息数
+
+# 并行解析配置
+ENABLE_PARALLEL_PARSE = True
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024   # 待解析数据超过该大小时使用进程池
+PARALLEL_CHUNK_BYTES = 8 * 1024 * 1024  # 每个任务处理的字节区间大小（按换行对齐）
+PARALLEL_WORKERS = 0                    # 进程数，0 表示 CPU 核数
+PARALLEL_START_METHOD = 'spawn'         # 进程启动方式（Web 服务是多线程的，不使用 fork）
+
+# 导出配置
+EXPORT_CHUNK_BYTES = 4 * 1024 * 1024      # 每个导出任务处理的字节数（按索引块合并）
+EXPORT_ROW_GROUP_ROWS = 128 * 1024         # Parquet 行组的行数（写出前在内存中累计）
+EXPORT_PARQUET_COMPRESSION = 'zstd'        # Parquet 列压缩算法；Parquet/Arrow 导出需要安装 pyarrow
+
+# 时间序列配置
+TIMESERIES_DEFAULT_POINTS = 1000  # 默认降采样后的点数
+TIMESERIES_MAX_POINTS = 10000     # 单次返回的最大点数
+
+# 序号分析配置
+IEC104_K = 12                 # 发送方未确认I帧数上限
+IEC104_W = 8                  # 接收方最迟在收到 w 个I帧后确认
+SEQUENCE_MAX_EVENTS = 10000   # 保存的事件（跳号/重复/窗口超限/会话）条数上限，计数不受限制
+SEQUENCE_MAX_WINDOW_BUCKETS = 10000  # 窗口深度序列的桶数上限，超出时桶宽加倍
+SEQUENCE_MAX_FILES = 32       # 保存增量分析状态的文件数上限（按最近使用淘汰）
+
+# 两端日志关联配置
+CORRELATION_WINDOW_MS = 10000  # 同一帧在两端记录时间的最大差值，超出则计为未匹配
+
+# 跨文件检索配置
+ENABLE_SEARCH_INDEX = True    # 启动后台检索索引线程
+SEARCH_SUFFIX = '.search'     # 检索索引文件后缀（与日志文件同目录）
+SEARCH_INDEX_INTERVAL = 5.0   # 后台扫描日志目录的间隔（秒）
+SEARCH_GRAM_BITS = 14         # 每块报文三字节组位图的位数（2^14 位 = 2KB）
+
+# 文件列表配置
+FILE_CATALOG_RESCAN_INTERVAL = 60.0  # 目录 mtime 未变化时也完整重新扫描的间隔（秒），兜底 mtime 精度不足或 NFS 属性缓存
+FILE_CATALOG_ACTIVE_SECONDS = 300.0  # 最近该时间内修改过的文件视为正在写入，每次列表时重新 stat
+FILE_PROBE_BYTES = 8 * 1024          # 探测首末帧时间时读取的文件头部/尾部字节数
+FILE_TIME_MIN_MS = 946684800000      # 早于该时间（2000-01-01）的帧时间视为无效，不作为首末帧时间
+FILE_TIME_MAX_AHEAD_MS = 86400000    # 晚于当前时间超过该值的帧时间同样视为无效
 
 # 分页配置
 DEFAULT_PAGE_SIZE = 100
@@ -32,8 +112,10 @@ MAX_PAGE_SIZE = 1000
 CORS_ORIGINS = '*'  # 生产环境建议设置具体域名
 
 # 缓存配置
-ENABLE_CACHE = False
-CACHE_TIMEOUT = 300  # 5分钟
+ENABLE_CACHE = True
+CACHE_TIMEOUT = 300  # 5分钟（缓存块闲置超过该时间后失效）
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # 已解析帧缓存的内存预算（估算值）
+FRAME_STORE_MAX_BYTES = 512 * 1024 * 1024  # 列式帧存储的内存预算（超出时按文件淘汰）
 
 print(f"配置加载完成:")
 print(f"  基础目录: {BASE_DIR}")
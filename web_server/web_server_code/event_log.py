@@ -0,0 +1,60 @@
+"""限频的结构化日志
+
+高频事件（日志行解析失败、帧长度不符等）不逐条 print：每条事件输出为一行 JSON
+{"ts", "level", "event", ...}，同一事件在 LOG_RATE_INTERVAL 秒内最多输出 LOG_RATE_BURST 条，
+其余只计数，被抑制的条数放在该事件下一次输出的 suppressed 字段中。
+经标准 logging 输出（logger 名为 iec104），默认写到 stderr。
+"""
+import logging
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import config
+import metrics
+from serializer import dumps
+
+logger = logging.getLogger('iec104')
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(config.LOG_LEVEL)
+    logger.propagate = False
+
+_lock = threading.Lock()
+# 事件名 -> [窗口起点, 窗口内已输出条数, 待报告的被抑制条数]
+_windows: Dict[str, List[float]] = {}
+
+
+def log_event(event: str, level: int = logging.WARNING, **fields: Any) -> None:
+    """输出一条结构化日志（按事件名限频）"""
+    metrics.LOG_EVENTS.inc(event)
+    if not logger.isEnabledFor(level):
+        return
+    now = time.monotonic()
+    with _lock:
+        state = _windows.get(event)
+        if state is None or now - state[0] >= config.LOG_RATE_INTERVAL:
+            state = _windows[event] = [now, 0, state[2] if state else 0]
+        allowed = state[1] < config.LOG_RATE_BURST
+        if allowed:
+            state[1] += 1
+            suppressed, state[2] = state[2], 0
+        else:
+            state[2] += 1
+    if not allowed:
+        metrics.LOG_EVENTS_SUPPRESSED.inc(event)
+        return
+
+    record = {
+        'ts': datetime.now().isoformat(timespec='milliseconds'),
+        'level': logging.getLevelName(level).lower(),
+        'event': event
+    }
+    record.update(fields)
+    if suppressed:
+        record['suppressed'] = int(suppressed)
+    logger.log(level, dumps(record, default=str))
@@ -0,0 +1,310 @@
+"""日志文件目录缓存
+
+/api/files 每次都 listdir 加逐个 stat、格式化、排序，文件多且在 NFS 上时要几秒。
+每个日志目录对应一个 FileCatalog，用 os.scandir 扫描后缓存条目：目录 mtime 变化时
+（增删、改名文件）只 stat 新出现的文件；最近修改过的文件视为正在写入，每次列表时
+重新 stat；另外每隔 FILE_CATALOG_RESCAN_INTERVAL 完整扫描一次兜底。
+
+条目附带首末帧时间和帧数：首末帧时间读取文件头部/尾部各 FILE_PROBE_BYTES 字节探测，
+不合理的时间（早于 FILE_TIME_MIN_MS 或超前当前时间，多为损坏的行）不计；压缩日志的末帧时间
+只能取自覆盖整个文件的行偏移索引。帧数在累计统计覆盖整个文件时取自统计（精确，不含无法解析的行），
+否则取索引的行数或按平均行长估算（不精确）。探测结果随文件 (大小, mtime, inode) 缓存，
+只在条目被返回或参与时间过滤时才探测。
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from binary_log import BinaryLogReader, is_binary_log
+from event_log import log_event
+from iec104_parser import extract_log_fields
+from log_index import cached_log_index
+from log_source import compression_of, is_log_file, open_log
+from log_stats import cached_log_stats
+
+# 探测得到的元数据字段（未知时为 None）
+METADATA_FIELDS = ('first_time_ms', 'last_time_ms', 'frame_count', 'frame_count_exact')
+
+
+def format_file_size(size_bytes: int) -> str:
+    """格式化文件大小"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} TB"
+
+
+def _stat_key(stats: os.stat_result) -> Tuple[int, int, int]:
+    return stats.st_size, stats.st_mtime_ns, stats.st_ino
+
+
+# ---------- 元数据探测 ----------
+
+def _plausible(time_ms: int) -> bool:
+    """帧时间是否合理（排除损坏的行中的时间）"""
+    return config.FILE_TIME_MIN_MS <= time_ms <= time.time() * 1000 + config.FILE_TIME_MAX_AHEAD_MS
+
+
+def _line_time(line: bytes) -> Optional[int]:
+    fields = extract_log_fields(line, config.LOG_ENCODING)
+    return fields[1] if fields is not None and _plausible(fields[1]) else None
+
+
+def _is_frame(line: bytes) -> bool:
+    """与累计统计的计数口径一致：非空且能取出字段的行"""
+    line = line.strip()
+    return bool(line) and extract_log_fields(line, config.LOG_ENCODING) is not None
+
+
+def _probe_text(filepath: str, size: int) -> Dict[str, Any]:
+    """文本日志（含压缩日志）：头部取首帧时间和平均行长，尾部取末帧时间"""
+    probe = config.FILE_PROBE_BYTES
+    with open_log(filepath) as f:
+        head = f.read(probe)
+        complete = head[:head.rfind(b'\n') + 1]
+        lines = complete.splitlines()
+        first = next(filter(None, map(_line_time, lines)), None)
+        if len(head) < probe:
+            # 整个文件都在头部样本内，结果是精确的
+            tail_lines, count, exact = lines, sum(map(_is_frame, lines)), True
+        elif compression_of(filepath) is not None:
+            # 压缩文件定位到末尾需要完整解压，末帧时间和帧数未知
+            return {'first_time_ms': first, 'last_time_ms': None,
+                    'frame_count': None, 'frame_count_exact': False}
+        else:
+            f.seek(size - probe)
+            tail = f.read(probe)
+            if size > probe:
+                tail = tail[tail.find(b'\n') + 1:]  # 去掉被截断的第一行
+            tail_lines = tail[:tail.rfind(b'\n') + 1].splitlines()
+            count = round(size * len(lines) / len(complete)) if complete else None
+            exact = False
+    last = next(filter(None, map(_line_time, reversed(tail_lines))), None)
+    return {'first_time_ms': first, 'last_time_ms': last, 'frame_count': count, 'frame_count_exact': exact}
+
+
+def _probe_binary(filepath: str) -> Dict[str, Any]:
+    """二进制日志：读取头部的记录，末帧时间只有记录全部在样本内时可知"""
+    with BinaryLogReader(filepath) as reader:
+        sample_end = reader.data_start + config.FILE_PROBE_BYTES
+        headers = [record[:4] for record in reader.records(0, sample_end)]
+        sampled_end = headers[-1][0] + headers[-1][1] if headers else reader.data_start
+        whole = sampled_end >= reader.size
+        count = len(headers)
+        if not whole:
+            count = (round((reader.size - reader.data_start) * count / (sampled_end - reader.data_start))
+                     if headers else None)
+        times = [header[3] for header in headers if _plausible(header[3])]
+        return {'first_time_ms': times[0] if times else None,
+                'last_time_ms': times[-1] if times and whole else None,
+                'frame_count': count, 'frame_count_exact': whole}
+
+
+def probe_file(filepath: str, stats: os.stat_result) -> Dict[str, Any]:
+    """文件的首末帧时间和帧数（METADATA_FIELDS），读取失败时各项为 None"""
+    try:
+        if is_binary_log(filepath):
+            metadata = _probe_binary(filepath)
+        else:
+            metadata = _probe_text(filepath, stats.st_size)
+    except Exception as e:
+        log_event('file_probe_failed', path=filepath, error=str(e))
+        metadata = dict.fromkeys(METADATA_FIELDS)
+
+    key = _stat_key(stats)
+    if not metadata['frame_count_exact']:
+        index = cached_log_index(filepath)
+        if index is not None and (index.file_size, index.mtime_ns, index.inode) == key:
+            if metadata['last_time_ms'] is None:
+                # 尾部样本取不到（压缩日志等）时用各块的最大时间
+                highs = [value for value in index.max_ms if _plausible(value)]
+                metadata['last_time_ms'] = max(highs) if highs else None
+            # 行数含空行和无法解析的行，只作为估计
+            metadata['frame_count'] = index.line_count
+        log_stats = cached_log_stats(filepath)
+        if log_stats is not None and (log_stats.file_size, log_stats.mtime_ns, log_stats.inode) == key:
+            metadata['frame_count'] = log_stats.total
+            metadata['frame_count_exact'] = True
+    return metadata
+
+
+# ---------- 目录缓存 ----------
+
+class FileCatalog:
+    """一个日志目录的文件列表缓存（条目按修改时间从新到旧排列）"""
+
+    def __init__(self, directory: str, file_type: str):
+        self.directory = directory
+        self.file_type = file_type
+        self.lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._stats: Dict[str, os.stat_result] = {}
+        self._sorted: List[Dict[str, Any]] = []
+        self._signature = ''  # 全部文件名与 (大小, mtime, inode) 的摘要，列表内容变化时随之变化
+        self._dir_mtime_ns: Optional[int] = None
+        self._scanned_at: Optional[float] = None
+        self.scans = 0
+
+    def _make_entry(self, name: str, stats: os.stat_result) -> Dict[str, Any]:
+        return {
+            'name': name,
+            'path': os.path.join(self.directory, name),
+            'size': stats.st_size,
+            'size_formatted': format_file_size(stats.st_size),
+            'modified': datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+            'modified_ts': stats.st_mtime,
+            'type': self.file_type,
+            'compression': compression_of(name)
+        }
+
+    def _update(self, name: str, stats: os.stat_result) -> bool:
+        """文件有变化时重建条目（元数据随之失效），返回是否有变化"""
+        old = self._stats.get(name)
+        if old is not None and _stat_key(old) == _stat_key(stats):
+            return False
+        self._stats[name] = stats
+        self._entries[name] = self._make_entry(name, stats)
+        return True
+
+    def _scan(self, full: bool) -> bool:
+        """扫描目录：新文件 stat 后加入，已删除的移除；full 时已有文件也重新 stat"""
+        changed = False
+        names = set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not is_log_file(entry.name):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    names.add(entry.name)
+                    if full or entry.name not in self._entries:
+                        changed |= self._update(entry.name, entry.stat())
+                except OSError as e:
+                    log_event('file_stat_failed', path=entry.path, error=str(e))
+        for name in set(self._entries) - names:
+            del self._entries[name]
+            del self._stats[name]
+            changed = True
+        self.scans += 1
+        return changed
+
+    def _restat_active(self) -> bool:
+        """重新 stat 最近修改过的文件（正在写入的日志大小和 mtime 变化不会改变目录 mtime）"""
+        changed = False
+        active_since = time.time() - config.FILE_CATALOG_ACTIVE_SECONDS
+        for name, stats in list(self._stats.items()):
+            if stats.st_mtime < active_since:
+                continue
+            try:
+                changed |= self._update(name, os.stat(os.path.join(self.directory, name)))
+            except FileNotFoundError:
+                del self._entries[name]
+                del self._stats[name]
+                changed = True
+            except OSError as e:
+                log_event('file_stat_failed', path=os.path.join(self.directory, name), error=str(e))
+        return changed
+
+    def refresh(self) -> None:
+        with self.lock:
+            try:
+                dir_mtime_ns = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                log_event('log_dir_missing', path=self.directory)
+                os.makedirs(self.directory, exist_ok=True)
+                dir_mtime_ns = os.stat(self.directory).st_mtime_ns
+
+            now = time.monotonic()
+            full = self._scanned_at is None or now - self._scanned_at >= config.FILE_CATALOG_RESCAN_INTERVAL
+            changed = False
+            if full or dir_mtime_ns != self._dir_mtime_ns:
+                try:
+                    changed = self._scan(full)
+                    self._dir_mtime_ns = dir_mtime_ns
+                    if full:
+                        self._scanned_at = now
+                except OSError as e:
+                    log_event('log_dir_scan_failed', logging.ERROR, path=self.directory, error=str(e))
+            if not full:
+                changed |= self._restat_active()
+            if changed:
+                self._sorted = sorted(self._entries.values(), key=lambda x: x['modified_ts'], reverse=True)
+                state = [(entry['name'],) + _stat_key(self._stats[entry['name']]) for entry in self._sorted]
+                self._signature = hashlib.blake2b(repr(state).encode('utf-8'), digest_size=16).hexdigest()
+
+    def validator(self) -> Tuple[str, float]:
+        """列表的 HTTP 校验依据：(文件状态摘要, 目录与最新文件的 mtime)"""
+        self.refresh()
+        with self.lock:
+            last_modified = (self._dir_mtime_ns or 0) / 1e9
+            if self._sorted:
+                last_modified = max(last_modified, self._sorted[0]['modified_ts'])
+            return self._signature, last_modified
+
+    def _with_metadata(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """补齐条目的元数据（调用方持有 self.lock）"""
+        if 'frame_count' not in entry:
+            entry.update(probe_file(entry['path'], self._stats[entry['name']]))
+        return entry
+
+    def list_files(self, name: Optional[str] = None, from_ms: Optional[int] = None,
+                   to_ms: Optional[int] = None, start: int = 0,
+                   count: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """按文件名（不区分大小写的子串）和时间范围过滤，返回 ([start, start+count) 的条目, 过滤后总数)
+
+        时间范围与文件的 [首帧, 末帧] 有交集即保留（确定没有帧的文件不保留）；末帧时间未知时
+        以文件 mtime 代替，首帧时间未知时不限制下界。返回的条目为缓存对象，调用方不应修改。
+        """
+        self.refresh()
+        with self.lock:
+            files = self._sorted
+            if name:
+                needle = name.lower()
+                files = [entry for entry in files if needle in entry['name'].lower()]
+            if from_ms is not None or to_ms is not None:
+                files = [entry for entry in files if self._in_time_range(entry, from_ms, to_ms)]
+            total = len(files)
+            end = None if count is None else start + count
+            return [self._with_metadata(entry) for entry in files[start:end]], total
+
+    def _in_time_range(self, entry: Dict[str, Any], from_ms: Optional[int], to_ms: Optional[int]) -> bool:
+        self._with_metadata(entry)
+        if entry['frame_count_exact'] and entry['frame_count'] == 0:
+            return False  # 确定没有帧的空文件
+        first = entry['first_time_ms']
+        last = entry['last_time_ms']
+        if last is None:
+            last = int(entry['modified_ts'] * 1000)
+        if from_ms is not None and last < from_ms:
+            return False
+        return to_ms is None or first is None or first <= to_ms
+
+    def paths(self) -> List[str]:
+        """目录下全部日志文件的路径"""
+        self.refresh()
+        with self.lock:
+            return [entry['path'] for entry in self._sorted]
+
+
+_catalogs = {
+    'client': FileCatalog(config.CLIENT_LOGS_DIR, 'client'),
+    'server': FileCatalog(config.SERVER_LOGS_DIR, 'server')
+}
+
+
+def get_catalog(file_type: str) -> FileCatalog:
+    """日志类型（client/server）对应的目录缓存"""
+    return _catalogs[file_type]
+
+
+def catalog_stats() -> Dict[str, Any]:
+    """各目录缓存的条目数和扫描次数"""
+    return {file_type: {'files': len(catalog._entries), 'scans': catalog.scans}
+            for file_type, catalog in _catalogs.items()}
@@ -0,0 +1,478 @@
+"""已解析日志行缓存
+
+以行偏移索引的块为缓存单位，键为 (文件, 索引代数, 块号, 解析深度)：文件被截断、轮转或改写时
+索引重建、代数变化，旧缓存自然失效；文件追加时最后一个未满的块只解析新增的行。
+按估算的内存字节数做 LRU 淘汰，并记录命中/未命中/淘汰次数。
+解析深度见 projection.PARSE_LEVELS，较浅的请求可以直接使用较深的缓存块。
+"""
+import gc
+import pickle
+import threading
+import time
+from array import array
+from collections import OrderedDict, namedtuple
+from functools import partial
+from typing import AbstractSet, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import config
+from binary_log import BinaryLogReader, direction_name, is_binary_log, parse_record, record_entry
+from iec104_parser import build_compact_entry, build_log_entry, decode_log_line, report_line_failure
+from log_index import LogIndex
+from log_reader import LogLine, split_block
+from log_source import open_log
+from metrics import BYTES_READ, FRAMES_PARSED, PARSE_FAILURES, STAGE_SECONDS
+from parallel_parse import group_blocks, map_ranges, parallel_enabled, split_ranges
+from projection import PARSE_LEVELS, Projection
+
+# entry 为 parse_log_line_json 的结果，空行或解析失败时为 None
+ParsedLine = namedtuple('ParsedLine', ['line_no', 'offset', 'length', 'entry'])
+
+# 响应条目中可按请求省略的冗余字段：raw 为原始日志行，frame_info.raw_bytes 与 data 内容相同
+OPTIONAL_FIELDS = ('raw', 'raw_bytes')
+
+# 帧解析器对无效帧给出的类型（条目照常生成，另计入解析失败数）
+INVALID_FRAME_TYPES = ('INVALID', 'ERROR')
+
+# 每个已解析行的估算内存开销（字典、字符串等），再加上行本身的长度
+ENTRY_OVERHEAD_BYTES = 2048
+
+
+def _position(line: LogLine) -> Dict[str, int]:
+    """解析失败时的定位信息：行号（并行解析时行号未知，给出偏移）"""
+    return {'line_no': line.line_no} if line.line_no is not None else {'offset': line.offset}
+
+
+def iter_parsed_lines(lines: Iterable[LogLine], filepath: Optional[str] = None,
+                      level: str = 'full') -> Iterator[ParsedLine]:
+    """逐行解析日志行（生成器），filepath 为二进制日志时每行是一条记录
+
+    level 为解析深度（PARSE_LEVELS），低于 full 时生成精简条目（build_compact_entry），
+    二进制日志总是生成完整条目。解码与帧解析的耗时、帧数和失败数在本地累加，
+    生成器结束（或被关闭）时一次记入指标。
+    """
+    if filepath is not None and is_binary_log(filepath):
+        yield from _iter_parsed_records(lines)
+        return
+    build = build_log_entry if level == 'full' else partial(build_compact_entry, frame=level == 'frame')
+    clock = time.perf_counter
+    decode_seconds = parse_seconds = 0.0
+    parsed = invalid = 0
+    try:
+        for line in lines:
+            start = clock()
+            text = line.data.decode(config.LOG_ENCODING, errors='ignore').strip()
+            entry = None
+            if text:
+                try:
+                    fields = decode_log_line(text)
+                except Exception as e:
+                    report_line_failure('json' if isinstance(e, ValueError) else 'fields', e, text, **_position(line))
+                    fields = None
+                decoded = clock()
+                decode_seconds += decoded - start
+                if fields is not None:
+                    try:
+                        entry = build(text, *fields)
+                        parsed += 1
+                        if entry['frame_info'].get('type') in INVALID_FRAME_TYPES:
+                            invalid += 1
+                    except Exception as e:
+                        report_line_failure('fields', e, text, **_position(line))
+                    parse_seconds += clock() - decoded
+            yield ParsedLine(line.line_no, line.offset, len(line.data), entry)
+    finally:
+        if parsed or decode_seconds:
+            STAGE_SECONDS.observe(decode_seconds, 'decode')
+            STAGE_SECONDS.observe(parse_seconds, 'parse')
+            FRAMES_PARSED.inc('text', amount=parsed)
+        if invalid:
+            PARSE_FAILURES.inc('invalid_frame', amount=invalid)
+
+
+def _iter_parsed_records(lines: Iterable[LogLine]) -> Iterator[ParsedLine]:
+    """二进制日志记录的解析（记录已经是字节形式，只有帧解析阶段）"""
+    parse_seconds = 0.0
+    parsed = invalid = 0
+    try:
+        for line in lines:
+            start = time.perf_counter()
+            entry = parse_record(line.data)
+            parse_seconds += time.perf_counter() - start
+            if entry is not None:
+                parsed += 1
+                if entry['frame_info'].get('type') in INVALID_FRAME_TYPES:
+                    invalid += 1
+            yield ParsedLine(line.line_no, line.offset, len(line.data), entry)
+    finally:
+        _record_binary_parse(parse_seconds, parsed, invalid)
+
+
+def _record_binary_parse(parse_seconds: float, parsed: int, invalid: int) -> None:
+    if parsed:
+        STAGE_SECONDS.observe(parse_seconds, 'parse')
+        FRAMES_PARSED.inc('binary', amount=parsed)
+    if invalid:
+        PARSE_FAILURES.inc('invalid_frame', amount=invalid)
+
+
+def parse_log_lines(lines: Iterable[LogLine], filepath: Optional[str] = None,
+                    level: str = 'full') -> List[ParsedLine]:
+    """解析日志行"""
+    return list(iter_parsed_lines(lines, filepath, level))
+
+
+def drop_fields(entry: Dict[str, Any], exclude: AbstractSet[str]) -> None:
+    """从响应条目（浅拷贝）中去掉 exclude 中的可省略字段，frame_info 被修改时先复制"""
+    if 'raw' in exclude:
+        entry.pop('raw', None)
+    if 'raw_bytes' in exclude and 'raw_bytes' in entry.get('frame_info', ()):
+        frame_info = dict(entry['frame_info'])
+        del frame_info['raw_bytes']
+        entry['frame_info'] = frame_info
+
+
+def iter_log_entries(lines: Iterable[ParsedLine], filter_type: Optional[str] = None,
+                     limit: Optional[int] = None,
+                     exclude: AbstractSet[str] = frozenset(),
+                     projection: Optional[Projection] = None) -> Iterator[Dict[str, Any]]:
+    """由已解析的日志行逐条生成响应条目（条目为浅拷贝，不修改缓存内容）
+    
+    exclude 为要省略的冗余字段（OPTIONAL_FIELDS 的子集），projection 不为 None 时
+    只生成其中的字段（已解析行的解析深度须满足 projection.parse_level）。
+    """
+    count = 0
+    if limit is not None and limit <= 0:
+        return
+    for line in lines:
+        if line.entry is None:
+            continue
+
+        # 应用过滤器
+        if filter_type:
+            frame_type = line.entry.get('frame_info', {}).get('type', '')
+            if frame_type != filter_type:
+                continue
+
+        count += 1
+        if projection is not None:
+            log_entry = projection.apply(line.entry, count, line.line_no, line.offset)
+        else:
+            log_entry = dict(line.entry)
+            log_entry['line_num'] = count
+            log_entry['file_line_num'] = line.line_no  # 文件中的实际行号
+            log_entry['offset'] = line.offset
+        if exclude:
+            drop_fields(log_entry, exclude)
+        yield log_entry
+        if limit is not None and count >= limit:
+            break
+
+
+def build_log_entries(lines: Iterable[ParsedLine], filter_type: Optional[str] = None,
+                      limit: Optional[int] = None,
+                      exclude: AbstractSet[str] = frozenset(),
+                      projection: Optional[Projection] = None) -> List[Dict[str, Any]]:
+    """由已解析的日志行生成响应条目"""
+    return list(iter_log_entries(lines, filter_type, limit, exclude, projection))
+
+
+def _parse_range(filepath: str, start: int, end: int,
+                 first_line_no: Optional[int] = None, level: str = 'full') -> List[ParsedLine]:
+    """解析 [start, end) 内的完整行（进程池任务中行号未知，由调用方补全）"""
+    if is_binary_log(filepath):
+        return _parse_records(filepath, start, end, first_line_no)
+    read_start = time.perf_counter()
+    with open_log(filepath) as f:
+        f.seek(start)
+        data = f.read(end - start)
+    STAGE_SECONDS.observe(time.perf_counter() - read_start, 'read')
+    BYTES_READ.inc('range', amount=len(data))
+    return parse_log_lines(split_block(data, start, first_line_no), level=level)
+
+
+def _parse_records(filepath: str, start: int, end: int,
+                   first_line_no: Optional[int] = None) -> List[ParsedLine]:
+    """二进制日志：在内存映射上逐条解析 [start, end) 内的记录，报文不经复制直接交给帧解析器"""
+    lines = []
+    line_no = first_line_no
+    invalid = 0
+    parse_start = time.perf_counter()
+    with BinaryLogReader(filepath) as reader:
+        for offset, length, direction, time_ms, payload in reader.records(start, end):
+            entry = record_entry(direction_name(direction), time_ms, payload)
+            if entry['frame_info'].get('type') in INVALID_FRAME_TYPES:
+                invalid += 1
+            lines.append(ParsedLine(line_no, offset, length, entry))
+            if line_no is not None:
+                line_no += 1
+    BYTES_READ.inc('range', amount=end - start)
+    _record_binary_parse(time.perf_counter() - parse_start, len(lines), invalid)
+    return lines
+
+
+def _pack_range(filepath: str, start: int, end: int, level: str = 'full') -> Tuple[array, array, bytes]:
+    """进程池任务：解析 [start, end) 并以紧凑形式返回 (行首偏移, 行字节数, 条目列表的 pickle)
+
+    直接返回 ParsedLine 列表时每行都要在主进程中经 copyreg 重建命名元组，
+    反序列化的耗时接近解析本身；位置信息改为 array，条目列表由主进程一次反序列化。
+    """
+    lines = _parse_range(filepath, start, end, None, level)
+    offsets = array('q', [line.offset for line in lines])
+    lengths = array('i', [line.length for line in lines])
+    return offsets, lengths, pickle.dumps([line.entry for line in lines], pickle.HIGHEST_PROTOCOL)
+
+
+def _unpack_range(packed: Tuple[array, array, bytes], first_line_no: int) -> List[ParsedLine]:
+    """还原 _pack_range 的结果，行号从 first_line_no 起连续编号"""
+    offsets, lengths, data = packed
+    # 反序列化期间暂停循环垃圾回收：大量新建的字典会反复触发回收，耗时几乎翻倍
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        entries = pickle.loads(data)
+    finally:
+        if enabled:
+            gc.enable()
+    return list(map(ParsedLine, range(first_line_no, first_line_no + len(entries)),
+                    offsets, lengths, entries))
+
+
+def iter_parsed_range(filepath: str, start: int, end: int,
+                      first_line_no: int = 1) -> Iterator[ParsedLine]:
+    """按顺序解析 [start, end) 内的完整行，数据量超过阈值时使用进程池并行解析
+
+    条目仍要在主进程中反序列化，加速比受此限制；只需汇总结果的整文件任务应使用 fold_parsed_blocks。
+    """
+    ranges = split_ranges(filepath, start, end)
+    line_no = first_line_no
+    if not parallel_enabled(end - start, filepath):
+        for range_start, range_end in ranges:
+            lines = _parse_range(filepath, range_start, range_end, line_no)
+            yield from lines
+            line_no += len(lines)
+        return
+
+    for packed in map_ranges(_pack_range, filepath, ranges):
+        lines = _unpack_range(packed, line_no)
+        yield from lines
+        line_no += len(lines)
+
+
+def _fold_range(filepath: str, start: int, end: int, first_line_no: int, level: str,
+                fold: Callable[..., Any], *args: Any) -> Any:
+    """进程池任务：解析 [start, end) 并就地交给 fold 处理"""
+    return fold(_parse_range(filepath, start, end, first_line_no, level), *args)
+
+
+def fold_parsed_blocks(index: LogIndex, fold: Callable[..., Any], *args: Any,
+                       blocks: Optional[Iterable[int]] = None, level: str = 'full') -> Iterator[Any]:
+    """依次对各组索引块（默认全部块）调用 fold(已解析行列表, *args)，按块的顺序返回各组的结果
+
+    数据量超过阈值时解析和 fold 都在进程池中执行，只有 fold 的结果传回主进程：
+    整文件的统计、检索等汇总任务应返回计数或行号等紧凑结果，由调用方合并，
+    主进程的开销与行数无关，随进程数近线性加速。fold 须为模块级函数，行号与文件一致。
+    """
+    groups = group_blocks(index, range(index.block_count) if blocks is None else blocks)
+    ranges = [(index.block_range(group[0])[0], index.block_range(group[-1])[1],
+               group[0] * index.block_lines + 1) for group in groups]
+    if parallel_enabled(sum(end - start for start, end, _ in ranges), index.filepath):
+        yield from map_ranges(_fold_range, index.filepath, ranges, level, fold, *args)
+        return
+    for start, end, first_line_no in ranges:
+        yield _fold_range(index.filepath, start, end, first_line_no, level, fold, *args)
+
+
+class _CachedBlock:
+    __slots__ = ('end', 'lines', 'nbytes', 'last_access')
+
+    def __init__(self, end: int, lines: List[ParsedLine], nbytes: int):
+        self.end = end
+        self.lines = lines
+        self.nbytes = nbytes
+        self.last_access = time.monotonic()
+
+
+class FrameCache:
+    """按字节预算淘汰的已解析块 LRU 缓存"""
+
+    def __init__(self, max_bytes: int = config.CACHE_MAX_BYTES,
+                 timeout: float = config.CACHE_TIMEOUT,
+                 enabled: bool = config.ENABLE_CACHE):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.enabled = enabled
+        self._blocks: 'OrderedDict[tuple, _CachedBlock]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.extends = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _estimate(lines: List[ParsedLine]) -> int:
+        return sum(ENTRY_OVERHEAD_BYTES + line.length for line in lines)
+
+    def _evict(self) -> None:
+        """淘汰最久未使用的块直到回到预算内（调用方持有锁）"""
+        while self._bytes > self.max_bytes and self._blocks:
+            _, block = self._blocks.popitem(last=False)
+            self._bytes -= block.nbytes
+            self.evictions += 1
+
+    def _read(self, index: LogIndex, start: int, end: int, line_no: int, level: str) -> List[ParsedLine]:
+        return _parse_range(index.filepath, start, end, line_no, level)
+
+    @staticmethod
+    def _keys(index: LogIndex, block: int, level: str) -> List[tuple]:
+        """可满足 level 的缓存键（同一深度在前，其后为更深的解析结果）"""
+        return [(index.filepath, index.generation, block, deeper)
+                for deeper in PARSE_LEVELS[PARSE_LEVELS.index(level):]]
+
+    def _lookup(self, index: LogIndex, block: int, level: str, now: float):
+        """查找可用的未过期缓存块，返回 (键, 块)（调用方持有锁）"""
+        for key in self._keys(index, block, level):
+            cached = self._blocks.get(key)
+            if cached is not None and now - cached.last_access > self.timeout:
+                del self._blocks[key]
+                self._bytes -= cached.nbytes
+                self.evictions += 1
+                cached = None
+            if cached is not None:
+                return key, cached
+        return None, None
+
+    def get_block(self, index: LogIndex, block: int, level: str = 'full') -> List[ParsedLine]:
+        """获取索引块内全部行的解析结果（level 为所需的最浅解析深度）"""
+        start, end = index.block_range(block)
+        first_line = block * index.block_lines + 1
+        if not self.enabled:
+            return self._read(index, start, end, first_line, level)
+
+        now = time.monotonic()
+        with self._lock:
+            key, cached = self._lookup(index, block, level, now)
+            if cached is not None:
+                self._blocks.move_to_end(key)
+                cached.last_access = now
+                if cached.end == end:
+                    self.hits += 1
+                    return cached.lines
+
+        if cached is not None and cached.end < end:
+            # 追加的行：复用已缓存的前缀，只按同一深度解析新增部分
+            new_lines = self._read(index, cached.end, end, first_line + len(cached.lines), key[3])
+            lines = cached.lines + new_lines
+            with self._lock:
+                self.extends += 1
+        else:
+            key = (index.filepath, index.generation, block, level)
+            lines = self._read(index, start, end, first_line, level)
+            with self._lock:
+                self.misses += 1
+
+        self._store(key, end, lines)
+        return lines
+
+    def _store(self, key: tuple, end: int, lines: List[ParsedLine]) -> None:
+        nbytes = self._estimate(lines)
+        with self._lock:
+            old = self._blocks.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._blocks[key] = _CachedBlock(end, lines, nbytes)
+            self._bytes += nbytes
+            self._evict()
+
+    def _prefetch(self, index: LogIndex, blocks: Iterable[int], level: str) -> Dict[int, List[ParsedLine]]:
+        """待解析的块总量超过阈值时，用进程池并行解析尚未缓存的块"""
+        if self.enabled:
+            with self._lock:
+                blocks = [block for block in blocks
+                          if not any(key in self._blocks for key in self._keys(index, block, level))]
+        else:
+            blocks = list(blocks)
+        nbytes = sum(end - start for start, end in map(index.block_range, blocks))
+        if not blocks or not parallel_enabled(nbytes, index.filepath):
+            return {}
+
+        groups = group_blocks(index, blocks)
+        ranges = [(index.block_range(group[0])[0], index.block_range(group[-1])[1])
+                  for group in groups]
+
+        result = {}
+        size = index.block_lines
+        for group, packed in zip(groups, map_ranges(_pack_range, index.filepath, ranges, level)):
+            lines = _unpack_range(packed, group[0] * size + 1)
+            for i, block in enumerate(group):
+                block_lines = lines[i * size:(i + 1) * size]
+                result[block] = block_lines
+                if self.enabled:
+                    self._store((index.filepath, index.generation, block, level),
+                                index.block_range(block)[1], block_lines)
+            with self._lock:
+                self.misses += len(group)
+        return result
+
+    def get_lines(self, index: LogIndex, start: int, count: int, level: str = 'full') -> List[ParsedLine]:
+        """第 start 行（从0计）起的 count 行"""
+        if count <= 0 or start >= index.line_count:
+            return []
+        start = max(start, 0)
+        count = min(count, index.line_count - start)
+        first_block = start // index.block_lines
+        last_block = (start + count - 1) // index.block_lines
+
+        blocks = range(first_block, last_block + 1)
+        parsed = self._prefetch(index, blocks, level)
+        lines: List[ParsedLine] = []
+        for block in blocks:
+            block_lines = parsed.get(block)
+            lines.extend(block_lines if block_lines is not None else self.get_block(index, block, level))
+        skip = start - first_block * index.block_lines
+        return lines[skip:skip + count]
+
+    def scan(self, index: LogIndex, start_offset: int = 0,
+             from_ms: Optional[int] = None, to_ms: Optional[int] = None,
+             level: str = 'full') -> Iterator[ParsedLine]:
+        """从 start_offset 开始顺序遍历，只访问时间范围内的索引块"""
+        first = index.block_of_offset(start_offset)
+        if from_ms is None and to_ms is None:
+            blocks: Iterable[int] = range(first, index.block_count)
+        else:
+            blocks = [b for b in index.blocks_in_time_range(from_ms, to_ms) if b >= first]
+
+        for block in blocks:
+            for line in self.get_block(index, block, level):
+                if line.offset < start_offset:
+                    continue
+                if from_ms is not None or to_ms is not None:
+                    time_ms = line.entry.get('timestamp_ms') if line.entry else None
+                    if time_ms is not None and ((from_ms is not None and time_ms < from_ms)
+                                                or (to_ms is not None and time_ms > to_ms)):
+                        continue
+                yield line
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.extends
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'extends': self.extends,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'blocks': len(self._blocks),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+frame_cache = FrameCache()
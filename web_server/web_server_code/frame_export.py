@@ -0,0 +1,360 @@
+"""解码后的帧导出为 CSV / Parquet / Arrow
+
+把日志文件（或其上的查询结果，条件同 frame_query）导出为每个信息对象一行的定型列，供 pandas 等工具直接读取：
+行号、偏移、time_ms、方向、帧类型、收发序号、类型标识、传输原因、公共地址、对象数（帧的字段，对帧中
+每个对象重复），对象的 IOA、值和品质字节，以及拆开的品质位（invalid/not_topical/substituted/blocked/
+overflow，累计量只有 invalid 有意义，其余为空）。没有信息对象的帧（S/U 帧等）也占一行，对象字段为空。
+条件逐个对象求值，ioa 和 quality 针对该对象本身。缺失值在 CSV 中为空串，在 Parquet/Arrow 中为 null。
+
+文件按行偏移索引的块切分为约 EXPORT_CHUNK_BYTES 的区间，每个区间由一个任务完成转换（FrameColumns）、
+过滤和格式化（CSV 文本或 Arrow RecordBatch），数据量大时交给进程池并行执行，按区间顺序输出。
+同时在途的区间数有上限，Parquet 每累计 EXPORT_ROW_GROUP_ROWS 行写出一个行组，
+内存占用与文件大小无关。条件中含 time_ms 区间时只读取时间范围有交集的块。
+Parquet/Arrow 需要安装 pyarrow，Arrow 输出为 IPC 流格式。
+
+命令行:
+    python frame_export.py 输入.log [-o 输出.parquet] [--format csv|parquet|arrow]
+                           [--where JSON] [--filter 字段=值 ...]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import config
+from frame_query import QUALITY_FLAGS, QueryError, evaluate, masks, where_from_args
+from frame_store import DIRECTIONS, FRAME_TYPES, FrameColumns, ingest_range
+from iec104_parser import decode_information_objects
+from log_index import LogIndex, get_log_index
+from parallel_parse import map_ranges, parallel_enabled
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 为可选依赖，未安装时只能导出 CSV
+    pa = None
+    pq = None
+
+EXPORT_COLUMNS = ('line_no', 'offset', 'time_ms', 'direction', 'frame_type', 'send_seq', 'recv_seq',
+                  'type_id', 'cause', 'asdu_addr', 'ioa', 'num_obj', 'value', 'quality') + tuple(QUALITY_FLAGS)
+
+# 格式 -> (MIME 类型, 文件后缀)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', '.arrows'),
+}
+
+_BCR_TYPE_ID = 0x0F  # M_IT_NA_1：品质字节为顺序号字节，只有 IV 位与测量值品质含义相同
+
+if pa is not None:
+    _CODES = pa.dictionary(pa.int8(), pa.string())
+    SCHEMA = pa.schema([
+        ('line_no', pa.int64()),
+        ('offset', pa.int64()),
+        ('time_ms', pa.int64()),
+        ('direction', _CODES),
+        ('frame_type', _CODES),
+        ('send_seq', pa.uint16()),
+        ('recv_seq', pa.uint16()),
+        ('type_id', pa.uint8()),
+        ('cause', pa.uint8()),
+        ('asdu_addr', pa.uint16()),
+        ('ioa', pa.uint32()),
+        ('num_obj', pa.uint8()),
+        ('value', pa.float64()),
+        ('quality', pa.uint8()),
+    ] + [(flag, pa.bool_()) for flag in QUALITY_FLAGS])
+else:
+    SCHEMA = None
+
+
+def export_formats() -> Tuple[str, ...]:
+    """当前可用的导出格式"""
+    return tuple(EXPORT_FORMATS) if pa is not None else ('csv',)
+
+
+# ---------- 区间任务（在进程池中执行） ----------
+
+def _object_values(columns: FrameColumns, rows: List[int], object_rows: List[int]) -> List[Any]:
+    """各信息对象的值：按帧解码全部对象，帧内第 i 个对象行对应 decode_information_objects 的第 i 个结果"""
+    payload = memoryview(columns.payload)
+    offsets = columns.payload_offsets
+    result: List[Any] = []
+    frame = -1
+    decoded: Any = ()
+    first = 0
+    for row, object_row in zip(rows, object_rows):
+        if row != frame:
+            frame = row
+            data = payload[offsets[row]:offsets[row + 1]]
+            objects = None
+            if columns.frame_type[row] == 0 and len(data) >= 15:
+                objects = decode_information_objects(data, columns.type_id[row], data[7])
+            decoded = objects['value'] if objects else ()
+            first = columns.objects(row).start
+        index = object_row - first
+        result.append(decoded[index] if index < len(decoded) else None)
+    return result
+
+
+def _row_values(columns: FrameColumns, object_rows: Iterable[int], first_line_no: int) -> Dict[str, List[Any]]:
+    """选中的信息对象行的各列，帧的字段对其中每个对象重复（缺失值为 None，方向和帧类型为编码）"""
+    object_rows = list(object_rows)
+    rows = [columns.object_row[i] for i in object_rows]
+
+    def nullable(column, indexes: List[int]) -> List[Optional[int]]:
+        return [None if value == -1 else value for value in map(column.__getitem__, indexes)]
+
+    values: Dict[str, List[Any]] = {
+        'line_no': [columns.line_no[row] + first_line_no - 1 for row in rows],
+        'offset': [columns.offset[row] for row in rows],
+        'time_ms': [columns.time_ms[row] for row in rows],
+        'direction': [columns.direction[row] for row in rows],
+        'frame_type': [columns.frame_type[row] for row in rows],
+    }
+    for name in ('send_seq', 'recv_seq', 'type_id', 'cause', 'asdu_addr', 'num_obj'):
+        values[name] = nullable(getattr(columns, name), rows)
+    values['ioa'] = nullable(columns.object_ioa, object_rows)
+    values['quality'] = nullable(columns.object_quality, object_rows)
+    values['value'] = _object_values(columns, rows, object_rows)
+    for flag, bit in QUALITY_FLAGS.items():
+        values[flag] = [None if quality is None or (type_id == _BCR_TYPE_ID and flag != 'invalid')
+                        else bool(quality & bit)
+                        for quality, type_id in zip(values['quality'], values['type_id'])]
+    return values
+
+
+def _csv_text(values: Dict[str, List[Any]]) -> str:
+    columns = [values[name] for name in EXPORT_COLUMNS]
+    columns[EXPORT_COLUMNS.index('direction')] = [DIRECTIONS[code] for code in values['direction']]
+    columns[EXPORT_COLUMNS.index('frame_type')] = [FRAME_TYPES[code] for code in values['frame_type']]
+    out = io.StringIO()
+    csv.writer(out, lineterminator='\n').writerows(zip(*columns))
+    return out.getvalue()
+
+
+def _record_batch(values: Dict[str, List[Any]]):
+    arrays = []
+    for field in SCHEMA:
+        if field.name in ('direction', 'frame_type'):
+            names = DIRECTIONS if field.name == 'direction' else FRAME_TYPES
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(values[field.name], pa.int8()),
+                                                         pa.array(names, pa.string())))
+        else:
+            arrays.append(pa.array(values[field.name], type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA)
+
+
+def _export_range(filepath: str, start: int, end: int, first_line_no: int,
+                  where: Optional[Mapping[str, Any]], kind: str) -> Tuple[Any, int, int, int]:
+    """转换、过滤并格式化 [start, end) 内的帧，返回 (CSV 文本或 RecordBatch, 行数, 已处理日志行数, 跳过行数)"""
+    columns = ingest_range(filepath, start, end)
+    if where:
+        object_rows: Iterable[int] = masks.select(evaluate(columns, where, objects=True), 0,
+                                                  columns.object_count, False)
+    else:
+        object_rows = range(columns.object_count)
+    values = _row_values(columns, object_rows, first_line_no)
+    output = _csv_text(values) if kind == 'csv' else _record_batch(values)
+    return output, len(values['time_ms']), columns.line_count, columns.skipped
+
+
+# ---------- 导出 ----------
+
+class _ChunkSink:
+    """pyarrow 写入器的输出对象：收集写入的字节，由生成器逐段取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class FrameExport:
+    """一次导出：遍历时逐段生成输出文件的字节
+
+    where 为 frame_query 格式的条件（None 表示全部帧），无效时构造即抛出 QueryError。
+    rows（导出行数，即信息对象数）、lines（处理的日志行数）、skipped（无法解析的行数）在遍历结束后完整。
+    """
+
+    def __init__(self, filepath: str, fmt: str = 'csv', where: Optional[Mapping[str, Any]] = None):
+        if fmt not in export_formats():
+            raise ValueError(f'不支持的导出格式: {fmt}（可用 {", ".join(export_formats())}）')
+        self.filepath = filepath
+        self.fmt = fmt
+        self.where = where or None
+        if self.where is not None:
+            evaluate(FrameColumns(), self.where, objects=True)  # 提前校验条件
+        self.rows = 0
+        self.lines = 0
+        self.skipped = 0
+
+    def _time_range(self) -> Tuple[Optional[int], Optional[int]]:
+        """条件顶层的 time_ms 区间，用于跳过时间范围外的块"""
+        condition = self.where.get('time_ms') if self.where else None
+        if not isinstance(condition, Mapping):
+            return None, None
+        bounds = []
+        for key in ('min', 'max'):
+            value = condition.get(key)
+            bounds.append(None if value is None else int(value, 0) if isinstance(value, str) else int(value))
+        return bounds[0], bounds[1]
+
+    def _ranges(self, index: LogIndex) -> List[Tuple[int, int, int]]:
+        """需要读取的块合并为约 EXPORT_CHUNK_BYTES 的区间：(起始偏移, 结束偏移, 首行行号)"""
+        from_ms, to_ms = self._time_range()
+        if from_ms is None and to_ms is None:
+            blocks: Iterable[int] = range(index.block_count)
+        else:
+            blocks = index.blocks_in_time_range(from_ms, to_ms)
+        ranges: List[Tuple[int, int, int]] = []
+        for block in blocks:
+            start, end = index.block_range(block)
+            if end <= start:
+                continue
+            if ranges and ranges[-1][1] == start and end - ranges[-1][0] <= config.EXPORT_CHUNK_BYTES:
+                ranges[-1] = (ranges[-1][0], end, ranges[-1][2])
+            else:
+                ranges.append((start, end, block * index.block_lines + 1))
+        return ranges
+
+    def _parts(self) -> Iterator[Any]:
+        """按区间顺序取回各任务的输出，累计计数"""
+        ranges = self._ranges(get_log_index(self.filepath))
+        kind = 'csv' if self.fmt == 'csv' else 'arrow'
+        if parallel_enabled(sum(end - start for start, end, _ in ranges), self.filepath):
+            parts: Iterable[Tuple[Any, int, int, int]] = map_ranges(
+                _export_range, self.filepath, ranges, self.where, kind)
+        else:
+            parts = (_export_range(self.filepath, start, end, line_no, self.where, kind)
+                     for start, end, line_no in ranges)
+        try:
+            for output, rows, lines, skipped in parts:
+                self.rows += rows
+                self.lines += lines
+                self.skipped += skipped
+                yield output
+        finally:
+            close = getattr(parts, 'close', None)
+            if close is not None:
+                close()  # 提前结束时取消进程池中尚未开始的任务
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self.fmt == 'csv':
+            yield (','.join(EXPORT_COLUMNS) + '\n').encode('utf-8')
+            for text in self._parts():
+                if text:
+                    yield text.encode('utf-8')
+            return
+
+        sink = _ChunkSink()
+        if self.fmt == 'arrow':
+            writer = pa.ipc.new_stream(sink, SCHEMA)
+            for batch in self._parts():
+                if batch.num_rows:
+                    writer.write_batch(batch)
+                    yield sink.take()
+            writer.close()
+            yield sink.take()
+            return
+
+        # Parquet：攒够一个行组再写出
+        writer = pq.ParquetWriter(sink, SCHEMA, compression=config.EXPORT_PARQUET_COMPRESSION)
+        pending: List[Any] = []
+        pending_rows = 0
+        for batch in self._parts():
+            if not batch.num_rows:
+                continue
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= config.EXPORT_ROW_GROUP_ROWS:
+                writer.write_table(pa.Table.from_batches(pending), row_group_size=config.EXPORT_ROW_GROUP_ROWS)
+                pending, pending_rows = [], 0
+                yield sink.take()
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending), row_group_size=config.EXPORT_ROW_GROUP_ROWS)
+        writer.close()
+        yield sink.take()
+
+
+def export_path(source: str, fmt: str) -> str:
+    """导出文件的默认文件名（去掉日志及压缩后缀，换成格式后缀）"""
+    base = source
+    for suffix in ('.gz', '.zst', '.log', config.BINARY_LOG_SUFFIX):
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+    return base + EXPORT_FORMATS[fmt][1]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='把日志中解码后的帧导出为 CSV / Parquet / Arrow')
+    parser.add_argument('input', help='日志文件（.log/.log.gz/.log.zst/.i104）')
+    parser.add_argument('-o', '--output', help='输出文件，- 表示标准输出（默认与输入同目录，后缀随格式）')
+    parser.add_argument('--format', choices=tuple(EXPORT_FORMATS),
+                        help='导出格式（默认按输出文件后缀判断，否则为 csv）')
+    parser.add_argument('--where', help='JSON 格式的查询条件（同 /api/query）')
+    parser.add_argument('--filter', action='append', default=[], metavar='字段=值',
+                        help='查询参数形式的条件，可重复，如 type_id=M_ME_NC_1 ioa_min=1000 from_ms=...')
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt is None:
+        fmt = next((name for name, (_, suffix) in EXPORT_FORMATS.items()
+                    if args.output and args.output.endswith(suffix)), 'csv')
+    if fmt not in export_formats():
+        parser.error(f'导出 {fmt} 需要安装 pyarrow')
+    try:
+        where = json.loads(args.where) if args.where else {}
+        filters = {}
+        for item in args.filter:
+            key, sep, value = item.partition('=')
+            if not sep:
+                parser.error(f'--filter 的格式应为 字段=值: {item}')
+            filters[key] = value
+        where.update(where_from_args(filters))
+        export = FrameExport(args.input, fmt, where)
+    except (ValueError, QueryError) as e:
+        parser.error(str(e))
+
+    if args.output == '-':
+        for chunk in export:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    else:
+        target = args.output or export_path(args.input, fmt)
+        tmp_path = target + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for chunk in export:
+                f.write(chunk)
+        os.replace(tmp_path, target)
+        print(f"{args.input} -> {target}: {export.rows} 个对象, 处理 {export.lines} 行, 跳过 {export.skipped} 行, "
+              f"{os.path.getsize(target)} 字节")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""列式帧存储上的查询
+
+查询条件以字典表示，同一个字典中的多个条件为 AND，另可用 and/or/not 组合：
+
+    {"type_id": "M_ME_NC_1", "ioa": {"min": 1000, "max": 2000}, "quality": ["invalid"]}
+    {"or": [{"frame_type": "U"}, {"and": [{"frame_type": "I"}, {"cause": [6, 7]}]}],
+     "not": {"direction": "RX"}}
+
+字段值为单个值时按相等比较，为列表时按集合包含比较，为 {"min", "max"} 时按闭区间比较；
+quality 为品质标志名列表，任一标志置位即匹配。ioa 和 quality 针对帧中的每个信息对象：
+同一个合取（同一字典及其中 and 列表的各项）里的对象条件先在信息对象子表上逐行求与，
+再归约为帧掩码，帧中有一个对象同时满足全部对象条件才匹配；
+objects=True 时改为逐个信息对象求值，帧的字段对其中每个对象重复。每个条件对整列求一次布尔掩码再做位运算：
+安装了 NumPy 时使用 ndarray；否则掩码为每帧一个字节的 bytes，比较在 map/translate 中完成，
+与/或/非转换为大整数位运算，不逐行执行 Python 代码。
+"""
+import operator
+from array import array
+from itertools import compress, islice
+from typing import Any, Dict, List, Mapping, Union
+
+from frame_store import DIRECTIONS, FRAME_TYPES, FrameColumns, FrameStore, np
+from iec104_parser import TYPE_IDENTIFICATION
+
+# 品质标志（quality 列的位，含义见 decode_information_objects；BCR 的顺序号字节只有 invalid 适用）
+QUALITY_FLAGS = {
+    'invalid': 0x80,
+    'not_topical': 0x40,
+    'substituted': 0x20,
+    'blocked': 0x10,
+    'overflow': 0x01,
+}
+
+# 可查询的整数列，及查询参数中的别名
+INT_FIELDS = ('time_ms', 'type_id', 'cause', 'asdu_addr', 'ioa', 'send_seq', 'recv_seq',
+              'num_obj', 'line_no')
+# 信息对象子表中的字段 -> 列名
+OBJECT_FIELDS = {'ioa': 'object_ioa', 'quality': 'object_quality'}
+FIELD_ALIASES = {'asdu': 'asdu_addr', 'dir': 'direction', 'type': 'frame_type'}
+
+# 类型名称（如 M_ME_NC_1）-> 类型标识
+TYPE_NAMES = {desc.split()[0]: type_id for type_id, desc in TYPE_IDENTIFICATION.items()}
+
+# 非零字节归一为1
+_BOOL_TABLE = bytes([0] + [1] * 255)
+
+_COMPARE_OPS = {'eq': operator.eq, 'ge': operator.ge, 'le': operator.le}
+
+
+def _byte_table(predicate) -> bytes:
+    """单字节（有符号）列的查找表：字节值 -> 是否满足条件"""
+    return bytes(1 if predicate(code - 256 if code > 127 else code) else 0 for code in range(256))
+
+
+class QueryError(ValueError):
+    """查询条件无效"""
+
+
+# ---------- 掩码运算 ----------
+
+class _PythonMasks:
+    """纯 Python 实现：掩码为每帧一个字节（0/1）的 bytes"""
+
+    name = 'python'
+
+    @staticmethod
+    def const(size: int, value: bool):
+        return (b'\x01' if value else b'\x00') * size
+
+    @staticmethod
+    def compare(column, op: str, value: int):
+        if column.typecode == 'b':
+            # 单字节列直接查表转换
+            compare = _COMPARE_OPS[op]
+            return column.tobytes().translate(_byte_table(lambda code: compare(code, value)))
+        # value OP x 的反向写法，使比较在 map 内部完成
+        method = {'eq': value.__eq__, 'ge': value.__le__, 'le': value.__ge__}[op]
+        return bytes(map(method, column))
+
+    @staticmethod
+    def isin(column, values: frozenset):
+        if column.typecode == 'b':
+            return column.tobytes().translate(_byte_table(values.__contains__))
+        return bytes(map(values.__contains__, column))
+
+    @staticmethod
+    def any_bits(column, bits: int):
+        # 缺失值为 -1，需另外排除
+        present = bytes(map((-1).__ne__, column))
+        flagged = bytes(map(bits.__and__, column)).translate(_BOOL_TABLE)
+        return _PythonMasks.combine([present, flagged], operator.and_)
+
+    @staticmethod
+    def gather(column, rows):
+        return array(column.typecode, map(column.__getitem__, rows))
+
+    @staticmethod
+    def reduce(mask: bytes, rows, size: int):
+        result = bytearray(size)
+        for row in compress(rows, mask):
+            result[row] = 1
+        return bytes(result)
+
+    @staticmethod
+    def combine(masks: List[bytes], op):
+        size = len(masks[0])
+        result = int.from_bytes(masks[0], 'little')
+        for mask in masks[1:]:
+            result = op(result, int.from_bytes(mask, 'little'))
+        return result.to_bytes(size, 'little')
+
+    @staticmethod
+    def invert(mask: bytes):
+        return mask.translate(bytes([1] + [0] * 255))
+
+    @staticmethod
+    def count(mask: bytes) -> int:
+        return len(mask) - mask.count(0)
+
+    @staticmethod
+    def select(mask: bytes, offset: int, limit: int, descending: bool) -> List[int]:
+        rows = range(len(mask))
+        if descending:
+            matches = compress(reversed(rows), reversed(mask))
+        else:
+            matches = compress(rows, mask)
+        return list(islice(matches, offset, offset + limit))
+
+
+class _NumpyMasks:
+    """NumPy 实现：掩码为 bool ndarray"""
+
+    name = 'numpy'
+
+    @staticmethod
+    def const(size: int, value: bool):
+        return np.full(size, value, dtype=bool)
+
+    @staticmethod
+    def compare(column, op: str, value: int):
+        if op == 'eq':
+            return column == value
+        return column >= value if op == 'ge' else column <= value
+
+    @staticmethod
+    def isin(column, values: frozenset):
+        return np.isin(column, np.fromiter(values, dtype=np.int64, count=len(values)))
+
+    @staticmethod
+    def any_bits(column, bits: int):
+        return (column != -1) & ((column & bits) != 0)
+
+    @staticmethod
+    def gather(column, rows):
+        return column[rows]
+
+    @staticmethod
+    def reduce(mask, rows, size: int):
+        result = np.zeros(size, dtype=bool)
+        result[rows[mask]] = True
+        return result
+
+    @staticmethod
+    def combine(masks: list, op):
+        result = masks[0]
+        for mask in masks[1:]:
+            result = op(result, mask)
+        return result
+
+    @staticmethod
+    def invert(mask):
+        return ~mask
+
+    @staticmethod
+    def count(mask) -> int:
+        return int(np.count_nonzero(mask))
+
+    @staticmethod
+    def select(mask, offset: int, limit: int, descending: bool) -> List[int]:
+        rows = np.flatnonzero(mask)
+        if descending:
+            rows = rows[::-1]
+        return rows[offset:offset + limit].tolist()
+
+
+masks = _NumpyMasks if np is not None else _PythonMasks
+
+
+# ---------- 条件解析 ----------
+
+def _to_int(field: str, value: Any) -> int:
+    if isinstance(value, bool):
+        raise QueryError(f'{field} 的值无效: {value!r}')
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        text = value.strip()
+        if field == 'type_id' and text in TYPE_NAMES:
+            return TYPE_NAMES[text]
+        try:
+            return int(text, 0)
+        except ValueError:
+            pass
+    raise QueryError(f'{field} 的值无效: {value!r}')
+
+
+def _to_code(field: str, value: Any, names: tuple) -> int:
+    text = str(value).strip().upper()
+    if text not in names:
+        raise QueryError(f'{field} 的值无效: {value!r}（可选 {", ".join(names)}）')
+    return names.index(text)
+
+
+def _size(store: Union[FrameStore, FrameColumns], objects: bool) -> int:
+    return len(store.column('object_row')) if objects else len(store)
+
+
+def _column_mask(column, field: str, value: Any):
+    """一列上的条件掩码"""
+    if field == 'quality':
+        names = value if isinstance(value, list) else [value]
+        bits = 0
+        for name in names:
+            if name not in QUALITY_FLAGS:
+                raise QueryError(f'未知的品质标志: {name!r}（可选 {", ".join(QUALITY_FLAGS)}）')
+            bits |= QUALITY_FLAGS[name]
+        return masks.any_bits(column, bits)
+
+    if field in ('frame_type', 'direction'):
+        names = FRAME_TYPES if field == 'frame_type' else DIRECTIONS
+        convert = lambda v: _to_code(field, v, names)  # noqa: E731
+    else:
+        convert = lambda v: _to_int(field, v)  # noqa: E731
+
+    if isinstance(value, Mapping):
+        unknown = set(value) - {'min', 'max'}
+        if unknown:
+            raise QueryError(f'{field} 的区间条件只支持 min/max')
+        parts = []
+        if value.get('min') is not None:
+            parts.append(masks.compare(column, 'ge', convert(value['min'])))
+        if value.get('max') is not None:
+            parts.append(masks.compare(column, 'le', convert(value['max'])))
+        if not parts:
+            return masks.const(len(column), True)
+        return masks.combine(parts, operator.and_)
+    if isinstance(value, list):
+        if not value:
+            return masks.const(len(column), False)
+        return masks.isin(column, frozenset(convert(v) for v in value))
+    return masks.compare(column, 'eq', convert(value))
+
+
+def _field_mask(store: Union[FrameStore, FrameColumns], field: str, value: Any, objects: bool):
+    """单个字段条件的掩码（对象字段在 objects 为 False 时为信息对象子表上的掩码，由调用方归约）"""
+    if field in OBJECT_FIELDS:
+        return _column_mask(store.column(OBJECT_FIELDS[field]), field, value)
+
+    if field not in INT_FIELDS and field not in ('frame_type', 'direction'):
+        raise QueryError(f'未知的查询字段: {field!r}')
+    column = store.column(field)
+    if objects:
+        column = masks.gather(column, store.column('object_row'))
+    return _column_mask(column, field, value)
+
+
+def _conjuncts(store: Union[FrameStore, FrameColumns], where: Mapping[str, Any], objects: bool,
+               parts: list, object_parts: list) -> None:
+    """把一个合取中的条件掩码分别收集到 parts（帧/对象粒度）和 object_parts（待归约的对象条件）
+
+    and 列表的各项展开到同一个合取中，or/not 的子条件各自独立求值。
+    """
+    if not isinstance(where, Mapping):
+        raise QueryError('查询条件必须是对象')
+    for key, value in where.items():
+        if key == 'and':
+            if not isinstance(value, list):
+                raise QueryError(f'{key} 的值必须是条件列表')
+            for item in value:
+                _conjuncts(store, item, objects, parts, object_parts)
+        elif key == 'or':
+            if not isinstance(value, list):
+                raise QueryError(f'{key} 的值必须是条件列表')
+            if not value:
+                parts.append(masks.const(_size(store, objects), False))
+                continue
+            parts.append(masks.combine([evaluate(store, item, objects) for item in value], operator.or_))
+        elif key == 'not':
+            parts.append(masks.invert(evaluate(store, value, objects)))
+        else:
+            field = FIELD_ALIASES.get(key, key)
+            mask = _field_mask(store, field, value, objects)
+            (object_parts if field in OBJECT_FIELDS and not objects else parts).append(mask)
+
+
+def evaluate(store: Union[FrameStore, FrameColumns], where: Mapping[str, Any], objects: bool = False):
+    """计算查询条件的掩码（store 为 FrameStore 时调用方持有 store.lock，也可以是单独的一组列数据）
+
+    objects 为 True 时掩码对应信息对象子表的各行，否则对应各帧。
+    """
+    parts: list = []
+    object_parts: list = []
+    _conjuncts(store, where, objects, parts, object_parts)
+    if object_parts:
+        # 同一个对象须满足全部对象条件，求与之后才归约为帧掩码
+        mask = masks.combine(object_parts, operator.and_)
+        parts.append(masks.reduce(mask, store.column('object_row'), len(store)))
+    if not parts:
+        return masks.const(_size(store, objects), True)
+    return masks.combine(parts, operator.and_)
+
+
+def where_from_args(args: Mapping[str, str]) -> Dict[str, Any]:
+    """由 URL 查询参数构造条件（全部为 AND）
+
+    逗号分隔的值为集合；ioa_min/ioa_max 等 <字段>_min/<字段>_max 为区间，
+    from_ms/to_ms 为 time_ms 区间；quality 为逗号分隔的品质标志名。
+    """
+    where: Dict[str, Any] = {}
+    for key, value in args.items():
+        if key in ('file', 'type', 'limit', 'offset', 'order', 'format', 'where'):
+            continue
+        if key in ('from_ms', 'to_ms'):
+            where.setdefault('time_ms', {})['min' if key == 'from_ms' else 'max'] = value
+        elif key.endswith('_min') or key.endswith('_max'):
+            field = FIELD_ALIASES.get(key[:-4], key[:-4])
+            where.setdefault(field, {})[key[-3:]] = value
+        elif key == 'quality':
+            where['quality'] = [item.strip() for item in value.split(',') if item.strip()]
+        else:
+            items = [item.strip() for item in value.split(',') if item.strip()]
+            where[key] = items if len(items) > 1 else value
+    return where
+
+
+def run_query(store: FrameStore, where: Mapping[str, Any], offset: int = 0,
+              limit: int = 100, descending: bool = False,
+              fmt: str = 'entries') -> Dict[str, Any]:
+    """执行查询，返回匹配总数及 [offset, offset+limit) 范围内的行
+
+    fmt 为 entries 时行结构与 /api/logs 相同，为 columns 时只返回列式存储中的定长字段。
+    """
+    with store.lock:
+        mask = evaluate(store, where)
+        total = masks.count(mask)
+        rows = masks.select(mask, offset, limit, descending)
+        del mask
+        if fmt == 'columns':
+            result: List[Dict[str, Any]] = [store.row(row) for row in rows]
+        else:
+            result = store.entries(rows)
+    return {
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'has_more': offset + len(rows) < total,
+        'rows': result,
+        'backend': masks.name
+    }
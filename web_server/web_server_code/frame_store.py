@@ -0,0 +1,386 @@
+"""列式帧存储
+
+每个日志文件对应一个 FrameStore，每帧只保存分析所需的定长字段（array 类型列）
+和原始报文（全部帧的报文拼接在同一个 bytearray 中，另记偏移），每帧约几十字节，
+可以常驻数百万帧。信息对象的地址和品质另存为子表（OBJECT_COLUMNS），每个对象一行，
+带所属帧的行号；没有信息对象的帧也占一行（地址和品质为 -1），子表行按帧的顺序排列。
+返回给客户端的行按需从文件重新读取并构造字典。
+存储跟随行偏移索引的代数：文件追加时增量扩展，截断或轮转时清空重建。
+安装了 NumPy 时可以通过 column() 取得零拷贝的 ndarray 视图。
+"""
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import repeat
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import config
+from binary_log import BinaryLogReader, direction_name, is_binary_log, record_entry
+from iec104_parser import (INFORMATION_OBJECT_LAYOUTS, FastIEC104FrameParser, classify_direction,
+                           extract_log_fields, information_object_positions, parse_log_line_json)
+from log_index import get_log_index
+from log_source import open_log
+from parallel_parse import map_ranges, parallel_enabled, split_ranges
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+# 帧类型/方向编码（列中保存下标）
+FRAME_TYPES = ('I', 'S', 'U', 'INVALID', 'UNKNOWN')
+DIRECTIONS = ('TX', 'RX', 'UNKNOWN')
+_DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+
+# 列名 -> array 类型码，缺失值统一为 -1
+COLUMNS = OrderedDict([
+    ('line_no', 'q'),      # 文件中的行号（从1计）
+    ('offset', 'q'),       # 行首字节偏移
+    ('length', 'i'),       # 行字节数（含换行）
+    ('time_ms', 'q'),
+    ('direction', 'b'),    # DIRECTIONS 下标
+    ('frame_type', 'b'),   # FRAME_TYPES 下标
+    ('type_id', 'h'),
+    ('cause', 'h'),
+    ('asdu_addr', 'i'),
+    ('send_seq', 'i'),
+    ('recv_seq', 'i'),
+    ('num_obj', 'h'),      # VSQ 中的对象数
+])
+
+# 信息对象子表的列名 -> array 类型码
+OBJECT_COLUMNS = OrderedDict([
+    ('object_row', 'i'),      # 所属帧的行号（帧列中的下标）
+    ('object_ioa', 'i'),      # 信息对象地址
+    ('object_quality', 'h'),  # 品质字节（位定义同 decode_information_objects）
+])
+
+# I帧完整帧头：启动字符, 长度, 控制域1-2, 控制域3-4, 类型标识, VSQ, 传输原因, (源地址), 公共地址, IOA
+_I_HEADER_STRUCT = struct.Struct('<BBHHBBBxHHB')
+_APCI_STRUCT = struct.Struct('<BBHH')
+
+
+def decode_frame_header(data: bytes) -> Tuple[int, int, int, int, int, int, int, int, int]:
+    """帧头字段：(帧类型编码, 类型标识, 传输原因, 公共地址, 发送序号, 接收序号, IOA, 品质, 对象数)"""
+    size = len(data)
+    if size < FastIEC104FrameParser.MIN_FRAME_LENGTH or data[0] != FastIEC104FrameParser.APCI_START:
+        return 3, -1, -1, -1, -1, -1, -1, -1, -1
+    if size >= 15 and not data[2] & 0x01:
+        (_, _, ctrl12, ctrl34, type_id, vsq, cause, asdu_addr,
+         ioa_low, ioa_high) = _I_HEADER_STRUCT.unpack_from(data)
+        quality = -1
+        layout = INFORMATION_OBJECT_LAYOUTS.get(type_id)
+        if layout is not None and size >= 15 + layout[0]:
+            # SQ=0/1 时第一个信息元素都从第15字节开始
+            quality = layout[1](memoryview(data), 15)[1] & 0xFF
+        return (0, type_id, cause & 0x3F, asdu_addr, ctrl12 >> 1, ctrl34 >> 1,
+                ioa_low | (ioa_high << 16), quality, vsq & 0x7F)
+
+    _, _, ctrl12, ctrl34 = _APCI_STRUCT.unpack_from(data)
+    ctrl1 = ctrl12 & 0xFF
+    if not ctrl1 & 0x01:
+        # 不含完整信息对象的I帧
+        type_id = data[6] if size >= FastIEC104FrameParser.ASDU_MIN_LENGTH else -1
+        cause = data[8] & 0x3F if size >= FastIEC104FrameParser.ASDU_MIN_LENGTH else -1
+        asdu_addr = data[10] | (data[11] << 8) if size >= 12 else -1
+        return 0, type_id, cause, asdu_addr, ctrl12 >> 1, ctrl34 >> 1, -1, -1, -1
+    if ctrl1 & 0x03 == 0x01:
+        return 1, -1, -1, -1, -1, ctrl34 >> 1, -1, -1, -1
+    return 2, -1, -1, -1, -1, -1, -1, -1, -1
+
+
+def decode_objects(data: bytes, type_id: int) -> Optional[Tuple[List[int], List[int]]]:
+    """I帧中全部信息对象的 (IOA 列表, 品质列表)，类型不支持或报文中没有完整对象时返回 None"""
+    positions = information_object_positions(data, type_id, data[7])
+    if not positions:
+        return None
+    decode = INFORMATION_OBJECT_LAYOUTS[type_id][1]
+    data = memoryview(data)
+    return [ioa for ioa, _ in positions], [decode(data, pos)[1] & 0xFF for _, pos in positions]
+
+
+class FrameColumns:
+    """一组帧的列数据（FrameStore 的存储体，也是并行解析任务的返回值）"""
+
+    def __init__(self):
+        for name, typecode in (*COLUMNS.items(), *OBJECT_COLUMNS.items()):
+            setattr(self, name, array(typecode))
+        self.payload = bytearray()
+        self.payload_offsets = array('q', [0])
+        self.line_count = 0  # 已处理的行数（含空行和无法解析的行）
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self.time_ms)
+
+    @property
+    def object_count(self) -> int:
+        """信息对象子表的行数"""
+        return len(self.object_row)
+
+    def objects(self, row: int) -> range:
+        """第 row 帧在信息对象子表中的行"""
+        return range(bisect_left(self.object_row, row), bisect_right(self.object_row, row))
+
+    def column(self, name: str):
+        """列数据（含信息对象子表的列）；安装了 NumPy 时返回共享内存的 ndarray 视图（在下次追加前有效）"""
+        column = getattr(self, name)
+        if np is None:
+            return column
+        if not column:
+            return np.zeros(0, dtype=column.typecode)
+        return np.frombuffer(column, dtype=column.typecode)
+
+    @property
+    def nbytes(self) -> int:
+        """列数据占用的字节数"""
+        total = len(self.payload) + self.payload_offsets.itemsize * len(self.payload_offsets)
+        for name in (*COLUMNS, *OBJECT_COLUMNS):
+            column = getattr(self, name)
+            total += column.itemsize * len(column)
+        return total
+
+    def append_line(self, line: bytes, offset: int) -> None:
+        """追加一行日志（行号按已处理行数递增）"""
+        self.line_count += 1
+        text = line.strip()
+        if not text:
+            return
+        fields = extract_log_fields(text, config.LOG_ENCODING)
+        if fields is None:
+            self.skipped += 1
+            return
+
+        direction, time_ms, data_hex = fields
+        payload = FastIEC104FrameParser.decode_hex(data_hex) if data_hex else b''
+        self._append(offset, len(line), time_ms, _DIRECTION_CODES[classify_direction(direction)], payload)
+
+    def append_record(self, offset: int, length: int, direction: str, time_ms: int, payload) -> None:
+        """追加一条二进制日志记录（payload 可以是内存映射上的 memoryview，追加时复制）"""
+        self.line_count += 1
+        self._append(offset, length, time_ms, _DIRECTION_CODES[direction], payload)
+
+    def _append(self, offset: int, length: int, time_ms: int, direction: int, payload) -> None:
+        """追加一帧的各列（payload 为 None 表示报文无法解码）"""
+        if payload:
+            header = decode_frame_header(payload)
+        else:
+            header = (3 if payload is None else 4, -1, -1, -1, -1, -1, -1, -1, -1)
+            payload = b''
+
+        row = len(self.time_ms)
+        self.line_no.append(self.line_count)
+        self.offset.append(offset)
+        self.length.append(length)
+        self.time_ms.append(time_ms)
+        self.direction.append(direction)
+        (frame_type, type_id, cause, asdu_addr, send_seq, recv_seq,
+         ioa, quality, num_obj) = header
+        self.frame_type.append(frame_type)
+        self.type_id.append(type_id)
+        self.cause.append(cause)
+        self.asdu_addr.append(asdu_addr)
+        self.send_seq.append(send_seq)
+        self.recv_seq.append(recv_seq)
+        self.num_obj.append(num_obj)
+        # 只有一个对象时即帧头中的首个对象（没有对象的帧为 -1）
+        objects = decode_objects(payload, type_id) if num_obj > 1 else None
+        if objects is None:
+            self.object_row.append(row)
+            self.object_ioa.append(ioa)
+            self.object_quality.append(quality)
+        else:
+            self.object_row.extend(repeat(row, len(objects[0])))
+            self.object_ioa.extend(objects[0])
+            self.object_quality.extend(objects[1])
+        self.payload += payload
+        self.payload_offsets.append(len(self.payload))
+
+    def append_block(self, data: bytes, offset: int) -> None:
+        """追加一段以换行结尾的字节"""
+        pos = 0
+        size = len(data)
+        while pos < size:
+            end = data.find(b'\n', pos)
+            if end < 0:
+                break
+            self.append_line(data[pos:end + 1], offset + pos)
+            pos = end + 1
+
+    def extend(self, other: 'FrameColumns') -> None:
+        """把另一组（紧随其后的行的）列数据接在末尾"""
+        base_line = self.line_count
+        base_row = len(self)
+        base_payload = len(self.payload)
+        for name in COLUMNS:
+            if name == 'line_no':
+                self.line_no.extend(line_no + base_line for line_no in other.line_no)
+            else:
+                getattr(self, name).extend(getattr(other, name))
+        self.object_row.extend(row + base_row for row in other.object_row)
+        self.object_ioa.extend(other.object_ioa)
+        self.object_quality.extend(other.object_quality)
+        self.payload += other.payload
+        self.payload_offsets.extend(offset + base_payload for offset in other.payload_offsets[1:])
+        self.line_count += other.line_count
+        self.skipped += other.skipped
+
+
+def ingest_range(filepath: str, start: int, end: int) -> FrameColumns:
+    """把 [start, end) 内的完整行（或二进制记录）转换为列数据（进程池任务，行号从1计，由调用方平移）"""
+    columns = FrameColumns()
+    if is_binary_log(filepath):
+        with BinaryLogReader(filepath) as reader:
+            for offset, length, direction, time_ms, payload in reader.records(start, end):
+                columns.append_record(offset, length, direction_name(direction), time_ms, payload)
+        return columns
+    with open_log(filepath) as f:
+        f.seek(start)
+        columns.append_block(f.read(end - start), start)
+    return columns
+
+
+class FrameStore:
+    """单个日志文件的列式帧存储"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.lock = threading.RLock()
+        self.generation = None
+        self.indexed_size = 0
+        self.data = FrameColumns()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def refresh(self) -> 'FrameStore':
+        """按行偏移索引同步：追加的行增量转换，索引重建（截断/轮转）时清空重来"""
+        index = get_log_index(self.filepath)
+        with self.lock:
+            if index.generation != self.generation:
+                self.generation = index.generation
+                self.indexed_size = 0
+                self.data = FrameColumns()
+            end = index.indexed_size
+            if end <= self.indexed_size:
+                return self
+
+            ranges = split_ranges(self.filepath, self.indexed_size, end)
+            if parallel_enabled(end - self.indexed_size, self.filepath):
+                parts: Iterable[FrameColumns] = map_ranges(ingest_range, self.filepath, ranges)
+            else:
+                parts = (ingest_range(self.filepath, start, stop) for start, stop in ranges)
+            for part in parts:
+                self.data.extend(part)
+            self.indexed_size = end
+        return self
+
+    def column(self, name: str):
+        """列数据；安装了 NumPy 时返回共享内存的 ndarray 视图
+
+        视图在存储下次扩展前有效，使用方不应长期持有。
+        """
+        return self.data.column(name)
+
+    def payload(self, row: int) -> bytes:
+        """第 row 帧的原始报文"""
+        offsets = self.data.payload_offsets
+        return bytes(self.data.payload[offsets[row]:offsets[row + 1]])
+
+    def row(self, row: int) -> Dict[str, Any]:
+        """第 row 帧的定长字段和信息对象 [IOA, 品质] 列表（帧类型/方向转换为名称，缺失值为 None）"""
+        result: Dict[str, Any] = {}
+        for name in COLUMNS:
+            value = getattr(self.data, name)[row]
+            if name == 'frame_type':
+                value = FRAME_TYPES[value]
+            elif name == 'direction':
+                value = DIRECTIONS[value]
+            elif value == -1:
+                value = None
+            result[name] = value
+        data = self.data
+        result['objects'] = [[data.object_ioa[i], None if data.object_quality[i] == -1 else data.object_quality[i]]
+                             for i in data.objects(row) if data.object_ioa[i] != -1]
+        return result
+
+    def entries(self, rows: Iterable[int]) -> List[Dict[str, Any]]:
+        """按需构造返回给客户端的日志条目（结构同 /api/logs）"""
+        data = self.data
+        logs = []
+        if is_binary_log(self.filepath):
+            # 二进制日志的条目只由定长字段和报文构成，直接由列数据生成，不必读文件
+            for row in rows:
+                entry = record_entry(DIRECTIONS[data.direction[row]], data.time_ms[row], self.payload(row))
+                self._number(entry, len(logs) + 1, row)
+                logs.append(entry)
+            return logs
+        with open_log(self.filepath) as f:
+            for row in rows:
+                f.seek(data.offset[row])
+                text = f.read(data.length[row]).decode(config.LOG_ENCODING, errors='ignore').strip()
+                entry = parse_log_line_json(text)
+                if entry is None:
+                    continue
+                self._number(entry, len(logs) + 1, row)
+                logs.append(entry)
+        return logs
+
+    def _number(self, entry: Dict[str, Any], line_num: int, row: int) -> None:
+        entry['line_num'] = line_num
+        entry['file_line_num'] = self.data.line_no[row]
+        entry['offset'] = self.data.offset[row]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'frames': len(self.data),
+            'lines': self.data.line_count,
+            'skipped': self.data.skipped,
+            'bytes': self.nbytes,
+            'indexed_size': self.indexed_size
+        }
+
+
+_stores: 'OrderedDict[str, FrameStore]' = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+def get_frame_store(filepath: str) -> FrameStore:
+    """获取（必要时创建并增量同步）日志文件的列式存储，总内存超出预算时淘汰最久未用的文件"""
+    filepath = os.path.abspath(filepath)
+    with _stores_lock:
+        store = _stores.get(filepath)
+        if store is None:
+            store = FrameStore(filepath)
+            _stores[filepath] = store
+        _stores.move_to_end(filepath)
+    store.refresh()
+
+    with _stores_lock:
+        total = sum(item.nbytes for item in _stores.values())
+        for path in list(_stores):
+            if total <= config.FRAME_STORE_MAX_BYTES or path == filepath:
+                break
+            total -= _stores.pop(path).nbytes
+    return store
+
+
+def frame_store_stats() -> Dict[str, Any]:
+    """全部列式存储的内存占用"""
+    with _stores_lock:
+        stores = {os.path.basename(path): store.stats() for path, store in _stores.items()}
+    return {
+        'files': len(stores),
+        'frames': sum(item['frames'] for item in stores.values()),
+        'bytes': sum(item['bytes'] for item in stores.values()),
+        'max_bytes': config.FRAME_STORE_MAX_BYTES,
+        'numpy': np is not None,
+        'stores': stores
+    }
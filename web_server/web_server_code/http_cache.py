@@ -0,0 +1,155 @@
+"""HTTP 条件请求与响应压缩
+
+/api/logs、/api/stats、/api/files 的响应只取决于日志文件的 (大小, mtime, inode)、查询参数，
+以及 /api/logs 尾部读取时行索引是否已建好（建好前后行号不同），由它们计算强校验值 ETag（另给出 Last-Modified）。请求带 If-None-Match（或只带 If-Modified-Since）
+且校验值未变时，直接返回 304，不读取、不解析文件；响应带 Cache-Control: no-cache，
+客户端每次都会带上校验值重新验证。
+
+响应体按 Accept-Encoding 协商压缩：brotli（需安装 brotli）或 gzip。小于 COMPRESS_MIN_BYTES 的
+响应不压缩；流式响应（ndjson/json）边生成边压缩，每累计 COMPRESS_FLUSH_BYTES 输入刷新一次，
+客户端仍能逐段收到数据。压缩后的响应 ETag 加上编码后缀（如 "...-gzip"），同一资源的不同编码
+校验值不同，比较 If-None-Match 时去掉后缀。SSE 和静态文件不经过压缩。
+"""
+import gzip
+import hashlib
+import os
+import time
+import zlib
+from email.utils import formatdate
+from typing import Any, Iterable, Iterator, Optional, Sequence, Tuple
+
+from flask import Response, request
+
+import config
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只协商 gzip
+    brotli = None
+
+# 可压缩的响应类型（text/event-stream 除外，压缩缓冲会延迟推送）
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/csv', 'text/html',
+                      'text/css', 'application/javascript', 'text/javascript')
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+Validator = Tuple[str, Optional[float]]  # (ETag, Last-Modified 时间戳)
+
+
+def make_etag(*parts: Any) -> str:
+    """由文件状态等校验依据和当前请求的查询参数计算 ETag（不含引号）"""
+    args = sorted(request.args.items(multi=True))
+    return hashlib.blake2b(repr((parts, args)).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def file_validator(*paths: str, state: Any = None) -> Validator:
+    """日志文件的校验值：(大小, mtime, inode) 加查询参数
+
+    响应还取决于文件之外的状态（如行索引是否已建好）时由 state 给出，状态变化后校验值随之变化。
+    """
+    stats = [os.stat(path) for path in paths]
+    etag = make_etag(*[(stat.st_size, stat.st_mtime_ns, stat.st_ino) for stat in stats], state)
+    return etag, max(stat.st_mtime for stat in stats)
+
+
+def not_modified(validator: Validator) -> Optional[Response]:
+    """客户端缓存仍然有效时返回 304 响应，否则返回 None
+
+    有 If-None-Match 时只比较 ETag（弱比较，忽略压缩编码后缀），没有时才看 If-Modified-Since。
+    """
+    etag, last_modified = validator
+    if request.if_none_match:
+        tags = [etag] + [f'{etag}-{encoding}' for encoding in ENCODINGS]
+        matched = next((tag for tag in tags if request.if_none_match.contains_weak(tag)), None)
+        if matched is None:
+            return None
+    elif request.if_modified_since is not None and last_modified is not None:
+        # Last-Modified 只精确到秒，一秒内刚修改过的文件可能还会在同一秒内再变化
+        if int(last_modified) > request.if_modified_since.timestamp() or time.time() - last_modified < 1:
+            return None
+        matched = etag
+    else:
+        return None
+    response = Response(status=304)
+    set_validators(response, (matched, last_modified))
+    return response
+
+
+def set_validators(response: Response, validator: Validator) -> Response:
+    """给响应加上 ETag、Last-Modified，并要求客户端每次重新验证"""
+    etag, last_modified = validator
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# ---------- 压缩 ----------
+
+def _compressor(encoding: str):
+    if encoding == 'br':
+        return brotli.Compressor(quality=config.BROTLI_QUALITY)
+    return zlib.compressobj(config.GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits=31: gzip 格式
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=config.BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=config.GZIP_LEVEL, mtime=0)
+
+
+def _compress_stream(chunks: Iterable[Any], encoding: str) -> Iterator[bytes]:
+    """逐块压缩流式响应，每累计 COMPRESS_FLUSH_BYTES 输入刷新一次"""
+    compressor = _compressor(encoding)
+    if encoding == 'br':
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        process = compressor.compress
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)  # noqa: E731
+        finish = compressor.flush
+    pending = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        output = process(chunk)
+        pending += len(chunk)
+        if pending >= config.COMPRESS_FLUSH_BYTES:
+            output += flush()
+            pending = 0
+        if output:
+            yield output
+    yield finish()
+
+
+def negotiate_encoding(encodings: Sequence[str] = ENCODINGS) -> Optional[str]:
+    """按 Accept-Encoding（含 q 值）选择压缩编码，客户端都不接受时返回 None"""
+    return request.accept_encodings.best_match(encodings)
+
+
+def compress_response(response: Response) -> Response:
+    """按协商结果压缩响应（after_request 钩子）"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        chunks = response.response
+        if hasattr(chunks, 'close'):
+            response.call_on_close(chunks.close)  # 原生成器在响应关闭时关闭（未开始迭代时也是）
+        response.response = _compress_stream(chunks, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config.COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(_compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
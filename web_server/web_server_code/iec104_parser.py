@@ -0,0 +1,762 @@
+"""IEC104 帧解析与日志行解析"""
+import struct
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, Callable, Tuple, Union
+
+from event_log import log_event
+from metrics import PARSE_FAILURES
+from serializer import loads
+
+# IEC104 帧类型定义
+IEC104_FRAME_TYPES = {
+    'I': 'I帧(信息传输)',
+    'S': 'S帧(监视)',
+    'U': 'U帧(控制)',
+}
+
+# IEC104 U帧功能
+U_FRAME_FUNCTIONS = {
+    0x07: 'STARTDT act',
+    0x0B: 'STARTDT con',
+    0x13: 'STOPDT act',
+    0x23: 'STOPDT con',
+    0x43: 'TESTFR act',
+    0x83: 'TESTFR con'
+}
+
+# IEC104 类型标识
+TYPE_IDENTIFICATION = {
+    0x01: 'M_SP_NA_1 单点信息',
+    0x03: 'M_DP_NA_1 双点信息',
+    0x09: 'M_ME_NA_1 测量值,归一化值',
+    0x0B: 'M_ME_NB_1 测量值,标度化值',
+    0x0D: 'M_ME_NC_1 测量值,短浮点数',
+    0x0F: 'M_IT_NA_1 累计量',
+    0x1E: 'M_SP_TB_1 带时标的单点信息',
+    0x1F: 'M_DP_TB_1 带时标的双点信息',
+    0x24: 'M_ME_TF_1 带时标的测量值,短浮点数',
+    0x2D: 'C_SC_NA_1 单命令',
+    0x2E: 'C_DC_NA_1 双命令',
+    0x2F: 'C_RC_NA_1 调节命令',
+    0x30: 'C_SE_NA_1 设定值命令,归一化值',
+    0x31: 'C_SE_NB_1 设定值命令,标度化值',
+    0x32: 'C_SE_NC_1 设定值命令,短浮点数',
+    0x64: 'C_IC_NA_1 总召唤命令',
+    0x65: 'C_CI_NA_1 电能脉冲召唤命令',
+    0x67: 'C_CS_NA_1 时钟同步命令',
+    0x68: 'C_TS_NA_1 测试命令',
+    0x69: 'C_RP_NA_1 复位进程命令',
+    0x6A: 'C_CD_NA_1 延时获得命令'
+}
+
+# 传输原因
+CAUSE_OF_TRANSMISSION = {
+    1: '周期循环',
+    2: '背景扫描',
+    3: '突发',
+    4: '初始化',
+    5: '被请求',
+    6: '激活',
+    7: '激活确认',
+    8: '停止激活',
+    9: '停止激活确认',
+    10: '激活终止',
+    11: '远程命令引起的返送信息',
+    12: '当地命令引起的返送信息',
+    13: '文件传输',
+    20: '响应总召唤',
+    21: '响应第1组召唤',
+    36: '响应计数量总召唤',
+    37: '响应第1组计数量召唤',
+    44: '未知类型标识',
+    45: '未知传送原因',
+    46: '未知公共地址',
+    47: '未知信息对象地址'
+}
+
+class IEC104FrameParser:
+    """IEC104帧解析器"""
+    
+    APCI_START = 0x68
+    MIN_FRAME_LENGTH = 6
+    ASDU_MIN_LENGTH = 12
+    
+    @staticmethod
+    def parse_hex_string(data_str: str) -> Optional[List[int]]:
+        """解析十六进制字符串为字节数组"""
+        try:
+            # 支持多种格式并去除首尾空格
+            data_str = data_str.strip()  # 添加这行
+            # 过滤空字符串
+            parts = [x for x in data_str.split() if x]  # 修改这行
+            return [int(x, 16) for x in parts]
+        except (ValueError, IndexError) as e:
+            log_event('hex_parse_failed', error=str(e), data=data_str[:100])
+            return None
+    
+    @staticmethod
+    def parse_i_frame(bytes_data: List[int], frame_info: Dict[str, Any]) -> None:
+        """解析I帧"""
+        ctrl1, ctrl2, ctrl3, ctrl4 = bytes_data[2:6]
+        
+        frame_info['type'] = 'I'
+        frame_info['type_desc'] = IEC104_FRAME_TYPES['I']
+        frame_info['send_seq'] = ((ctrl1 & 0xFE) >> 1) | ((ctrl2 & 0xFF) << 7)
+        frame_info['recv_seq'] = ((ctrl3 & 0xFE) >> 1) | ((ctrl4 & 0xFF) << 7)
+        
+        # 解析ASDU
+        if len(bytes_data) >= IEC104FrameParser.ASDU_MIN_LENGTH:
+            IEC104FrameParser.parse_asdu(bytes_data, frame_info)
+    
+    @staticmethod
+    def parse_s_frame(bytes_data: List[int], frame_info: Dict[str, Any]) -> None:
+        """解析S帧"""
+        ctrl3, ctrl4 = bytes_data[4:6]
+        
+        frame_info['type'] = 'S'
+        frame_info['type_desc'] = IEC104_FRAME_TYPES['S']
+        frame_info['recv_seq'] = ((ctrl3 & 0xFE) >> 1) | ((ctrl4 & 0xFF) << 7)
+    
+    @staticmethod
+    def parse_u_frame(bytes_data: List[int], frame_info: Dict[str, Any]) -> None:
+        """解析U帧"""
+        ctrl1 = bytes_data[2]
+        
+        frame_info['type'] = 'U'
+        frame_info['type_desc'] = IEC104_FRAME_TYPES['U']
+        frame_info['function'] = U_FRAME_FUNCTIONS.get(ctrl1, f'未知功能(0x{ctrl1:02X})')
+    
+    @staticmethod
+    def parse_asdu(bytes_data: List[int], frame_info: Dict[str, Any]) -> None:
+        """解析ASDU（应用服务数据单元）"""
+        type_id = bytes_data[6]
+        vsq = bytes_data[7]
+        cause = bytes_data[8]
+        
+        frame_info['type_id'] = f'0x{type_id:02X}'
+        frame_info['type_id_desc'] = TYPE_IDENTIFICATION.get(type_id, '未知类型')
+        frame_info['sq'] = (vsq & 0x80) >> 7  # 顺序标志
+        frame_info['num_obj'] = vsq & 0x7F   # 信息对象数量
+        frame_info['cause'] = cause & 0x3F    # 传输原因（低6位）
+        frame_info['cause_desc'] = CAUSE_OF_TRANSMISSION.get(
+            cause & 0x3F, 
+            f'未知原因({cause & 0x3F})'
+        )
+        frame_info['test'] = (cause & 0x80) >> 7  # 测试标志
+        frame_info['pn'] = (cause & 0x40) >> 6     # 肯定/否定标志
+        
+        # ASDU地址（2字节）
+        if len(bytes_data) >= 12:
+            frame_info['asdu_addr'] = bytes_data[10] | (bytes_data[11] << 8)
+        
+        # 信息对象地址（如果有）
+        if len(bytes_data) >= 15:
+            frame_info['ioa'] = (bytes_data[12] | 
+                               (bytes_data[13] << 8) | 
+                               (bytes_data[14] << 16))
+            
+        # 尝试解析信息元素
+        if len(bytes_data) >= 16:
+            IEC104FrameParser.parse_information_elements(bytes_data, frame_info, type_id)
+    
+    @staticmethod
+    def parse_information_elements(bytes_data: List[int], frame_info: Dict[str, Any], type_id: int) -> None:
+        """解析信息元素"""
+        try:
+            if type_id == 0x64:  # 总召唤
+                if len(bytes_data) >= 16:
+                    qoi = bytes_data[15]
+                    frame_info['qoi'] = qoi
+                    frame_info['qoi_desc'] = '总召唤' if qoi == 20 else f'召唤{qoi}'
+            
+            elif type_id in [0x01, 0x1E]:  # 单点信息
+                if len(bytes_data) >= 16:
+                    siq = bytes_data[15]
+                    frame_info['value'] = siq & 0x01
+                    frame_info['quality'] = {
+                        'blocked': (siq & 0x10) >> 4,
+                        'substituted': (siq & 0x20) >> 5,
+                        'not_topical': (siq & 0x40) >> 6,
+                        'invalid': (siq & 0x80) >> 7
+                    }
+            
+            elif type_id in [0x0D, 0x24]:  # 短浮点数
+                if len(bytes_data) >= 19:
+                    value_bytes = bytes(bytes_data[15:19])
+                    value = struct.unpack('<f', value_bytes)[0]
+                    frame_info['value'] = round(value, 4)
+                    if len(bytes_data) >= 20:
+                        qds = bytes_data[19]
+                        frame_info['quality'] = {
+                            'overflow': qds & 0x01,
+                            'blocked': (qds & 0x10) >> 4,
+                            'substituted': (qds & 0x20) >> 5,
+                            'not_topical': (qds & 0x40) >> 6,
+                            'invalid': (qds & 0x80) >> 7
+                        }
+        except Exception as e:
+            PARSE_FAILURES.inc('element')
+            log_event('element_parse_failed', error=str(e))
+    
+    @classmethod
+    def parse(cls, data_str: str) -> Dict[str, Any]:
+        """解析IEC104帧"""
+        if not data_str or not data_str.strip():
+            return {'type': 'INVALID', 'description': '空数据'}
+        
+        bytes_data = cls.parse_hex_string(data_str)
+        if bytes_data is None:
+            return {'type': 'INVALID', 'description': '十六进制格式错误'}
+        
+        if len(bytes_data) < cls.MIN_FRAME_LENGTH:
+            return {
+                'type': 'INVALID', 
+                'description': f'帧长度不足（需要至少{cls.MIN_FRAME_LENGTH}字节，实际{len(bytes_data)}字节）'
+            }
+        
+        # 检查启动字符
+        if bytes_data[0] != cls.APCI_START:
+            return {
+                'type': 'INVALID', 
+                'description': f'无效的启动字符: 0x{bytes_data[0]:02X} (期望 0x68)'
+            }
+        
+        # 获取APDU长度
+        apdu_len = bytes_data[1]
+        
+        # 验证实际长度
+        expected_len = apdu_len + 2  # APDU长度 + 启动字符 + 长度字节
+        if len(bytes_data) < expected_len:
+            PARSE_FAILURES.inc('truncated_frame')
+            log_event('frame_truncated', actual=len(bytes_data), expected=expected_len)
+        
+        ctrl1 = bytes_data[2]
+        
+        frame_info = {
+            'apdu_len': apdu_len,
+            'ctrl': ' '.join(f'{b:02X}' for b in bytes_data[2:6] if len(bytes_data) > 5),
+            'raw_bytes': ' '.join(f'{b:02X}' for b in bytes_data),
+            'byte_count': len(bytes_data)
+        }
+        
+        try:
+            # 判断帧类型
+            if (ctrl1 & 0x01) == 0:  # I帧
+                cls.parse_i_frame(bytes_data, frame_info)
+            elif (ctrl1 & 0x03) == 0x01:  # S帧
+                cls.parse_s_frame(bytes_data, frame_info)
+            elif (ctrl1 & 0x03) == 0x03:  # U帧
+                cls.parse_u_frame(bytes_data, frame_info)
+            else:
+                frame_info['type'] = 'UNKNOWN'
+                frame_info['description'] = f'未知帧类型: 0x{ctrl1:02X}'
+        
+        except Exception as e:
+            return {'type': 'ERROR', 'description': f'解析错误: {str(e)}'}
+        
+        return frame_info
+
+
+# ==================== 字节级快速解析 ====================
+
+# 预编译的报文布局（小端）
+_APCI_STRUCT = struct.Struct('<BBHH')      # 启动字符, APDU长度, 控制域1-2, 控制域3-4
+_ASDU_STRUCT = struct.Struct('<BBBxH')     # 类型标识, VSQ, 传输原因, (源地址), 公共地址
+_IOA_STRUCT = struct.Struct('<HB')         # 信息对象地址（3字节）
+_FLOAT_STRUCT = struct.Struct('<f')        # 短浮点数
+_FLOAT_QDS_STRUCT = struct.Struct('<fB')   # 短浮点数 + QDS
+_INT16_QDS_STRUCT = struct.Struct('<hB')   # 归一化/标度化值 + QDS
+_BCR_STRUCT = struct.Struct('<iB')         # 累计量 + 顺序号/品质
+_CP56_STRUCT = struct.Struct('<HBBBBB')    # CP56Time2a: 毫秒, 分, 时, 日, 月, 年
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def _decode_qoi(data: memoryview, size: int, frame_info: Dict[str, Any]) -> None:
+    """总召唤限定词"""
+    qoi = data[15]
+    frame_info['qoi'] = qoi
+    frame_info['qoi_desc'] = '总召唤' if qoi == 20 else f'召唤{qoi}'
+
+
+def _decode_single_point(data: memoryview, size: int, frame_info: Dict[str, Any]) -> None:
+    """单点信息"""
+    siq = data[15]
+    frame_info['value'] = siq & 0x01
+    frame_info['quality'] = {
+        'blocked': (siq & 0x10) >> 4,
+        'substituted': (siq & 0x20) >> 5,
+        'not_topical': (siq & 0x40) >> 6,
+        'invalid': (siq & 0x80) >> 7
+    }
+
+
+def _decode_short_float(data: memoryview, size: int, frame_info: Dict[str, Any]) -> None:
+    """短浮点数"""
+    if size < 19:
+        return
+    frame_info['value'] = round(_FLOAT_STRUCT.unpack_from(data, 15)[0], 4)
+    if size >= 20:
+        qds = data[19]
+        frame_info['quality'] = {
+            'overflow': qds & 0x01,
+            'blocked': (qds & 0x10) >> 4,
+            'substituted': (qds & 0x20) >> 5,
+            'not_topical': (qds & 0x40) >> 6,
+            'invalid': (qds & 0x80) >> 7
+        }
+
+
+# 类型标识 -> 信息元素解码函数
+INFORMATION_ELEMENT_DECODERS: Dict[int, Callable[[memoryview, int, Dict[str, Any]], None]] = {
+    0x64: _decode_qoi,
+    0x01: _decode_single_point,
+    0x1E: _decode_single_point,
+    0x0D: _decode_short_float,
+    0x24: _decode_short_float,
+}
+
+
+# ---------- 多信息对象解码 ----------
+# 元素解码函数返回 (值, 品质字节)。品质字节保留原始位：
+# SIQ/DIQ 为高4位(BL/SB/NT/IV)，QDS 另含 OV(bit0)，BCR 为整个顺序号字节(IV/CA/CY/SQ)
+
+def _element_siq(data: memoryview, pos: int):
+    siq = data[pos]
+    return siq & 0x01, siq & 0xF0
+
+
+def _element_diq(data: memoryview, pos: int):
+    diq = data[pos]
+    return diq & 0x03, diq & 0xF0
+
+
+def _element_nva(data: memoryview, pos: int):
+    value, qds = _INT16_QDS_STRUCT.unpack_from(data, pos)
+    return round(value / 32768, 5), qds & 0xF1
+
+
+def _element_sva(data: memoryview, pos: int):
+    value, qds = _INT16_QDS_STRUCT.unpack_from(data, pos)
+    return value, qds & 0xF1
+
+
+def _element_float(data: memoryview, pos: int):
+    value, qds = _FLOAT_QDS_STRUCT.unpack_from(data, pos)
+    return round(value, 4), qds & 0xF1
+
+
+def _element_bcr(data: memoryview, pos: int):
+    return _BCR_STRUCT.unpack_from(data, pos)
+
+
+def cp56time2a_to_ms(data: BytesLike, pos: int = 0) -> Optional[int]:
+    """CP56Time2a 时标转毫秒时间戳（按本地时间解释），无效时标返回 None"""
+    millis, minute, hour, day, month, year = _CP56_STRUCT.unpack_from(data, pos)
+    if minute & 0x80:  # IV: 时标无效
+        return None
+    try:
+        dt = datetime(2000 + (year & 0x7F), month & 0x0F, day & 0x1F,
+                      hour & 0x1F, minute & 0x3F)
+    except ValueError:
+        return None
+    return int(dt.timestamp()) * 1000 + millis
+
+
+# 监视方向类型标识 -> (信息元素长度, 元素解码函数, 是否带CP56Time2a时标)
+INFORMATION_OBJECT_LAYOUTS: Dict[int, Any] = {
+    0x01: (1, _element_siq, False),    # M_SP_NA_1
+    0x03: (1, _element_diq, False),    # M_DP_NA_1
+    0x09: (3, _element_nva, False),    # M_ME_NA_1
+    0x0B: (3, _element_sva, False),    # M_ME_NB_1
+    0x0D: (5, _element_float, False),  # M_ME_NC_1
+    0x0F: (5, _element_bcr, False),    # M_IT_NA_1
+    0x1E: (1, _element_siq, True),     # M_SP_TB_1
+    0x1F: (1, _element_diq, True),     # M_DP_TB_1
+    0x24: (5, _element_float, True),   # M_ME_TF_1
+}
+
+CP56TIME2A_LENGTH = 7
+
+
+def information_object_positions(data: BytesLike, type_id: int, vsq: int) -> Optional[List[Tuple[int, int]]]:
+    """ASDU中各信息对象的 (地址, 信息元素起始偏移)，对象数按报文长度截断，不支持的类型标识返回 None"""
+    layout = INFORMATION_OBJECT_LAYOUTS.get(type_id)
+    if layout is None:
+        return None
+
+    size = len(data)
+    element_len, _, timed = layout
+    step = element_len + CP56TIME2A_LENGTH if timed else element_len
+    count = vsq & 0x7F
+
+    if vsq & 0x80:  # SQ=1: 连续地址
+        if size < 15:
+            return []
+        low, high = _IOA_STRUCT.unpack_from(data, 12)
+        base = low | (high << 16)
+        count = min(count, (size - 15) // step)
+        return [(base + i, 15 + i * step) for i in range(count)]
+
+    # SQ=0: 每个对象带地址
+    positions = []
+    pos = 12
+    for _ in range(min(count, (size - 12) // (step + 3))):
+        low, high = _IOA_STRUCT.unpack_from(data, pos)
+        positions.append((low | (high << 16), pos + 3))
+        pos += step + 3
+    return positions
+
+
+def decode_information_objects(data: BytesLike, type_id: int, vsq: int) -> Optional[Dict[str, List[Any]]]:
+    """解码ASDU中的全部信息对象
+
+    返回平行数组 {'ioa': [...], 'value': [...], 'quality': [...], 'time': [...]}，
+    不支持的类型标识返回 None。SQ=1 时只有首个对象携带地址，后续地址依次加1。
+    """
+    positions = information_object_positions(data, type_id, vsq)
+    if positions is None:
+        return None
+
+    data = memoryview(data)
+    element_len, decode, timed = INFORMATION_OBJECT_LAYOUTS[type_id]
+    ioas: List[int] = []
+    values: List[Any] = []
+    qualities: List[int] = []
+    times: List[Optional[int]] = []
+    for ioa, pos in positions:
+        value, quality = decode(data, pos)
+        ioas.append(ioa)
+        values.append(value)
+        qualities.append(quality)
+        times.append(cp56time2a_to_ms(data, pos + element_len) if timed else None)
+
+    return {'ioa': ioas, 'value': values, 'quality': qualities, 'time': times}
+
+
+class FastIEC104FrameParser:
+    """IEC104帧解析器（字节级实现）
+
+    直接在 bytes/memoryview 上按预编译的 struct 布局取字段，
+    信息元素按类型标识查表分发，输出与 IEC104FrameParser 相同的 frame_info 结构。
+    """
+
+    APCI_START = IEC104FrameParser.APCI_START
+    MIN_FRAME_LENGTH = IEC104FrameParser.MIN_FRAME_LENGTH
+    ASDU_MIN_LENGTH = IEC104FrameParser.ASDU_MIN_LENGTH
+
+    @staticmethod
+    def decode_hex(data_str: str) -> Optional[bytes]:
+        """十六进制字符串转字节，非标准格式回退到逐段解析"""
+        try:
+            return bytes.fromhex(data_str)
+        except ValueError:
+            bytes_data = IEC104FrameParser.parse_hex_string(data_str)
+            if bytes_data is None:
+                return None
+            try:
+                return bytes(bytes_data)
+            except ValueError:
+                return None
+
+    @classmethod
+    def parse(cls, data_str: str, describe: bool = True, objects: bool = True) -> Dict[str, Any]:
+        """解析十六进制字符串形式的IEC104帧"""
+        if not data_str or not data_str.strip():
+            return {'type': 'INVALID', 'description': '空数据'}
+
+        bytes_data = cls.decode_hex(data_str)
+        if bytes_data is None:
+            return {'type': 'INVALID', 'description': '十六进制格式错误'}
+
+        return cls.parse_bytes(bytes_data, describe, objects)
+
+    @classmethod
+    def parse_bytes(cls, bytes_data: BytesLike, describe: bool = True, objects: bool = True) -> Dict[str, Any]:
+        """解析字节形式的IEC104帧
+
+        describe 为 False 时不生成描述文字（type_desc、type_id_desc、cause_desc）和 ctrl、raw_bytes，
+        objects 为 False 时不解码全部信息对象（没有 objects，value 只取首个对象）。
+        """
+        data = memoryview(bytes_data)
+        size = len(data)
+        if size < cls.MIN_FRAME_LENGTH:
+            return {
+                'type': 'INVALID',
+                'description': f'帧长度不足（需要至少{cls.MIN_FRAME_LENGTH}字节，实际{size}字节）'
+            }
+
+        start, apdu_len, ctrl12, ctrl34 = _APCI_STRUCT.unpack_from(data)
+        if start != cls.APCI_START:
+            return {
+                'type': 'INVALID',
+                'description': f'无效的启动字符: 0x{start:02X} (期望 0x68)'
+            }
+
+        if size < apdu_len + 2:
+            PARSE_FAILURES.inc('truncated_frame')
+            log_event('frame_truncated', actual=size, expected=apdu_len + 2)
+
+        frame_info = {
+            'apdu_len': apdu_len,
+            'ctrl': data[2:6].hex(' ').upper(),
+            'raw_bytes': data.hex(' ').upper(),
+            'byte_count': size
+        } if describe else {'apdu_len': apdu_len, 'byte_count': size}
+
+        try:
+            ctrl1 = ctrl12 & 0xFF
+            if (ctrl1 & 0x01) == 0:  # I帧
+                frame_info['type'] = 'I'
+                if describe:
+                    frame_info['type_desc'] = IEC104_FRAME_TYPES['I']
+                frame_info['send_seq'] = ctrl12 >> 1
+                frame_info['recv_seq'] = ctrl34 >> 1
+                if size >= cls.ASDU_MIN_LENGTH:
+                    cls.parse_asdu(data, size, frame_info, describe, objects)
+            elif (ctrl1 & 0x03) == 0x01:  # S帧
+                frame_info['type'] = 'S'
+                if describe:
+                    frame_info['type_desc'] = IEC104_FRAME_TYPES['S']
+                frame_info['recv_seq'] = ctrl34 >> 1
+            elif (ctrl1 & 0x03) == 0x03:  # U帧
+                frame_info['type'] = 'U'
+                if describe:
+                    frame_info['type_desc'] = IEC104_FRAME_TYPES['U']
+                frame_info['function'] = U_FRAME_FUNCTIONS.get(ctrl1, f'未知功能(0x{ctrl1:02X})')
+            else:
+                frame_info['type'] = 'UNKNOWN'
+                frame_info['description'] = f'未知帧类型: 0x{ctrl1:02X}'
+
+        except Exception as e:
+            return {'type': 'ERROR', 'description': f'解析错误: {str(e)}'}
+
+        return frame_info
+
+    @staticmethod
+    def parse_asdu(data: memoryview, size: int, frame_info: Dict[str, Any],
+                   describe: bool = True, objects: bool = True) -> None:
+        """解析ASDU（应用服务数据单元）"""
+        type_id, vsq, cause, asdu_addr = _ASDU_STRUCT.unpack_from(data, 6)
+        cot = cause & 0x3F
+
+        frame_info['type_id'] = f'0x{type_id:02X}'
+        if describe:
+            frame_info['type_id_desc'] = TYPE_IDENTIFICATION.get(type_id, '未知类型')
+        frame_info['sq'] = vsq >> 7
+        frame_info['num_obj'] = vsq & 0x7F
+        frame_info['cause'] = cot
+        if describe:
+            frame_info['cause_desc'] = CAUSE_OF_TRANSMISSION.get(cot, f'未知原因({cot})')
+        frame_info['test'] = cause >> 7
+        frame_info['pn'] = (cause & 0x40) >> 6
+        frame_info['asdu_addr'] = asdu_addr
+
+        if size >= 15:
+            low, high = _IOA_STRUCT.unpack_from(data, 12)
+            frame_info['ioa'] = low | (high << 16)
+
+        if size >= 16:
+            decoder = INFORMATION_ELEMENT_DECODERS.get(type_id)
+            if decoder is not None:
+                decoder(data, size, frame_info)
+
+        if objects:
+            decoded = decode_information_objects(data, type_id, vsq)
+            if decoded is not None:
+                frame_info['objects'] = decoded
+                if decoded['value'] and 'value' not in frame_info:
+                    frame_info['value'] = decoded['value'][0]
+        elif 'value' not in frame_info:
+            # 只解码首个对象的值（SQ=0/1 时首个元素都从偏移15开始）
+            layout = INFORMATION_OBJECT_LAYOUTS.get(type_id)
+            if layout is not None and vsq & 0x7F:
+                element_len, decode, timed = layout
+                if size >= 15 + element_len + (CP56TIME2A_LENGTH if timed else 0):
+                    frame_info['value'] = decode(data, 15)[0]
+
+
+def classify_frame(bytes_data: BytesLike) -> Tuple[str, Optional[int], Optional[int]]:
+    """只看帧头判断帧类型，返回 (帧类型, 类型标识, 传输原因)，后两者仅对带ASDU的I帧有效"""
+    size = len(bytes_data)
+    if size < FastIEC104FrameParser.MIN_FRAME_LENGTH or bytes_data[0] != FastIEC104FrameParser.APCI_START:
+        return 'INVALID', None, None
+
+    ctrl1 = bytes_data[2]
+    if (ctrl1 & 0x01) == 0:
+        if size >= FastIEC104FrameParser.ASDU_MIN_LENGTH:
+            return 'I', bytes_data[6], bytes_data[8] & 0x3F
+        return 'I', None, None
+    if (ctrl1 & 0x03) == 0x01:
+        return 'S', None, None
+    return 'U', None, None
+
+
+# 方向描述
+DIRECTION_DESC = {
+    'TX': '服务端→客户端',
+    'RX': '客户端→服务端',
+}
+
+
+def classify_direction(direction: str) -> str:
+    """日志中的 dir 字段转换为 TX/RX/UNKNOWN"""
+    if 'ser -> cli' in direction or 'server' in direction.lower():
+        return 'TX'
+    if 'cli -> ser' in direction or 'client' in direction.lower():
+        return 'RX'
+    return 'UNKNOWN'
+
+
+@lru_cache(maxsize=4096)
+def _format_second(seconds: int) -> str:
+    return datetime.fromtimestamp(seconds).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def format_timestamp(timestamp_ms: int) -> str:
+    """毫秒时间戳转换为显示用的本地时间字符串（同一秒内的帧复用秒级部分）"""
+    if timestamp_ms > 0:
+        seconds, millis = divmod(int(timestamp_ms), 1000)
+        return f'{_format_second(seconds)}.{millis:03d}'
+    return 'N/A'
+
+
+def _json_uint(text: str) -> Optional[int]:
+    """JSON 非负整数文本转换为 int（前导零等非法写法返回 None）"""
+    if text.isascii() and text.isdigit() and (text[0] != '0' or text == '0'):
+        return int(text)
+    return None
+
+
+def split_fixed_line(line: str) -> Optional[Tuple[str, int, int, str]]:
+    """按日志程序的固定格式 {"dir":"...","time_ms":N,"len":N,"data":"..."} 取出各字段
+    
+    只按引号切分，不做通用JSON解析；字段顺序、空白不同或含转义字符的行返回 None，
+    由调用方按通用JSON解析。
+    """
+    parts = line.split('"')
+    if (len(parts) != 13 or parts[0] != '{' or parts[12] != '}'
+            or parts[1] != 'dir' or parts[2] != ':' or parts[4] != ','
+            or parts[5] != 'time_ms' or parts[7] != 'len' or parts[9] != 'data' or parts[10] != ':'
+            or parts[6][:1] != ':' or parts[6][-1:] != ',' or parts[8][:1] != ':' or parts[8][-1:] != ','
+            or '\\' in line or not line.isprintable()):
+        return None
+    time_ms = _json_uint(parts[6][1:-1])
+    length = _json_uint(parts[8][1:-1])
+    if time_ms is None or length is None:
+        return None
+    return parts[3], time_ms, length, parts[11]
+
+
+def decode_log_line(line: str) -> Tuple[str, int, Optional[int], str]:
+    """取出日志行的 (dir, time_ms, len, data) 字段，len 缺省时为 None（固定格式的行走快速路径）
+    
+    不是有效JSON时抛出 ValueError，不是JSON对象时抛出 AttributeError，
+    字段类型不对（dir/data 不是字符串，time_ms/len 不是整数）时抛出 TypeError。
+    所有按行读取日志的模块都经由这里（或 extract_log_fields），对同一行的取舍一致。
+    """
+    fields = split_fixed_line(line)
+    if fields is not None:
+        return fields
+    log_data = loads(line)
+    direction = log_data.get('dir', '')
+    time_ms = log_data.get('time_ms', 0)
+    length = log_data.get('len')
+    data_hex = log_data.get('data', '')
+    if (not isinstance(direction, str) or not isinstance(data_hex, str)
+            or not isinstance(time_ms, int) or isinstance(time_ms, bool)
+            or (length is not None and (not isinstance(length, int) or isinstance(length, bool)))):
+        raise TypeError('日志行字段类型无效')
+    return direction, time_ms, length, data_hex
+
+
+def extract_log_fields(line: bytes, encoding: str = 'utf-8') -> Optional[Tuple[str, int, str]]:
+    """不构造完整条目，只取出日志行的 (dir, time_ms, data)，无法解析的行返回 None
+
+    与 decode_log_line 的校验相同，统计、列式存储、检索等模块与 /api/logs 跳过的是同样的行。
+    """
+    text = line.decode(encoding, errors='ignore').strip()
+    if not text:
+        return None
+    try:
+        direction, time_ms, _, data_hex = decode_log_line(text)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return direction, time_ms, data_hex.strip()
+
+
+def build_log_entry(line: str, direction: str, timestamp_ms: int,
+                    length: Optional[int], data_hex: str) -> Dict[str, Any]:
+    """由日志行的各字段生成日志条目（解析其中的IEC104帧）"""
+    # 转换时间戳
+    timestamp_str = format_timestamp(timestamp_ms)
+    
+    # 解析方向
+    dir_type = classify_direction(direction)
+    dir_desc = DIRECTION_DESC.get(dir_type) or direction or '未知方向'
+    
+    # 解析IEC104帧
+    data_hex = data_hex.strip()
+    frame_info = FastIEC104FrameParser.parse(data_hex) if data_hex else {}
+    if length is None:
+        length = len(data_hex.split()) if data_hex else 0
+    
+    return {
+        'timestamp': timestamp_str,
+        'timestamp_ms': timestamp_ms,
+        'direction': dir_type,
+        'direction_desc': dir_desc,
+        'length': length,
+        'data': data_hex,
+        'frame_info': frame_info,
+        'raw': line
+    }
+
+
+def build_compact_entry(line: str, direction: str, timestamp_ms: int, length: Optional[int],
+                        data_hex: str, frame: bool = True) -> Dict[str, Any]:
+    """生成精简的日志条目：不含 timestamp、描述文字、ctrl、raw_bytes 和 objects（见 projection）
+
+    frame 为 False 时不解析帧，frame_info 为空；方向无法识别时保留原始 dir 作为 direction_desc。
+    """
+    dir_type = classify_direction(direction)
+    data_hex = data_hex.strip()
+    if length is None:
+        length = len(data_hex.split()) if data_hex else 0
+    entry = {
+        'timestamp_ms': timestamp_ms,
+        'direction': dir_type,
+        'length': length,
+        'data': data_hex,
+        'frame_info': (FastIEC104FrameParser.parse(data_hex, describe=False, objects=False)
+                       if frame and data_hex else {}),
+        'raw': line
+    }
+    if dir_type not in DIRECTION_DESC:
+        entry['direction_desc'] = direction or '未知方向'
+    return entry
+
+
+def report_line_failure(reason: str, error: Exception, line: str, **position: Any) -> None:
+    """记录一行解析失败（计数并输出限频日志），position 为行号/偏移等定位信息"""
+    PARSE_FAILURES.inc(reason)
+    log_event('log_line_parse_failed', reason=reason, error=str(error), line=line[:100], **position)
+
+
+def parse_log_line_json(line: str) -> Optional[Dict[str, Any]]:
+    """解析JSON格式的日志行（固定格式的行走快速路径）"""
+    # 去除首尾空白字符
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        fields = decode_log_line(line)
+    except Exception as e:
+        report_line_failure('json' if isinstance(e, ValueError) else 'fields', e, line)
+        return None
+    try:
+        return build_log_entry(line, *fields)
+    except Exception as e:
+        report_line_failure('fields', e, line)
+        return None
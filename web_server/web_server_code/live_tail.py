@@ -0,0 +1,297 @@
+"""日志实时推送
+
+每个日志文件只有一个 FileWatcher 线程：Linux 上用 inotify 等待文件变化，
+其他平台（或 inotify 不可用时）退回到定时 stat 轮询。文件追加后读取并解析一次，
+结果（Batch）推送给该文件的全部订阅者：SSE 连接共享一次序列化的消息文本，
+长轮询请求直接使用已解析的行，按各自的字段选择生成条目。
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import config
+from binary_log import is_binary_log
+from event_log import log_event
+from frame_cache import ParsedLine, build_log_entries, parse_log_lines
+from log_index import get_log_index
+from log_reader import TailReader, TailResult, last_line_end
+from log_source import log_size, open_log
+from metrics import STAGE_SECONDS, timed
+from serializer import dumps
+
+# inotify 事件掩码
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVE_SELF = 0x00000800
+IN_DELETE_SELF = 0x00000400
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVE_SELF | IN_DELETE_SELF
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1  # noqa: B018 确认符号存在
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+class Inotify:
+    """基于 ctypes 的最小 inotify 封装，只监视单个文件"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失败')
+        self.watch()
+
+    def watch(self) -> None:
+        """(重新)监视路径，文件被轮转后需要重新添加"""
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(self.filepath), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch 失败: {self.filepath}')
+
+    def wait(self, timeout: float) -> bool:
+        """等待文件事件，返回是否有事件（事件内容直接丢弃）"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _sse_message(event: str, payload: Dict) -> str:
+    with timed(STAGE_SECONDS, 'serialize'):
+        return f"event: {event}\ndata: {dumps(payload)}\n\n"
+
+
+class Batch:
+    """一次推送：新增日志（event 为 logs，lines 为已解析行）或重置通知（event 为 reset）
+
+    message 为 SSE 消息文本，只在有 SSE 订阅者时由监视线程生成一次，否则为 None。
+    """
+
+    __slots__ = ('event', 'lines', 'position', 'file_size', 'inode', 'more', 'reason', 'message')
+
+    def __init__(self, event: str, position: int, lines: Optional[List[ParsedLine]] = None,
+                 file_size: int = 0, inode: Optional[int] = None, more: bool = False,
+                 reason: Optional[str] = None, serialize: bool = True):
+        self.event = event
+        self.lines = lines or []
+        self.position = position
+        self.file_size = file_size
+        self.inode = inode
+        self.more = more
+        self.reason = reason
+        self.message = self._message() if serialize else None
+
+    @classmethod
+    def logs(cls, result: TailResult, filepath: str, serialize: bool = True) -> 'Batch':
+        return cls('logs', result.position, parse_log_lines(result.lines, filepath), result.file_size,
+                   result.inode, result.more, serialize=serialize)
+
+    @classmethod
+    def reset(cls, position: int, reason: str) -> 'Batch':
+        return cls('reset', position, reason=reason)
+
+    def _message(self) -> str:
+        if self.event == 'reset':
+            return _sse_message('reset', {'position': self.position, 'reason': self.reason})
+        logs = build_log_entries(self.lines)
+        return _sse_message('logs', {
+            'logs': logs,
+            'count': len(logs),
+            'position': self.position,
+            'file_size': self.file_size
+        })
+
+
+class Subscriber:
+    """一个订阅者（stream 为 True 时是一个 SSE 连接，否则是一次长轮询）"""
+
+    def __init__(self, watcher: 'FileWatcher', stream: bool = True):
+        self.watcher = watcher
+        self.stream = stream
+        self.queue: 'queue.Queue[Batch]' = queue.Queue(maxsize=config.LIVE_TAIL_QUEUE_SIZE)
+
+    def push(self, batch: Batch) -> None:
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            # 客户端跟不上：丢弃积压并通知其重新加载
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait(Batch.reset(self.watcher.position, 'overflow'))
+
+    def get(self, timeout: float) -> Optional[Batch]:
+        """取下一次推送，超时返回 None"""
+        try:
+            return self.queue.get(timeout=max(timeout, 0))
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self.watcher.remove(self)
+
+
+class FileWatcher(threading.Thread):
+    """单个日志文件的监视线程，所有订阅者共享一次读取与解析"""
+
+    def __init__(self, filepath: str):
+        super().__init__(name=f'tail:{os.path.basename(filepath)}', daemon=True)
+        self.filepath = filepath
+        self.subscribers: List[Subscriber] = []
+        self.lock = threading.Lock()
+        self.reader = TailReader(filepath)
+        self.reader.position, self.reader.inode = self._initial_position()
+
+    @property
+    def position(self) -> int:
+        return self.reader.position
+
+    def _initial_position(self) -> Tuple[int, Optional[int]]:
+        """从文件当前最后一个完整行之后开始监视"""
+        try:
+            stats = os.stat(self.filepath)
+        except OSError:
+            return 0, None
+        if is_binary_log(self.filepath):
+            # 二进制记录没有分隔符，完整记录的结尾取自索引
+            return get_log_index(self.filepath).indexed_size, stats.st_ino
+        with open_log(self.filepath) as f:
+            return last_line_end(f, log_size(self.filepath, stats)), stats.st_ino
+
+    def add(self, subscriber: Subscriber) -> int:
+        """注册订阅者，返回注册时刻的推送位置"""
+        with self.lock:
+            self.subscribers.append(subscriber)
+            return self.position
+
+    def remove(self, subscriber: Subscriber) -> None:
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def _poll(self) -> None:
+        """检查文件变化并推送新增内容，落后较多时分批读取"""
+        while True:
+            # 读取与订阅者快照在同一把锁内完成，与 add 互斥，新订阅者不会收到重复内容
+            with self.lock:
+                result = self.reader.read()
+                subscribers = list(self.subscribers)
+
+            batches = []
+            if result.reset:
+                # 文件被截断或轮转，从头开始
+                batches.append(Batch.reset(0, 'rotated'))
+            if result.lines:
+                serialize = any(subscriber.stream for subscriber in subscribers)
+                batches.append(Batch.logs(result, self.filepath, serialize))
+            for subscriber in subscribers:
+                for batch in batches:
+                    subscriber.push(batch)
+            if not result.more:
+                break
+
+    def run(self) -> None:
+        inotify = None
+        if _libc is not None:
+            try:
+                inotify = Inotify(self.filepath)
+            except OSError as e:
+                log_event('inotify_unavailable', logging.INFO, path=self.filepath, error=str(e))
+
+        try:
+            while True:
+                with _watchers_lock, self.lock:
+                    if not self.subscribers:
+                        _watchers.pop(self.filepath, None)
+                        return
+
+                if inotify is not None:
+                    # inotify 唤醒；超时后也做一次 stat，兜底处理轮转后监视失效的情况
+                    inotify.wait(config.LIVE_TAIL_INOTIFY_TIMEOUT)
+                else:
+                    time.sleep(config.LIVE_TAIL_POLL_INTERVAL)
+
+                old_inode = self.reader.inode
+                self._poll()
+                if inotify is not None and self.reader.inode != old_inode:
+                    try:
+                        inotify.watch()
+                    except OSError:
+                        pass
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+
+_watchers: Dict[str, FileWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def subscribe(filepath: str, position: Optional[int] = None,
+              stream: bool = True) -> Tuple[Subscriber, List[Batch]]:
+    """订阅文件的新增日志（stream 为 False 时为长轮询订阅者）
+
+    返回订阅者以及补发内容：客户端位置落后于监视线程时，先补读 [position, 当前推送位置)。
+    """
+    filepath = os.path.abspath(filepath)
+    with _watchers_lock:
+        watcher = _watchers.get(filepath)
+        if watcher is None or not watcher.is_alive():
+            watcher = FileWatcher(filepath)
+            _watchers[filepath] = watcher
+            new_watcher = True
+        else:
+            new_watcher = False
+        subscriber = Subscriber(watcher, stream)
+        current = watcher.add(subscriber)
+        if new_watcher:
+            watcher.start()
+
+    backlog = []
+    if position is not None and position > current:
+        # 客户端位置超出文件范围（文件已被截断或轮转）
+        backlog.append(Batch.reset(current, 'rotated'))
+    elif position is not None and position < current:
+        reader = TailReader(filepath, position)
+        result = reader.read(end=current)
+        backlog.append(Batch.logs(result, filepath, stream))
+        if result.position < current:
+            # 落后太多，补读被截断：让客户端从当前位置重新加载
+            backlog.append(Batch.reset(current, 'overflow'))
+    return subscriber, backlog
+
+
+def watcher_count() -> int:
+    """当前活动的监视线程数"""
+    with _watchers_lock:
+        return len(_watchers)
@@ -0,0 +1,318 @@
+"""客户端/服务端日志关联与时延统计
+
+同一连接的客户端日志和服务端日志记录的是同一批报文（dir 字段相同：cli -> ser 为客户端发送，
+ser -> cli 为服务端发送）。两个文件按行流式读取，用 heapq.merge 按 time_ms 归并，
+以 (方向, 原始报文) 匹配同一帧（报文中含收发序号，正常情况下不会重复），得到每帧的单向时延
+（接收端记录时间 - 发送端记录时间，含两端时钟偏差）。超过匹配窗口仍未在另一端出现的帧计为未匹配。
+
+请求→确认时延在各自的日志内计算（同一时钟）：I帧 act→con、deact→deactcon 按
+(类型标识, 公共地址, IOA) 配对，U帧 STARTDT/STOPDT/TESTFR act→con 按功能配对。
+时延分布用有界直方图统计（1024ms 以内精确到毫秒，以上按 2% 相对精度分桶），内存与文件大小无关。
+"""
+import heapq
+import math
+import os
+import re
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import config
+from binary_log import BinaryLogReader, direction_name, is_binary_log
+from frame_store import decode_frame_header
+from iec104_parser import (TYPE_IDENTIFICATION, FastIEC104FrameParser, U_FRAME_FUNCTIONS,
+                           classify_direction, extract_log_fields)
+from log_source import is_log_file, open_log
+
+SOURCES = ('client', 'server')
+
+# 发送该方向报文的一端
+_SENDER = {'RX': 'client', 'TX': 'server'}
+
+# U帧 act -> con 功能码
+_U_CONFIRMATIONS = {0x07: 0x0B, 0x13: 0x23, 0x43: 0x83}
+# I帧传输原因：请求 -> 确认
+_CAUSE_CONFIRMATIONS = {6: 7, 8: 9}
+_CAUSE_NAMES = {6: 'act', 7: 'con', 8: 'deact', 9: 'deactcon'}
+
+# 每个请求键最多等待的未确认请求数（超出时最早的计为未确认）
+_MAX_PENDING_REQUESTS = 64
+
+_HISTOGRAM_LINEAR_LIMIT = 1024
+_HISTOGRAM_LOG_BASE = 1.02
+
+_LOG_NAME_TIME_RE = re.compile(r'(\d{10,})')
+
+# (time_ms, 来源, 行号, 方向, 报文)
+Frame = Tuple[int, str, int, str, bytes]
+
+
+class LatencyHistogram:
+    """有界直方图：计数/最小/最大/平均精确，分位数按桶近似"""
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    @staticmethod
+    def _key(value: int) -> int:
+        magnitude = abs(value)
+        if magnitude < _HISTOGRAM_LINEAR_LIMIT:
+            return value
+        key = _HISTOGRAM_LINEAR_LIMIT + int(math.log(magnitude / _HISTOGRAM_LINEAR_LIMIT,
+                                                     _HISTOGRAM_LOG_BASE))
+        return key if value > 0 else -key
+
+    @staticmethod
+    def _value(key: int) -> int:
+        """桶的代表值（对数桶取几何中点，相对误差约 1%）"""
+        magnitude = abs(key)
+        if magnitude < _HISTOGRAM_LINEAR_LIMIT:
+            return key
+        value = round(_HISTOGRAM_LINEAR_LIMIT
+                      * _HISTOGRAM_LOG_BASE ** (magnitude - _HISTOGRAM_LINEAR_LIMIT + 0.5))
+        return value if key > 0 else -value
+
+    def add(self, value: int) -> None:
+        key = self._key(value)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentiles(self, points=(50, 90, 99)) -> Dict[str, Optional[int]]:
+        result: Dict[str, Optional[int]] = {f'p{point}': None for point in points}
+        if not self.count:
+            return result
+        targets = [(point, max(1, math.ceil(self.count * point / 100))) for point in points]
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            while targets and seen >= targets[0][1]:
+                point = targets.pop(0)[0]
+                # 不超出精确的最小/最大值
+                result[f'p{point}'] = min(max(self._value(key), self.min), self.max)
+            if not targets:
+                break
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        result = {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': round(self.total / self.count, 3) if self.count else None
+        }
+        result.update(self.percentiles())
+        return result
+
+
+def iter_log_frames(filepath: str, source: str) -> Iterator[Frame]:
+    """按行流式读取日志中的帧（不完整的末行和无法解析的行被跳过）"""
+    if is_binary_log(filepath):
+        with BinaryLogReader(filepath) as reader:
+            for line_no, (_, _, direction, time_ms, payload) in enumerate(reader.records(), 1):
+                if payload:
+                    yield time_ms, source, line_no, direction_name(direction), bytes(payload)
+        return
+    with open_log(filepath) as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.endswith(b'\n'):
+                break
+            fields = extract_log_fields(line.strip(), config.LOG_ENCODING)
+            if fields is None or not fields[2]:
+                continue
+            direction, time_ms, data_hex = fields
+            payload = FastIEC104FrameParser.decode_hex(data_hex)
+            if payload:
+                yield time_ms, source, line_no, classify_direction(direction), payload
+
+
+def request_key(direction: str, payload: bytes) -> Optional[Tuple[str, Any, bool]]:
+    """请求/确认报文的配对键：(名称, 匹配字段, 是否为确认)，其他报文返回 None"""
+    frame_type, type_id, cause, asdu_addr, _, _, ioa, _, _ = decode_frame_header(payload)
+    if frame_type == 2:
+        function = payload[2]
+        if function in _U_CONFIRMATIONS:
+            name = U_FRAME_FUNCTIONS[function].split()[0]
+            return f'{name} act→con', function, False
+        for act, con in _U_CONFIRMATIONS.items():
+            if function == con:
+                name = U_FRAME_FUNCTIONS[act].split()[0]
+                return f'{name} act→con', act, True
+        return None
+    if frame_type != 0 or cause < 0:
+        return None
+    for request, confirmation in _CAUSE_CONFIRMATIONS.items():
+        if cause in (request, confirmation):
+            type_name = TYPE_IDENTIFICATION.get(type_id, f'0x{type_id:02X}').split()[0]
+            name = f'{type_name} {_CAUSE_NAMES[request]}→{_CAUSE_NAMES[confirmation]}'
+            return name, (type_id, asdu_addr, ioa), cause == confirmation
+    return None
+
+
+class LogCorrelator:
+    """归并两端日志，统计单向时延和请求→确认时延"""
+
+    def __init__(self, window_ms: int = config.CORRELATION_WINDOW_MS,
+                 pair_offset: int = 0, pair_limit: int = 100):
+        self.window_ms = window_ms
+        self.pair_offset = pair_offset
+        self.pair_limit = pair_limit
+        self.frames = {source: 0 for source in SOURCES}
+        self.matched = 0
+        self.unmatched = {source: 0 for source in SOURCES}
+        self.delay = {'TX': LatencyHistogram(), 'RX': LatencyHistogram()}
+        self.latency: Dict[str, Dict[str, LatencyHistogram]] = {source: {} for source in SOURCES}
+        self.unanswered = {source: 0 for source in SOURCES}
+        self.pairs: List[Dict[str, Any]] = []
+        # (方向, 报文) -> 尚未在另一端出现的帧；_order 按时间记录全部待匹配帧，用于过期
+        self._pending: Dict[Tuple[str, bytes], Deque[list]] = {}
+        self._order: Deque[list] = deque()
+        self._requests: Dict[Tuple[str, str, Any], Deque[int]] = {}
+
+    def _expire(self, now: int) -> None:
+        limit = now - self.window_ms
+        order = self._order
+        while order and order[0][0] < limit:
+            item = order.popleft()
+            if item[4]:
+                continue
+            key = item[3]
+            waiting = self._pending[key]
+            waiting.popleft()  # 同一键按时间先进先出，最早的就是 item
+            if not waiting:
+                del self._pending[key]
+            self.unmatched[item[1]] += 1
+
+    def _match(self, frame: Frame) -> None:
+        time_ms, source, line_no, direction, payload = frame
+        if direction not in _SENDER:
+            self.unmatched[source] += 1
+            return
+        key = (direction, payload)
+        waiting = self._pending.get(key)
+        if waiting and waiting[0][1] != source:
+            other = waiting.popleft()
+            if not waiting:
+                del self._pending[key]
+            other[4] = True
+            self._pair(direction, payload, other[0], other[1], other[2], time_ms, source, line_no)
+            return
+        item = [time_ms, source, line_no, key, False]
+        self._pending.setdefault(key, deque()).append(item)
+        self._order.append(item)
+
+    def _pair(self, direction: str, payload: bytes, first_time: int, first_source: str,
+              first_line: int, second_time: int, second_source: str, second_line: int) -> None:
+        """同一帧在两端的记录：时延 = 接收端时间 - 发送端时间"""
+        times = {first_source: first_time, second_source: second_time}
+        lines = {first_source: first_line, second_source: second_line}
+        sender = _SENDER[direction]
+        receiver = 'server' if sender == 'client' else 'client'
+        delay = times[receiver] - times[sender]
+        self.delay[direction].add(delay)
+        if self.pair_offset <= self.matched < self.pair_offset + self.pair_limit:
+            self.pairs.append({
+                'direction': direction,
+                'send_time_ms': times[sender],
+                'recv_time_ms': times[receiver],
+                'delay_ms': delay,
+                'client_line': lines['client'],
+                'server_line': lines['server'],
+                'raw': payload.hex(' ')
+            })
+        self.matched += 1
+
+    def _request(self, frame: Frame) -> None:
+        time_ms, source, _, direction, payload = frame
+        key = request_key(direction, payload)
+        if key is None:
+            return
+        name, fields, is_confirmation = key
+        # 确认与请求方向相反，配对键中记录请求方向
+        request_direction = direction if not is_confirmation else ('TX' if direction == 'RX' else 'RX')
+        pending_key = (source, request_direction, name, fields)
+        if not is_confirmation:
+            waiting = self._requests.setdefault(pending_key, deque())
+            if len(waiting) >= _MAX_PENDING_REQUESTS:
+                waiting.popleft()
+                self.unanswered[source] += 1
+            waiting.append(time_ms)
+            return
+        waiting = self._requests.get(pending_key)
+        if not waiting:
+            return
+        histogram = self.latency[source].get(name)
+        if histogram is None:
+            histogram = self.latency[source][name] = LatencyHistogram()
+        histogram.add(time_ms - waiting.popleft())
+
+    def feed(self, frame: Frame) -> None:
+        """输入归并后的下一帧（按 time_ms 非递减）"""
+        self.frames[frame[1]] += 1
+        self._expire(frame[0])
+        self._match(frame)
+        self._request(frame)
+
+    def finish(self) -> None:
+        """输入结束：剩余待匹配的帧和未确认的请求计为未匹配/未确认"""
+        for item in self._order:
+            if not item[4]:
+                self.unmatched[item[1]] += 1
+        self._order.clear()
+        self._pending.clear()
+        for (source, _, _, _), waiting in self._requests.items():
+            self.unanswered[source] += len(waiting)
+        self._requests.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'frames': dict(self.frames),
+            'matched': self.matched,
+            'unmatched': dict(self.unmatched),
+            'window_ms': self.window_ms,
+            'delay': {direction: histogram.summary() for direction, histogram in self.delay.items()},
+            'latency': {source: {name: histogram.summary()
+                                 for name, histogram in sorted(histograms.items())}
+                        for source, histograms in self.latency.items()},
+            'unanswered': dict(self.unanswered),
+            'pairs_offset': self.pair_offset,
+            'pairs': self.pairs
+        }
+
+
+def correlate_logs(client_path: str, server_path: str,
+                   window_ms: int = config.CORRELATION_WINDOW_MS,
+                   pair_offset: int = 0, pair_limit: int = 100) -> Dict[str, Any]:
+    """流式归并两端日志并返回关联统计，pairs 为第 [pair_offset, pair_offset+pair_limit) 个匹配帧"""
+    correlator = LogCorrelator(window_ms, pair_offset, pair_limit)
+    merged = heapq.merge(iter_log_frames(client_path, 'client'),
+                         iter_log_frames(server_path, 'server'),
+                         key=lambda frame: frame[0])
+    for frame in merged:
+        correlator.feed(frame)
+    correlator.finish()
+    return correlator.summary()
+
+
+def find_peer_log(filename: str, peer_dir: str) -> Optional[str]:
+    """按文件名中的毫秒时间戳找另一端时间最接近的日志文件名"""
+    match = _LOG_NAME_TIME_RE.search(os.path.basename(filename))
+    if not match or not os.path.isdir(peer_dir):
+        return None
+    target = int(match.group(1))
+    best = None
+    for entry in os.scandir(peer_dir):
+        peer = _LOG_NAME_TIME_RE.search(entry.name)
+        if not entry.is_file() or not is_log_file(entry.name) or not peer:
+            continue
+        distance = abs(int(peer.group(1)) - target)
+        if best is None or distance < best[0]:
+            best = (distance, entry.name)
+    return best[1] if best else None
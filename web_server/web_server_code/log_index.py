@@ -0,0 +1,352 @@
+"""日志文件行偏移索引
+
+每个 .log 文件对应一个 sidecar 索引文件（<文件名>.idx），记录每 N 行的字节偏移
+以及每个块内 time_ms 的最小/最大值。二进制日志的每条记录视为一行。索引只建立一次，文件追加后增量扩展；
+文件被截断、轮转或改写时自动重建。
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from itertools import count as _counter, islice
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import config
+from binary_log import BinaryLogReader, is_binary_log
+from event_log import log_event
+from log_source import is_compressed, open_log
+from metrics import BYTES_READ, SIDECAR_LOOKUPS, STAGE_SECONDS
+
+INDEX_VERSION = 1
+HEAD_CHECK_BYTES = 64  # 用于识别文件轮转的文件头字节数
+
+_generations = _counter(1)
+
+TIME_MS_PATTERN = re.compile(rb'"time_ms"\s*:\s*(\d+)')
+
+
+class LogIndex:
+    """单个日志文件的行偏移索引
+
+    offsets[k] 为第 k*block_lines 行（从0计）的起始字节偏移，
+    min_ms[k]/max_ms[k] 为该块内 time_ms 的范围（块内无时间戳时为 -1）。
+    只索引以换行符结尾的完整行，indexed_size 之后未写完的行留待下次扩展。
+    """
+
+    def __init__(self, filepath: str, block_lines: int = config.INDEX_BLOCK_LINES):
+        self.filepath = filepath
+        self.index_path = filepath + config.INDEX_SUFFIX
+        self.block_lines = block_lines
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        """清空索引内容（代数随之更新，依赖旧索引的缓存随之失效）"""
+        self.generation = next(_generations)
+        self.offsets = array('q')
+        self.min_ms = array('q')
+        self.max_ms = array('q')
+        self.line_count = 0
+        self.indexed_size = 0
+        self.file_size = 0
+        self.mtime_ns = 0
+        self.inode = 0
+        self.head = ''
+
+    # ---------- 持久化 ----------
+
+    def load(self) -> bool:
+        """从 sidecar 文件加载索引，格式不匹配时返回 False"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if data.get('version') != INDEX_VERSION or data.get('block_lines') != self.block_lines:
+            return False
+
+        try:
+            self.offsets = array('q', data['offsets'])
+            self.min_ms = array('q', data['min_ms'])
+            self.max_ms = array('q', data['max_ms'])
+            self.line_count = data['line_count']
+            self.indexed_size = data['indexed_size']
+            self.file_size = data['file_size']
+            self.mtime_ns = data['mtime_ns']
+            self.inode = data['inode']
+            self.head = data['head']
+        except (KeyError, TypeError, OverflowError):
+            self._reset()
+            return False
+        return True
+
+    def save(self) -> None:
+        """写入 sidecar 文件（先写临时文件再替换），目录不可写时仅保留内存索引"""
+        data = {
+            'version': INDEX_VERSION,
+            'block_lines': self.block_lines,
+            'line_count': self.line_count,
+            'indexed_size': self.indexed_size,
+            'file_size': self.file_size,
+            'mtime_ns': self.mtime_ns,
+            'inode': self.inode,
+            'head': self.head,
+            'offsets': self.offsets.tolist(),
+            'min_ms': self.min_ms.tolist(),
+            'max_ms': self.max_ms.tolist(),
+        }
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            log_event('sidecar_write_failed', logging.ERROR, kind='index', path=self.index_path, error=str(e))
+
+    # ---------- 构建与校验 ----------
+
+    def _read_head(self, f) -> str:
+        f.seek(0)
+        return f.read(HEAD_CHECK_BYTES).hex()
+
+    def refresh(self) -> 'LogIndex':
+        """按文件大小/mtime/inode 校验索引，追加则增量扩展，截断或轮转则重建"""
+        with self.lock:
+            try:
+                stats = os.stat(self.filepath)
+            except OSError:
+                self._reset()
+                return self
+
+            if (stats.st_size == self.file_size and stats.st_mtime_ns == self.mtime_ns
+                    and stats.st_ino == self.inode):
+                return self
+
+            with open_log(self.filepath) as f:
+                head = self._read_head(f)
+                rotated = (stats.st_ino != self.inode
+                           or stats.st_size < self.indexed_size
+                           or stats.st_size == self.file_size  # 大小不变但 mtime 变化：文件被改写
+                           or not head.startswith(self.head)
+                           or is_compressed(self.filepath))  # 压缩归档有变化时总是重建
+                if rotated:
+                    self._reset()
+                start, started = self.indexed_size, time.perf_counter()
+                if is_binary_log(self.filepath):
+                    self._extend_records()
+                else:
+                    self._extend(f)
+                STAGE_SECONDS.observe(time.perf_counter() - started, 'index')
+                BYTES_READ.inc('index', amount=self.indexed_size - start)
+                self.head = head
+                self.file_size = stats.st_size
+                self.mtime_ns = stats.st_mtime_ns
+                self.inode = stats.st_ino
+
+            self.save()
+            return self
+
+    def _extend(self, f) -> None:
+        """从 indexed_size 处继续索引新增的完整行"""
+        f.seek(self.indexed_size)
+        offset = self.indexed_size
+
+        while True:
+            in_block = self.line_count % self.block_lines
+            lines = list(islice(f, self.block_lines - in_block))
+            if not lines:
+                break
+
+            partial = not lines[-1].endswith(b'\n')
+            if partial:
+                lines.pop()
+            if not lines:
+                break
+
+            if in_block == 0:
+                self.offsets.append(offset)
+                self.min_ms.append(-1)
+                self.max_ms.append(-1)
+
+            chunk = b''.join(lines)
+            times = [int(t) for t in TIME_MS_PATTERN.findall(chunk)]
+            if times:
+                low, high = min(times), max(times)
+                if self.min_ms[-1] < 0 or low < self.min_ms[-1]:
+                    self.min_ms[-1] = low
+                if high > self.max_ms[-1]:
+                    self.max_ms[-1] = high
+
+            offset += len(chunk)
+            self.line_count += len(lines)
+            if partial:
+                break
+
+        self.indexed_size = offset
+
+    def _extend_records(self) -> None:
+        """二进制日志：从 indexed_size 处继续索引新增的完整记录（只读记录头）"""
+        with BinaryLogReader(self.filepath) as reader:
+            records = reader.records(self.indexed_size)
+            while True:
+                in_block = self.line_count % self.block_lines
+                headers = [record[:4] for record in islice(records, self.block_lines - in_block)]
+                if not headers:
+                    break
+
+                if in_block == 0:
+                    self.offsets.append(headers[0][0])
+                    self.min_ms.append(-1)
+                    self.max_ms.append(-1)
+
+                times = [header[3] for header in headers]
+                low, high = min(times), max(times)
+                if self.min_ms[-1] < 0 or low < self.min_ms[-1]:
+                    self.min_ms[-1] = low
+                if high > self.max_ms[-1]:
+                    self.max_ms[-1] = high
+
+                self.line_count += len(headers)
+                self.indexed_size = headers[-1][0] + headers[-1][1]
+
+    # ---------- 查询 ----------
+
+    @property
+    def block_count(self) -> int:
+        return len(self.offsets)
+
+    def block_range(self, block: int) -> Tuple[int, int]:
+        """块的字节范围 [start, end)"""
+        start = self.offsets[block]
+        end = self.offsets[block + 1] if block + 1 < len(self.offsets) else self.indexed_size
+        return start, end
+
+    def block_of_offset(self, offset: int) -> int:
+        """字节偏移所在的块号"""
+        return max(bisect_right(self.offsets, offset) - 1, 0)
+
+    def read_lines(self, start: int, count: int) -> List[Tuple[int, bytes]]:
+        """读取第 start 行（从0计）起的 count 行完整行，返回 (行首偏移, 行内容) 列表"""
+        if count <= 0 or start >= self.line_count:
+            return []
+        start = max(start, 0)
+        count = min(count, self.line_count - start)
+
+        block, skip = divmod(start, self.block_lines)
+        offset = self.offsets[block]
+        if is_binary_log(self.filepath):
+            with BinaryLogReader(self.filepath) as reader:
+                records = islice(reader.records(offset, self.indexed_size), skip, skip + count)
+                return [(record[0], reader.record(record[0], record[1])) for record in records]
+        result = []
+        with open_log(self.filepath) as f:
+            f.seek(offset)
+            for line in islice(f, skip):
+                offset += len(line)
+            for line in islice(f, count):
+                result.append((offset, line))
+                offset += len(line)
+        return result
+
+    def iter_blocks(self, blocks: Optional[List[int]] = None) -> Iterator[Tuple[int, bytes]]:
+        """依次读取指定块（默认全部块）的原始字节"""
+        if blocks is None:
+            blocks = range(len(self.offsets))
+        with open_log(self.filepath) as f:
+            for block in blocks:
+                start, end = self.block_range(block)
+                f.seek(start)
+                yield block, f.read(end - start)
+
+    def blocks_in_time_range(self, from_ms: Optional[int] = None,
+                             to_ms: Optional[int] = None) -> List[int]:
+        """time_ms 范围与 [from_ms, to_ms] 有交集的块号（无时间戳的块总是包含在内）"""
+        result = []
+        for block in range(len(self.offsets)):
+            low, high = self.min_ms[block], self.max_ms[block]
+            if low < 0:
+                result.append(block)
+            elif (from_ms is None or high >= from_ms) and (to_ms is None or low <= to_ms):
+                result.append(block)
+        return result
+
+
+_indexes: Dict[str, LogIndex] = {}
+_indexes_lock = threading.Lock()
+_building: Set[str] = set()  # 正在后台构建索引的文件
+
+
+def get_log_index(filepath: str) -> LogIndex:
+    """获取（必要时加载或构建）日志文件的最新索引"""
+    filepath = os.path.abspath(filepath)
+    with _indexes_lock:
+        index = _indexes.get(filepath)
+        if index is None:
+            index = LogIndex(filepath)
+            SIDECAR_LOOKUPS.inc('index', 'sidecar' if index.load() else 'build')
+            _indexes[filepath] = index
+        else:
+            SIDECAR_LOOKUPS.inc('index', 'memory')
+    return index.refresh()
+
+
+def peek_log_index(filepath: str) -> Optional[LogIndex]:
+    """仅当索引已在内存中或已有 sidecar 文件时返回（增量刷新后的）索引，否则不触发全量构建
+
+    索引正在后台构建时也返回 None，不等待构建完成。
+    """
+    filepath = os.path.abspath(filepath)
+    with _indexes_lock:
+        if filepath in _building:
+            return None
+        index = _indexes.get(filepath)
+    if index is None and not os.path.exists(filepath + config.INDEX_SUFFIX):
+        return None
+    return get_log_index(filepath)
+
+
+def index_ready(filepath: str) -> bool:
+    """peek_log_index 是否会返回索引（不加载、不刷新），用于计算依赖索引的响应的校验值"""
+    filepath = os.path.abspath(filepath)
+    with _indexes_lock:
+        if filepath in _building:
+            return False
+        if filepath in _indexes:
+            return True
+    return os.path.exists(filepath + config.INDEX_SUFFIX)
+
+
+def build_log_index_async(filepath: str) -> None:
+    """在后台线程中构建（或增量刷新）索引，同一文件同时只有一个构建线程"""
+    filepath = os.path.abspath(filepath)
+    with _indexes_lock:
+        if filepath in _building:
+            return
+        _building.add(filepath)
+
+    def build() -> None:
+        try:
+            get_log_index(filepath)
+        except Exception as e:  # 后台线程中的异常只记录
+            log_event('index_build_failed', logging.ERROR, path=filepath, error=str(e))
+        finally:
+            with _indexes_lock:
+                _building.discard(filepath)
+
+    threading.Thread(target=build, name=f'index:{os.path.basename(filepath)}', daemon=True).start()
+
+
+def cached_log_index(filepath: str) -> Optional[LogIndex]:
+    """内存中或 sidecar 文件里已有的索引（不刷新、不构建，可能落后于文件），没有时返回 None"""
+    filepath = os.path.abspath(filepath)
+    with _indexes_lock:
+        index = _indexes.get(filepath)
+    if index is not None:
+        return index
+    index = LogIndex(filepath)
+    return index if index.load() else None
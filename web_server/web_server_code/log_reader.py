@@ -0,0 +1,189 @@
+"""按需读取日志行
+
+尾部读取从文件末尾反向分块查找换行，只访问请求所需的字节；
+按索引块读取的数据由 split_block 切分为行；TailReader 负责实时跟随文件增长。
+返回的行均为以换行结尾的完整行，末尾未写完的行不返回。
+"""
+import os
+import time
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+import config
+from binary_log import BinaryLogReader, is_binary_log
+from log_source import log_size, open_log
+from log_index import LogIndex
+from metrics import BYTES_READ, STAGE_SECONDS
+
+# line_no 为文件中的行号（从1计，未知时为 None），offset 为行首字节偏移
+LogLine = namedtuple('LogLine', ['line_no', 'offset', 'data'])
+
+TAIL_CHUNK_SIZE = 64 * 1024
+
+
+def read_tail_lines(filepath: str, count: int,
+                    index: Optional[LogIndex] = None) -> List[LogLine]:
+    """从文件末尾反向分块读取最后 count 行完整行
+
+    传入的索引如果恰好覆盖到同一位置，则用它补全行号。
+    """
+    if count <= 0:
+        return []
+
+    start = time.perf_counter()
+    with open_log(filepath) as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        pos = end
+        chunks = []
+        newlines = 0
+
+        # 向前读取直到拿到 count 个完整行（多读一个换行用于确定首行起点）
+        while pos > 0 and newlines <= count:
+            step = min(TAIL_CHUNK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            newlines += chunk.count(b'\n')
+            chunks.append(chunk)
+
+    buf = b''.join(reversed(chunks))
+    STAGE_SECONDS.observe(time.perf_counter() - start, 'read')
+    BYTES_READ.inc('tail', amount=len(buf))
+
+    # 丢弃末尾未写完的行
+    last_newline = buf.rfind(b'\n')
+    if last_newline < 0:
+        return []
+    complete_end = pos + last_newline + 1
+    buf = buf[:last_newline + 1]
+
+    lines = buf.split(b'\n')[:-1]
+    if pos > 0 or len(lines) > count:
+        # pos > 0 时首段可能是被截断的行
+        lines = lines[-count:]
+
+    first_line_no = None
+    if index is not None and index.indexed_size == complete_end:
+        first_line_no = index.line_count - len(lines) + 1
+
+    result = []
+    offset = complete_end
+    for i in range(len(lines) - 1, -1, -1):
+        offset -= len(lines[i]) + 1
+        line_no = first_line_no + i if first_line_no is not None else None
+        result.append(LogLine(line_no, offset, lines[i] + b'\n'))
+    result.reverse()
+    return result
+
+
+def last_line_end(f, end: int) -> int:
+    """end 之前最后一个换行之后的偏移，即完整行的结尾（没有完整行时为0）"""
+    pos = end
+    while pos > 0:
+        step = min(4096, pos)
+        f.seek(pos - step)
+        chunk = f.read(step)
+        newline = chunk.rfind(b'\n')
+        if newline >= 0:
+            return pos - step + newline + 1
+        pos -= step
+    return 0
+
+
+def split_block(data: bytes, offset: int, line_no: Optional[int]) -> List[LogLine]:
+    """把一段以换行结尾的字节切分为行（line_no 为 None 时不编号）"""
+    lines = []
+    pos = 0
+    size = len(data)
+    while pos < size:
+        end = data.find(b'\n', pos)
+        if end < 0:
+            break
+        lines.append(LogLine(line_no, offset + pos, data[pos:end + 1]))
+        pos = end + 1
+        if line_no is not None:
+            line_no += 1
+    return lines
+
+
+# lines: 本次读到的完整行；position: 下次读取的起点（最后一个换行之后）；
+# reset: 检测到截断/轮转并已从头读取；more: 达到单次上限，后面还有数据
+TailResult = namedtuple('TailResult', ['lines', 'position', 'file_size', 'inode', 'reset', 'more'])
+
+
+class TailReader:
+    """有状态的增量尾部读取器
+
+    每次从上次位置按块读取，只消费到最后一个换行，未写完的行留到下次；
+    单次读取量受 max_bytes 限制；根据 inode 和文件大小识别截断与轮转。
+    """
+
+    def __init__(self, filepath: str, position: int = 0, inode: Optional[int] = None,
+                 max_bytes: int = config.TAIL_MAX_BYTES,
+                 chunk_size: int = config.TAIL_CHUNK_BYTES):
+        self.filepath = filepath
+        self.position = position
+        self.inode = inode
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+
+    def read(self, end: Optional[int] = None) -> TailResult:
+        """读取新增的完整行，end 限定本次最多读到的文件偏移"""
+        try:
+            stats = os.stat(self.filepath)
+        except OSError:
+            return TailResult([], self.position, 0, self.inode, False, False)
+
+        size = log_size(self.filepath, stats)
+        reset = False
+        if (self.inode is not None and stats.st_ino != self.inode) or size < self.position:
+            self.position = 0
+            reset = True
+        self.inode = stats.st_ino
+
+        limit = size if end is None else min(end, size)
+        lines: List[LogLine] = []
+        more = False
+        start = self.position
+        read_start = time.perf_counter()
+        if limit > self.position and is_binary_log(self.filepath):
+            lines, more = self._read_records(limit)
+        elif limit > self.position:
+            with open_log(self.filepath) as f:
+                f.seek(self.position)
+                pending = b''
+                read_bytes = 0
+                while self.position + len(pending) < limit:
+                    chunk = f.read(min(self.chunk_size, limit - self.position - len(pending)))
+                    if not chunk:
+                        break
+                    read_bytes += len(chunk)
+                    pending += chunk
+                    last_newline = pending.rfind(b'\n')
+                    if last_newline >= 0:
+                        lines.extend(split_block(pending[:last_newline + 1], self.position, None))
+                        self.position += last_newline + 1
+                        pending = pending[last_newline + 1:]
+                    # 超出上限后停止（单行超长时至少读完这一行）
+                    if read_bytes >= self.max_bytes and lines:
+                        more = self.position < limit
+                        break
+        if self.position > start:
+            STAGE_SECONDS.observe(time.perf_counter() - read_start, 'read')
+            BYTES_READ.inc('incremental', amount=self.position - start)
+
+        return TailResult(lines, self.position, size, self.inode, reset, more)
+
+    def _read_records(self, limit: int) -> Tuple[List[LogLine], bool]:
+        """二进制日志：读取 [position, limit) 内的完整记录，返回 (行列表, 是否还有更多)"""
+        lines: List[LogLine] = []
+        read_bytes = 0
+        with BinaryLogReader(self.filepath) as reader:
+            for offset, length, _, _, _ in reader.records(self.position, limit):
+                if read_bytes >= self.max_bytes:
+                    return lines, True
+                lines.append(LogLine(None, offset, reader.record(offset, length)))
+                self.position = offset + length
+                read_bytes += length
+        return lines, False
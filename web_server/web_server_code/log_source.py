@@ -0,0 +1,334 @@
+"""日志文件读取（普通文件与压缩文件）
+
+.log 直接以二进制方式打开；.log.gz（gzip，支持多成员）和 .log.zst（zstd，需安装 zstandard）
+由 open_log 打开为只读、可随机定位的文件对象，读取、定位、按行迭代都以解压后的字节偏移计，
+因此行偏移索引、统计、分页和尾部读取等上层逻辑对压缩文件同样适用。
+
+随机访问依靠检查点：顺序解压时每隔 COMPRESSED_CHECKPOINT_BYTES 解压字节记录一个检查点
+(解压后偏移, 压缩流偏移, 解压器状态)。gzip 的解压器状态用 zlib 解压对象的 copy() 保存（约 40KB），
+可以落在流的任意位置；zstd 解压对象不能复制，检查点只落在帧边界，
+多帧文件（如 pzstd 的输出）可以跳到目标所在帧，单帧文件只能从头解压。
+定位时从目标之前最近的检查点恢复状态继续解压。检查点按 (路径, inode, 大小, mtime) 缓存在内存中，
+第一次完整读取（建立行偏移索引）之后即可随机访问。全部文件的检查点总内存超出
+COMPRESSED_CHECKPOINT_MAX_BYTES 时淘汰最久未用文件的检查点；单个文件就超出预算时
+加大它的检查点间隔、丢弃一半检查点（定位后平均多解压一些数据）。
+
+压缩文件视为不再写入的归档：文件有任何变化都从头重建索引和统计，也不使用多进程解析
+（子进程没有检查点，每个任务都要从头解压）。
+"""
+import io
+import os
+import threading
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import config
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖，未安装时不支持 .zst
+    zstandard = None
+
+# 压缩后缀 -> 格式名
+COMPRESSED_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+
+_INPUT_CHUNK = 32 * 1024  # 压缩率常在 10 倍以上，输入块过大会使定位后多解压数 MB
+_READ_BUFFER = 256 * 1024
+_MAX_CACHED_FILES = 64
+_STATE_BYTES = 44 * 1024  # 每个 zlib 解压器状态的估算内存
+
+
+def compression_of(filepath: str) -> Optional[str]:
+    """压缩格式（gzip/zstd），普通文件返回 None"""
+    return COMPRESSED_SUFFIXES.get(os.path.splitext(filepath)[1])
+
+
+def is_compressed(filepath: str) -> bool:
+    return compression_of(filepath) is not None
+
+
+def is_log_file(filename: str) -> bool:
+    """是否为可查看的日志文件（zstd 文件需要安装 zstandard）"""
+    if not filename.endswith(tuple(config.ALLOWED_EXTENSIONS)):
+        return False
+    return compression_of(filename) != 'zstd' or zstandard is not None
+
+
+# ---------- 解压格式 ----------
+
+class _GzipCodec:
+    """gzip：解压器状态可复制，检查点可以落在流中任意位置"""
+
+    name = 'gzip'
+    copyable = True
+
+    @staticmethod
+    def new():
+        return zlib.decompressobj(wbits=zlib.MAX_WBITS | 32)
+
+    @staticmethod
+    def trailing_garbage(data: bytes) -> bool:
+        # 部分工具会在最后一个成员后补零
+        return not data.strip(b'\0')
+
+    error = zlib.error
+
+
+class _ZstdCodec:
+    """zstd：解压器不能复制，检查点只能落在帧边界"""
+
+    name = 'zstd'
+    copyable = False
+
+    @staticmethod
+    def new():
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    @staticmethod
+    def trailing_garbage(data: bytes) -> bool:
+        return not data.strip(b'\0')
+
+    error = zstandard.ZstdError if zstandard is not None else Exception
+
+
+_CODECS = {'gzip': _GzipCodec, 'zstd': _ZstdCodec}
+
+
+class Checkpoints:
+    """单个压缩文件的检查点索引（多个读取器共享）"""
+
+    def __init__(self, spacing: int = config.COMPRESSED_CHECKPOINT_BYTES):
+        self.spacing = spacing
+        self.lock = threading.Lock()
+        # (解压后偏移, 压缩流偏移, 解压器状态)；状态为 None 表示在成员/帧边界，从新的解压器开始
+        self.points: List[Tuple[int, int, Any]] = [(0, 0, None)]
+        self.outs: List[int] = [0]
+        self.size: Optional[int] = None  # 解压后总大小，读到末尾后已知
+        self.nbytes = 0  # 估算的内存占用（解压器状态）
+
+    def add(self, out_pos: int, in_pos: int, state: Any, boundary: bool = False) -> None:
+        """记录检查点（只追加在已知范围之后，间隔小于 spacing 的普通检查点被忽略）"""
+        with self.lock:
+            last = self.outs[-1]
+            if out_pos <= last or (not boundary and out_pos - last < self.spacing):
+                return
+            self.points.append((out_pos, in_pos, state))
+            self.outs.append(out_pos)
+            if state is not None:
+                self.nbytes += _STATE_BYTES
+        if state is not None:
+            _trim_checkpoints(self)
+
+    def find(self, target: int) -> Tuple[int, int, Any]:
+        """目标偏移之前最近的检查点"""
+        with self.lock:
+            return self.points[bisect_right(self.outs, target) - 1]
+
+    def thin(self) -> None:
+        """间隔加倍，丢弃一半带解压器状态的检查点（成员/帧边界的检查点不占内存，全部保留）"""
+        with self.lock:
+            self.spacing *= 2
+            kept = []
+            stateful = 0
+            for point in self.points:
+                if point[2] is not None:
+                    stateful += 1
+                    if stateful % 2:
+                        continue
+                kept.append(point)
+            self.points = kept
+            self.outs = [point[0] for point in kept]
+            self.nbytes = sum(_STATE_BYTES for point in kept if point[2] is not None)
+
+
+class CompressedLogReader(io.RawIOBase):
+    """压缩日志的只读随机访问（配合 io.BufferedReader 使用）"""
+
+    def __init__(self, filepath: str, codec, checkpoints: Checkpoints):
+        super().__init__()
+        self._raw = open(filepath, 'rb')
+        self._codec = codec
+        self._checkpoints = checkpoints
+        self._restore(checkpoints.points[0])
+
+    def _restore(self, point: Tuple[int, int, Any]) -> None:
+        out_pos, in_pos, state = point
+        self._decoder = self._codec.new() if state is None else state.copy()
+        self._raw.seek(in_pos)
+        self._in_pos = in_pos
+        self._pos = out_pos          # 下一个返回字节的解压后偏移
+        self._buffer = b''           # 已解压未返回的数据，从 _pos 开始
+        self._buffer_pos = 0
+        self._eof = False
+
+    # ---------- 解压 ----------
+
+    def _fill(self) -> None:
+        """解压下一段输入，追加到缓冲区"""
+        chunk = self._raw.read(_INPUT_CHUNK)
+        out_pos = self._pos + len(self._buffer) - self._buffer_pos
+        if not chunk:
+            self._eof = True
+            self._checkpoints.size = out_pos
+            return
+
+        outputs = []
+        data = chunk
+        chunk_start = self._in_pos
+        self._in_pos += len(chunk)
+        while data:
+            try:
+                output = self._decoder.decompress(data)
+            except self._codec.error:
+                if self._codec.trailing_garbage(data):
+                    self._raw.seek(0, os.SEEK_END)
+                    break
+                raise
+            outputs.append(output)
+            out_pos += len(output)
+            if not self._decoder.eof:
+                break
+            # 成员/帧结束：剩余输入属于下一个成员，在边界处记录检查点
+            data = self._decoder.unused_data
+            self._decoder = self._codec.new()
+            self._checkpoints.add(out_pos, chunk_start + len(chunk) - len(data), None, boundary=True)
+
+        if self._codec.copyable and out_pos - self._checkpoints.outs[-1] >= self._checkpoints.spacing:
+            self._checkpoints.add(out_pos, self._in_pos, self._decoder.copy())
+        # 只在缓冲区读完后才调用
+        self._buffer = b''.join(outputs)
+        self._buffer_pos = 0
+
+    def _skip(self, count: Optional[int]) -> None:
+        """向前丢弃 count 个解压后字节（None 表示丢弃到末尾）"""
+        while count is None or count > 0:
+            available = len(self._buffer) - self._buffer_pos
+            if not available:
+                if self._eof:
+                    return
+                self._fill()
+                continue
+            step = available if count is None else min(available, count)
+            self._buffer_pos += step
+            self._pos += step
+            if count is not None:
+                count -= step
+
+    # ---------- RawIOBase 接口 ----------
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._buffer_pos >= len(self._buffer) and not self._eof:
+            self._fill()
+        available = len(self._buffer) - self._buffer_pos
+        count = min(len(buffer), available)
+        buffer[:count] = self._buffer[self._buffer_pos:self._buffer_pos + count]
+        self._buffer_pos += count
+        self._pos += count
+        return count
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size()
+        offset = max(offset, 0)
+        if offset == self._pos:
+            return self._pos
+
+        point = self._checkpoints.find(offset)
+        # 目标在当前位置之后且没有更近的检查点时直接向前解压
+        if offset < self._pos or point[0] > self._pos:
+            self._restore(point)
+        self._skip(offset - self._pos)
+        return self._pos
+
+    def size(self) -> int:
+        """解压后总大小（未知时解压到末尾）"""
+        if self._checkpoints.size is None:
+            position = self._pos
+            self._skip(None)
+            self.seek(position)
+        return self._checkpoints.size
+
+    def close(self) -> None:
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+
+_checkpoints: 'OrderedDict[Tuple[str, int, int, int], Checkpoints]' = OrderedDict()
+_checkpoints_lock = threading.Lock()
+
+
+def _get_checkpoints(filepath: str) -> Checkpoints:
+    stats = os.stat(filepath)
+    key = (os.path.abspath(filepath), stats.st_ino, stats.st_size, stats.st_mtime_ns)
+    with _checkpoints_lock:
+        checkpoints = _checkpoints.get(key)
+        if checkpoints is None:
+            # 同一路径的旧版本检查点已失效
+            for old in [item for item in _checkpoints if item[0] == key[0]]:
+                del _checkpoints[old]
+            checkpoints = _checkpoints[key] = Checkpoints()
+            while len(_checkpoints) > _MAX_CACHED_FILES:
+                _checkpoints.popitem(last=False)
+        _checkpoints.move_to_end(key)
+        return checkpoints
+
+
+def _trim_checkpoints(current: Checkpoints) -> None:
+    """总内存超出预算时淘汰最久未用文件的检查点，current 自身超出预算时减少它的检查点"""
+    budget = config.COMPRESSED_CHECKPOINT_MAX_BYTES
+    with _checkpoints_lock:
+        total = sum(item.nbytes for item in _checkpoints.values())
+        for key in list(_checkpoints):
+            if total <= budget:
+                break
+            item = _checkpoints[key]
+            if item is not current:
+                total -= item.nbytes
+                del _checkpoints[key]  # 正在使用的读取器仍持有引用，不受影响
+    while current.nbytes > budget:
+        current.thin()
+
+
+def open_log(filepath: str):
+    """以二进制只读方式打开日志文件，压缩文件透明解压"""
+    compression = compression_of(filepath)
+    if compression is None:
+        return open(filepath, 'rb')
+    if compression == 'zstd' and zstandard is None:
+        raise OSError(f'读取 zstd 压缩日志需要安装 zstandard: {filepath}')
+    reader = CompressedLogReader(filepath, _CODECS[compression], _get_checkpoints(filepath))
+    return io.BufferedReader(reader, buffer_size=_READ_BUFFER)
+
+
+def log_size(filepath: str, stats: Optional[os.stat_result] = None) -> int:
+    """日志内容的字节数（压缩文件为解压后大小，首次调用需要完整解压一遍）"""
+    if not is_compressed(filepath):
+        return (stats or os.stat(filepath)).st_size
+    with open_log(filepath) as f:
+        return f.seek(0, os.SEEK_END)
+
+
+def checkpoint_stats() -> dict:
+    """压缩文件检查点缓存的占用"""
+    with _checkpoints_lock:
+        items = list(_checkpoints.items())
+    return {
+        'files': len(items),
+        'checkpoints': sum(len(item.points) for _, item in items),
+        'bytes': sum(item.nbytes for _, item in items),
+        'max_bytes': config.COMPRESSED_CHECKPOINT_MAX_BYTES
+    }
@@ -0,0 +1,366 @@
+"""日志文件增量统计
+
+每个日志文件维护一份累计统计（方向、帧类型、类型标识、传输原因、每秒帧数），
+持久化为 sidecar 文件（<文件名>.stats）。每秒帧数随采集时长增长，另存为只追加的
+<文件名>.rate（(秒, 帧数) 的 int64 对），每次只追加上次保存之后有变化的秒，
+.stats 中记录其有效长度，保存的开销与新增数据量成正比。
+每次查询只折叠上次之后新增的完整行（二进制日志为记录），文件被截断、轮转或改写时从头重新统计。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from typing import Any, Dict, Optional
+
+import config
+from binary_log import BinaryLogReader, direction_name, is_binary_log
+from event_log import log_event
+from iec104_parser import (CAUSE_OF_TRANSMISSION, TYPE_IDENTIFICATION, FastIEC104FrameParser,
+                           classify_direction, classify_frame, extract_log_fields)
+from log_index import HEAD_CHECK_BYTES
+from log_reader import last_line_end
+from log_source import is_compressed, open_log
+from metrics import BYTES_READ, SIDECAR_LOOKUPS, STAGE_SECONDS
+from parallel_parse import map_ranges, parallel_enabled, split_ranges
+
+STATS_VERSION = 3
+
+# .rate 中重复的秒（同一秒分多次追加）超过该数量且多于不同秒数时整体重写
+_RATE_COMPACT_PAIRS = 4096
+
+# 帧分类只需要前12个字节（"xx " 每字节3个字符）
+_HEADER_HEX_CHARS = 36
+
+
+class LogStats:
+    """单个日志文件的累计统计"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.stats_path = filepath + config.STATS_SUFFIX
+        self.rate_path = filepath + config.STATS_RATE_SUFFIX
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.offset = 0
+        self.file_size = 0
+        self.mtime_ns = 0
+        self.inode = 0
+        self.head = ''
+        self.total = 0
+        self.skipped = 0
+        self.directions = {'TX': 0, 'RX': 0, 'UNKNOWN': 0}
+        self.frame_types: Dict[str, int] = {}
+        self.type_ids: Dict[int, int] = {}
+        self.causes: Dict[int, int] = {}
+        self.seconds: Dict[int, int] = {}
+        self.new_seconds: Dict[int, int] = {}  # 本次折叠的每秒帧数，折叠结束后并入 seconds
+        self.unsaved_seconds: Dict[int, int] = {}  # 尚未追加到 .rate 的增量
+        self.rate_bytes = 0  # .rate 的有效长度
+        self.rate_pairs = 0
+
+    # ---------- 持久化 ----------
+
+    def load(self) -> bool:
+        """从 sidecar 文件恢复统计状态"""
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != STATS_VERSION:
+                return False
+            self.offset = data['offset']
+            self.file_size = data['file_size']
+            self.mtime_ns = data['mtime_ns']
+            self.inode = data['inode']
+            self.head = data['head']
+            self.total = data['total']
+            self.skipped = data['skipped']
+            self.directions = data['directions']
+            self.frame_types = data['frame_types']
+            self.type_ids = {int(k): v for k, v in data['type_ids'].items()}
+            self.causes = {int(k): v for k, v in data['causes'].items()}
+            self._load_rate(data['rate_bytes'])
+        except (OSError, ValueError, KeyError, AttributeError):
+            self._reset()
+            return False
+        return True
+
+    def _load_rate(self, rate_bytes: int) -> None:
+        """读取 .rate 的前 rate_bytes 字节（之后的内容是未完成的保存留下的）"""
+        pairs = array('q')
+        if rate_bytes:
+            with open(self.rate_path, 'rb') as f:
+                data = f.read(rate_bytes)
+            if len(data) != rate_bytes:
+                raise ValueError('每秒帧数文件不完整')
+            pairs.frombytes(data)
+        seconds: Dict[int, int] = {}
+        for i in range(0, len(pairs) - 1, 2):
+            seconds[pairs[i]] = seconds.get(pairs[i], 0) + pairs[i + 1]
+        self.seconds = seconds
+        self.rate_bytes = rate_bytes
+        self.rate_pairs = len(pairs) // 2
+
+    def save(self) -> None:
+        """写入 sidecar 文件（先追加 .rate，再替换 .stats），目录不可写时仅保留内存状态"""
+        try:
+            self._save_rate()
+            data = {
+                'version': STATS_VERSION,
+                'offset': self.offset,
+                'file_size': self.file_size,
+                'mtime_ns': self.mtime_ns,
+                'inode': self.inode,
+                'head': self.head,
+                'total': self.total,
+                'skipped': self.skipped,
+                'directions': self.directions,
+                'frame_types': self.frame_types,
+                'type_ids': self.type_ids,
+                'causes': self.causes,
+                'rate_bytes': self.rate_bytes,
+            }
+            tmp_path = self.stats_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.stats_path)
+        except OSError as e:
+            log_event('sidecar_write_failed', logging.ERROR, kind='stats', path=self.stats_path, error=str(e))
+
+    def _save_rate(self) -> None:
+        """把尚未保存的每秒增量追加到 .rate，重复的秒过多时整体重写"""
+        if self.rate_pairs + len(self.unsaved_seconds) > max(2 * len(self.seconds), _RATE_COMPACT_PAIRS):
+            pairs = array('q')
+            for second, count in self.seconds.items():
+                pairs.extend((second, count))
+            tmp_path = self.rate_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pairs.tofile(f)
+            os.replace(tmp_path, self.rate_path)
+            self.rate_bytes = len(pairs) * pairs.itemsize
+            self.rate_pairs = len(self.seconds)
+        elif self.unsaved_seconds or not self.rate_bytes:
+            pairs = array('q')
+            for second, count in self.unsaved_seconds.items():
+                pairs.extend((second, count))
+            with open(self.rate_path, 'a+b') as f:
+                f.truncate(self.rate_bytes)  # 丢弃未完成的保存追加的内容
+                pairs.tofile(f)
+            self.rate_bytes += len(pairs) * pairs.itemsize
+            self.rate_pairs += len(self.unsaved_seconds)
+        self.unsaved_seconds = {}
+
+    # ---------- 增量折叠 ----------
+
+    def refresh(self) -> 'LogStats':
+        """折叠新增的完整行，文件截断或轮转时重新统计"""
+        with self.lock:
+            try:
+                stats = os.stat(self.filepath)
+            except OSError:
+                self._reset()
+                return self
+
+            if (stats.st_size == self.file_size and stats.st_mtime_ns == self.mtime_ns
+                    and stats.st_ino == self.inode):
+                return self
+
+            with open_log(self.filepath) as f:
+                head = f.read(HEAD_CHECK_BYTES).hex()
+                if (stats.st_ino != self.inode or stats.st_size < self.offset
+                        or stats.st_size == self.file_size or not head.startswith(self.head)
+                        or is_compressed(self.filepath)):
+                    self._reset()
+                start, started = self.offset, time.perf_counter()
+                if is_binary_log(self.filepath):
+                    self._fold_records()
+                elif parallel_enabled(stats.st_size - self.offset, self.filepath):
+                    self._fold_parallel(last_line_end(f, stats.st_size))
+                else:
+                    f.seek(self.offset)
+                    self._fold(f)
+                self._merge_seconds()
+                STAGE_SECONDS.observe(time.perf_counter() - started, 'stats')
+                BYTES_READ.inc('stats', amount=self.offset - start)
+                self.head = head
+                self.file_size = stats.st_size
+                self.mtime_ns = stats.st_mtime_ns
+                self.inode = stats.st_ino
+
+            self.save()
+            return self
+
+    def _merge_seconds(self) -> None:
+        """本次折叠的每秒帧数并入累计值，并记为待保存的增量"""
+        for second, count in self.new_seconds.items():
+            self.seconds[second] = self.seconds.get(second, 0) + count
+            self.unsaved_seconds[second] = self.unsaved_seconds.get(second, 0) + count
+        self.new_seconds = {}
+
+    def _fold(self, f, end: Optional[int] = None) -> None:
+        """从当前位置读到最后一个换行（或 end 处），逐行累计"""
+        chunk_size = config.STATS_CHUNK_BYTES
+        remainder = b''
+        while end is None or self.offset + len(remainder) < end:
+            size = chunk_size if end is None else min(chunk_size, end - self.offset - len(remainder))
+            chunk = f.read(size)
+            if not chunk:
+                break
+            data = remainder + chunk
+            last_newline = data.rfind(b'\n')
+            if last_newline < 0:
+                remainder = data
+                continue
+            for line in data[:last_newline].split(b'\n'):
+                self._fold_line(line)
+            self.offset += last_newline + 1
+            remainder = data[last_newline + 1:]
+
+    def _fold_records(self) -> None:
+        """二进制日志：在内存映射上累计 offset 之后的完整记录（只看记录头和帧头，无需并行）"""
+        with BinaryLogReader(self.filepath) as reader:
+            for offset, length, direction, time_ms, payload in reader.records(self.offset):
+                self._fold_frame(direction_name(direction), time_ms, payload)
+                self.offset = offset + length
+
+    def _fold_parallel(self, end: int) -> None:
+        """把 [offset, end) 切分后交给进程池统计，再合并各区间的计数"""
+        for counts in map_ranges(_fold_range, self.filepath,
+                                 split_ranges(self.filepath, self.offset, end)):
+            self.total += counts['total']
+            self.skipped += counts['skipped']
+            for name in ('directions', 'frame_types', 'type_ids', 'causes', 'new_seconds'):
+                merged = getattr(self, name)
+                for key, count in counts[name].items():
+                    merged[key] = merged.get(key, 0) + count
+        self.offset = end
+
+    def _fold_line(self, line: bytes) -> None:
+        line = line.strip()
+        if not line:
+            return
+
+        fields = extract_log_fields(line, config.LOG_ENCODING)
+        if fields is None:
+            self.skipped += 1
+            return
+        direction, time_ms, data_hex = fields
+
+        bytes_data: Optional[bytes] = b''
+        if data_hex:
+            bytes_data = FastIEC104FrameParser.decode_hex(data_hex[:_HEADER_HEX_CHARS])
+            if bytes_data is None or len(data_hex) > _HEADER_HEX_CHARS and len(bytes_data) < 12:
+                bytes_data = FastIEC104FrameParser.decode_hex(data_hex)
+        self._fold_frame(classify_direction(direction), time_ms, bytes_data)
+
+    def _fold_frame(self, dir_type: str, time_ms: int, bytes_data: Optional[bytes]) -> None:
+        """累计一帧（bytes_data 为 None 表示报文无法解码，为空表示没有报文）"""
+        self.total += 1
+        self.directions[dir_type] = self.directions.get(dir_type, 0) + 1
+
+        if bytes_data is None:
+            frame_type, type_id, cause = 'INVALID', None, None
+        elif bytes_data:
+            frame_type, type_id, cause = classify_frame(bytes_data)
+        else:
+            frame_type, type_id, cause = 'UNKNOWN', None, None
+
+        self.frame_types[frame_type] = self.frame_types.get(frame_type, 0) + 1
+        if type_id is not None:
+            self.type_ids[type_id] = self.type_ids.get(type_id, 0) + 1
+            self.causes[cause] = self.causes.get(cause, 0) + 1
+
+        if time_ms > 0:
+            second = time_ms // 1000
+            self.new_seconds[second] = self.new_seconds.get(second, 0) + 1
+
+    # ---------- 输出 ----------
+
+    def summary(self, include_buckets: bool = False) -> Dict[str, Any]:
+        """与原 /api/stats 相同结构的统计结果，另附帧速率"""
+        with self.lock:
+            type_ids: Dict[str, int] = {}
+            for type_id, count in self.type_ids.items():
+                desc = TYPE_IDENTIFICATION.get(type_id, '未知类型')
+                type_ids[desc] = type_ids.get(desc, 0) + count
+
+            causes: Dict[str, int] = {}
+            for cause, count in self.causes.items():
+                desc = CAUSE_OF_TRANSMISSION.get(cause, f'未知原因({cause})')
+                causes[desc] = causes.get(desc, 0) + count
+
+            rate: Dict[str, Any] = {'seconds': len(self.seconds), 'avg_fps': 0, 'peak_fps': 0,
+                                    'peak_time_ms': None}
+            if self.seconds:
+                peak_second = max(self.seconds, key=self.seconds.get)
+                span = max(self.seconds) - min(self.seconds) + 1
+                rate.update({
+                    'avg_fps': round(sum(self.seconds.values()) / span, 3),
+                    'peak_fps': self.seconds[peak_second],
+                    'peak_time_ms': peak_second * 1000
+                })
+                if include_buckets:
+                    rate['buckets'] = [[second * 1000, self.seconds[second]]
+                                       for second in sorted(self.seconds)]
+
+            return {
+                'total': self.total,
+                'skipped': self.skipped,
+                'frame_types': dict(self.frame_types),
+                'type_ids': type_ids,
+                'causes': causes,
+                'directions': dict(self.directions),
+                'rate': rate,
+                'covered_bytes': self.offset,
+                'file_size': self.file_size
+            }
+
+
+def _fold_range(filepath: str, start: int, end: int) -> Dict[str, Any]:
+    """统计 [start, end) 内的完整行（进程池任务），返回各项计数"""
+    partial = LogStats(filepath)
+    partial.offset = start
+    with open_log(filepath) as f:
+        f.seek(start)
+        partial._fold(f, end)
+    return {
+        'total': partial.total,
+        'skipped': partial.skipped,
+        'directions': partial.directions,
+        'frame_types': partial.frame_types,
+        'type_ids': partial.type_ids,
+        'causes': partial.causes,
+        'new_seconds': partial.new_seconds,
+    }
+
+
+_stats: Dict[str, LogStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_log_stats(filepath: str) -> LogStats:
+    """获取（必要时加载并增量更新）日志文件的累计统计"""
+    filepath = os.path.abspath(filepath)
+    with _stats_lock:
+        log_stats = _stats.get(filepath)
+        if log_stats is None:
+            log_stats = LogStats(filepath)
+            SIDECAR_LOOKUPS.inc('stats', 'sidecar' if log_stats.load() else 'build')
+            _stats[filepath] = log_stats
+        else:
+            SIDECAR_LOOKUPS.inc('stats', 'memory')
+    return log_stats.refresh()
+
+
+def cached_log_stats(filepath: str) -> Optional[LogStats]:
+    """内存中或 sidecar 文件里已有的统计（不刷新、不构建，可能落后于文件），没有时返回 None"""
+    filepath = os.path.abspath(filepath)
+    with _stats_lock:
+        log_stats = _stats.get(filepath)
+    if log_stats is not None:
+        return log_stats
+    log_stats = LogStats(filepath)
+    return log_stats if log_stats.load() else None
@@ -0,0 +1,190 @@
+"""日志读取窗口
+
+把 /api/logs 的三种读取方式（尾部、按页、时间范围/游标）统一为一条生成器管道：
+读取行 -> 解析 -> 过滤 -> 生成响应条目。普通请求把结果收集成列表，
+流式请求边读边输出，不必先在内存中构造完整结果。
+"""
+from typing import AbstractSet, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import config
+from binary_log import is_binary_log
+from frame_cache import ParsedLine, frame_cache, iter_log_entries, iter_parsed_lines
+from frame_query import evaluate, masks
+from frame_store import FRAME_TYPES, get_frame_store
+from log_index import LogIndex, build_log_index_async, get_log_index, index_ready, peek_log_index
+from log_reader import read_tail_lines
+from log_source import is_compressed
+from projection import Projection
+
+# 列式存储的 frame_type 与帧解析器给出的类型一致的取值（可以经列式存储筛选）
+STORE_FILTER_TYPES = FRAME_TYPES[:4]
+
+
+class LogWindow:
+    """一次日志读取请求
+
+    page 不为 None 时按页读取（不能同时给出 from_ms/to_ms/after_offset，由调用方校验）；
+    from_ms/to_ms/after_offset 任一不为 None 时按时间范围或游标顺序扫描；否则读取尾部 tail_lines 行。
+    按页读取时过滤器先于分页：页内只有匹配的行，total_lines/total_pages 按匹配的行计。
+    分页信息（pagination）在条目遍历结束后才完整，
+    尾部模式下为 None。exclude 为条目中省略的冗余字段（frame_cache.OPTIONAL_FIELDS），
+    projection 不为 None 时条目只含其中的字段，并按其所需的最浅深度解析。
+    position 为读取时最后一个完整行的结束偏移（增量读取的起点，不会落在未写完的行中间），
+    遍历开始后可用。
+    """
+
+    def __init__(self, filepath: str, tail_lines: Optional[int] = None,
+                 filter_type: Optional[str] = None, page: Optional[int] = None,
+                 page_size: int = config.DEFAULT_PAGE_SIZE,
+                 from_ms: Optional[int] = None, to_ms: Optional[int] = None,
+                 after_offset: Optional[int] = None, exclude: AbstractSet[str] = frozenset(),
+                 projection: Optional[Projection] = None):
+        self.filepath = filepath
+        self.tail_lines = tail_lines
+        self.filter_type = filter_type
+        self.page = page
+        self.page_size = page_size
+        self.from_ms = from_ms
+        self.to_ms = to_ms
+        self.after_offset = after_offset
+        self.exclude = exclude
+        self.projection = projection
+        self.level = projection.parse_level(filter_type) if projection is not None else 'full'
+        self.count = 0
+        self.pagination: Optional[Dict[str, Any]] = None
+        self.position = 0
+        self._scan_index = None
+
+    @property
+    def paged(self) -> bool:
+        return (self.page is not None or self.from_ms is not None or self.to_ms is not None
+                or self.after_offset is not None)
+
+    @property
+    def index_state(self) -> Optional[bool]:
+        """响应是否取决于索引是否已建好：尾部模式下返回是否已有索引（有索引时条目带实际行号），
+        其他读取方式总是经索引，返回 None
+        """
+        if self.paged or self._always_indexed:
+            return None
+        return index_ready(self.filepath)
+
+    @property
+    def _always_indexed(self) -> bool:
+        # 二进制日志无法反向查找记录边界，压缩日志反向定位也要完整解压，总是经索引
+        return is_binary_log(self.filepath) or is_compressed(self.filepath)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """逐条生成响应条目"""
+        if self.page is not None:
+            lines = self._page_lines()
+            limit = None
+        elif self.paged:
+            lines = self._scan_lines()
+            limit = self.page_size
+        else:
+            lines = self._tail_lines()
+            limit = None
+
+        for entry in iter_log_entries(lines, self.filter_type, limit, self.exclude, self.projection):
+            self.count += 1
+            yield entry
+
+        if self._scan_index is not None:
+            self._finish_scan()
+
+    # ---------- 各读取方式 ----------
+
+    def _tail_lines(self) -> Iterable[ParsedLine]:
+        count = self.tail_lines if self.tail_lines and self.tail_lines > 0 else config.MAX_LOG_LINES
+        always_indexed = self._always_indexed
+        index = get_log_index(self.filepath) if always_indexed else peek_log_index(self.filepath)
+        if index is not None and (frame_cache.enabled or always_indexed):
+            # 经索引定位尾部所在的块，重复请求直接命中缓存
+            self.position = index.indexed_size
+            return frame_cache.get_lines(index, index.line_count - count, count, self.level)
+        if frame_cache.enabled:
+            # 还没有索引：本次不等待全量建索引，索引在后台构建，之后的请求再经索引和缓存
+            build_log_index_async(self.filepath)
+        # 从文件末尾反向读取，已有索引时顺带给出实际行号
+        lines = read_tail_lines(self.filepath, count, index)
+        if lines:
+            self.position = lines[-1].offset + len(lines[-1].data)
+        return iter_parsed_lines(lines, level=self.level)
+
+    def _page_lines(self) -> Iterable[ParsedLine]:
+        """按行号分页，有过滤器时对匹配的行分页"""
+        index = get_log_index(self.filepath)
+        self.position = index.indexed_size
+        page_size = self.page_size
+        start = (self.page - 1) * page_size
+        if self.filter_type:
+            lines, total = self._filtered_page(index, start, page_size)
+        else:
+            lines, total = frame_cache.get_lines(index, start, page_size, self.level), index.line_count
+        total_pages = (total + page_size - 1) // page_size
+        self.pagination = {
+            'mode': 'page',
+            'page': self.page,
+            'page_size': page_size,
+            'total_lines': total,
+            'total_pages': total_pages,
+            'next_offset': lines[-1].offset + lines[-1].length if lines else index.indexed_size,
+            'has_more': self.page < total_pages
+        }
+        return lines
+
+    def _filtered_page(self, index: LogIndex, start: int, count: int) -> Tuple[List[ParsedLine], int]:
+        """匹配过滤器的第 start 行起的 count 行，及匹配的总行数
+
+        经列式存储的 frame_type 列求出匹配行的行号，只读取这些行所在的块；
+        列式存储中没有对应编码的类型（如 ERROR）逐块扫描。
+        """
+        if self.filter_type not in STORE_FILTER_TYPES:
+            matched = [line for line in frame_cache.scan(index, level=self.level)
+                       if line.entry is not None
+                       and line.entry.get('frame_info', {}).get('type') == self.filter_type]
+            return matched[start:start + count], len(matched)
+
+        store = get_frame_store(self.filepath)
+        with store.lock:
+            mask = evaluate(store, {'frame_type': self.filter_type})
+            total = masks.count(mask)
+            line_nos = [store.data.line_no[row] for row in masks.select(mask, start, count, False)]
+            del mask
+        lines = []
+        blocks: Dict[int, List[ParsedLine]] = {}
+        for line_no in line_nos:
+            block, skip = divmod(line_no - 1, index.block_lines)
+            if block not in blocks:
+                blocks[block] = frame_cache.get_block(index, block, self.level)
+            if skip < len(blocks[block]):
+                lines.append(blocks[block][skip])
+        return lines, total
+
+    def _scan_lines(self) -> Iterator[ParsedLine]:
+        """游标/时间范围：从 after_offset 开始顺序扫描，记录已消费到的位置"""
+        self._scan_index = index = get_log_index(self.filepath)
+        self.position = index.indexed_size
+        start_offset = self.after_offset or 0
+        self._next_offset = start_offset
+        self._exhausted = False
+        self.pagination = {
+            'mode': 'range' if self.from_ms is not None or self.to_ms is not None else 'cursor',
+            'page_size': self.page_size,
+            'from_ms': self.from_ms,
+            'to_ms': self.to_ms,
+            'after_offset': start_offset,
+            'total_lines': index.line_count,
+            'next_offset': start_offset,
+            'has_more': False
+        }
+        for line in frame_cache.scan(index, start_offset, self.from_ms, self.to_ms, self.level):
+            self._next_offset = line.offset + line.length
+            yield line
+        self._exhausted = True
+
+    def _finish_scan(self) -> None:
+        next_offset = self._scan_index.indexed_size if self._exhausted else self._next_offset
+        self.pagination['next_offset'] = next_offset
+        self.pagination['has_more'] = next_offset < self._scan_index.indexed_size
@@ -0,0 +1,179 @@
+"""运行指标
+
+进程内的计数器与直方图，由 /api/metrics 按 Prometheus 文本格式（0.0.4）导出。
+更新时持有一把全局锁，热路径上不逐行调用：解析循环在本地累加，每批记录一次。
+进程池子进程中记录的指标随任务结果交回主进程合并（drain/merge，见 parallel_parse）；
+缓存命中数等各模块已有的统计不重复记录，导出时由调用方以指标族的形式传入。
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import config
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 导出时传入的指标族：(名称, 类型, 说明, [(标签, 值), ...])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+_lock = threading.Lock()
+_registry: List['_Metric'] = []
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        _registry.append(self)
+
+
+class Counter(_Metric):
+    """单调递增的计数器，按标签值分别计数"""
+    kind = 'counter'
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def _merge(self, key: Tuple[str, ...], value: float) -> None:
+        self._values[key] = self._values.get(key, 0) + value
+
+    def _lines(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f'{self.name}{_labels(self.labels, key)} {_number(value)}'
+
+
+class Histogram(_Metric):
+    """累积分桶的直方图（buckets 为各桶上界，+Inf 桶自动附加）"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = config.METRICS_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with _lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _merge(self, key: Tuple[str, ...], value: List[Any]) -> None:
+        state = self._values.get(key)
+        if state is None:
+            self._values[key] = [list(value[0]), value[1], value[2]]
+            return
+        state[0] = [a + b for a, b in zip(state[0], value[0])]
+        state[1] += value[1]
+        state[2] += value[2]
+
+    def _lines(self) -> Iterator[str]:
+        names = self.labels + ('le',)
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket
+                yield f'{self.name}_bucket{_labels(names, key + (_number(bound),))} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, key)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labels, key)} {count}'
+
+
+@contextmanager
+def timed(histogram: Histogram, *label_values: str) -> Iterator[None]:
+    """记录 with 块的耗时（秒）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, *label_values)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + '}'
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def drain() -> Dict[str, Dict[Tuple[str, ...], Any]]:
+    """取出并清空本进程记录的指标（进程池子进程随任务结果交回）"""
+    delta = {}
+    with _lock:
+        for metric in _registry:
+            if metric._values:
+                delta[metric.name] = metric._values
+                metric._values = {}
+    return delta
+
+
+def merge(delta: Dict[str, Dict[Tuple[str, ...], Any]]) -> None:
+    """合并 drain 取出的指标"""
+    if not delta:
+        return
+    with _lock:
+        for metric in _registry:
+            for key, value in delta.get(metric.name, {}).items():
+                metric._merge(key, value)
+
+
+def render(families: Iterable[Family] = ()) -> str:
+    """全部指标的 Prometheus 文本格式，families 为调用方附加的指标族"""
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric._lines())
+    for name, kind, help_text, samples in families:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            lines.append(f'{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# ---------- 指标定义 ----------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'iec104_http_request_duration_seconds',
+    'HTTP 请求处理耗时（流式响应计到开始发送）', ('endpoint', 'method', 'status'))
+STAGE_SECONDS = Histogram(
+    'iec104_stage_duration_seconds',
+    '各处理阶段每批的耗时（read 读文件、decode 日志行JSON解码、parse 帧解析、serialize 响应序列化、'
+    'index 建立行偏移索引、stats 累计统计）', ('stage',))
+BYTES_READ = Counter(
+    'iec104_bytes_read_total', '从日志文件读取的字节数', ('reader',))
+FRAMES_PARSED = Counter(
+    'iec104_frames_parsed_total', '解析为日志条目的帧数', ('format',))
+PARSE_FAILURES = Counter(
+    'iec104_parse_failures_total',
+    '解析失败次数（json 非JSON、fields 字段缺失或类型不对、invalid_frame 帧无效、'
+    'truncated_frame 帧短于长度字段、element 信息元素解析失败）', ('reason',))
+SIDECAR_LOOKUPS = Counter(
+    'iec104_sidecar_lookups_total',
+    '索引/统计/检索索引的获取次数（memory 内存命中、sidecar 从文件加载、build 重新构建）', ('kind', 'source'))
+LOG_EVENTS = Counter(
+    'iec104_log_events_total', '结构化日志事件数（含被限频抑制的）', ('event',))
+LOG_EVENTS_SUPPRESSED = Counter(
+    'iec104_log_events_suppressed_total', '被限频抑制未输出的日志事件数', ('event',))
@@ -0,0 +1,142 @@
+"""大文件并行解析
+
+解析是纯 Python 代码，受 GIL 限制，多线程无法提速。待处理数据超过阈值时，
+把文件切分为按换行（二进制日志按记录）对齐的字节区间，交给进程池并行处理，
+再按区间顺序取回结果。子进程中记录的运行指标随结果一并取回，合并到主进程。
+具体的区间处理函数（解析、统计、导出、检索）由各模块提供，须为模块级函数以便跨进程传递。
+结果的反序列化在主进程中串行进行，区间处理函数应尽量在子进程中完成汇总，
+只返回计数、列数据等紧凑结果，不返回逐行的条目字典。
+"""
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import config
+import metrics
+from binary_log import is_binary_log
+from log_index import LogIndex, get_log_index
+from log_source import is_compressed, open_log
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def worker_count() -> int:
+    """进程池大小（配置为0时取 CPU 核数）"""
+    return config.PARALLEL_WORKERS or os.cpu_count() or 1
+
+
+def parallel_enabled(nbytes: int, filepath: Optional[str] = None) -> bool:
+    """待处理字节数是否值得交给进程池（压缩文件只能顺序解压，不并行）"""
+    return (config.ENABLE_PARALLEL_PARSE and worker_count() > 1
+            and nbytes >= config.PARALLEL_MIN_BYTES
+            and not (filepath and is_compressed(filepath)))
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """进程池（首次使用时创建，之后复用）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context(config.PARALLEL_START_METHOD)
+            _pool = ProcessPoolExecutor(max_workers=worker_count(), mp_context=context)
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def split_ranges(filepath: str, start: int, end: int,
+                 chunk_bytes: int = config.PARALLEL_CHUNK_BYTES) -> List[Tuple[int, int]]:
+    """把 [start, end) 切分为约 chunk_bytes 大小、在行首处分界的区间
+
+    start 须为行首，end 须为某行的结尾（换行之后），各区间因此都由完整行组成。
+    二进制日志的记录没有分隔符，边界取自行偏移索引的块起点。
+    """
+    if is_binary_log(filepath):
+        return _block_ranges(get_log_index(filepath), start, end, chunk_bytes)
+    ranges = []
+    with open_log(filepath) as f:
+        pos = start
+        while pos < end:
+            target = pos + chunk_bytes
+            if target >= end:
+                ranges.append((pos, end))
+                break
+            # 从目标位置读到下一个换行，边界落在下一行行首
+            f.seek(target)
+            f.readline()
+            boundary = min(f.tell(), end)
+            ranges.append((pos, boundary))
+            pos = boundary
+    return ranges
+
+
+def _block_ranges(index: LogIndex, start: int, end: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """以索引块起点为边界切分 [start, end)"""
+    ranges = []
+    pos = start
+    for offset in index.offsets:
+        if offset >= end:
+            break
+        if offset - pos >= chunk_bytes:
+            ranges.append((pos, offset))
+            pos = offset
+    if pos < end:
+        ranges.append((pos, end))
+    return ranges
+
+
+def group_blocks(index: LogIndex, blocks: Iterable[int],
+                 chunk_bytes: int = config.PARALLEL_CHUNK_BYTES) -> List[List[int]]:
+    """相邻的索引块合并为一组（一个任务区间），每组的字节数不超过 chunk_bytes"""
+    groups: List[List[int]] = []
+    for block in blocks:
+        if (groups and groups[-1][-1] == block - 1
+                and index.block_range(block)[1] - index.block_range(groups[-1][0])[0] <= chunk_bytes):
+            groups[-1].append(block)
+        else:
+            groups.append([block])
+    return groups
+
+
+def _run_task(func: Callable[..., Any], *args: Any) -> Tuple[Any, Dict]:
+    """进程池中执行任务，返回 (结果, 本次记录的指标)"""
+    return func(*args), metrics.drain()
+
+
+def _result(future) -> Any:
+    result, delta = future.result()
+    metrics.merge(delta)
+    return result
+
+
+def map_ranges(func: Callable[..., Any], filepath: str, ranges: Sequence[Tuple[int, ...]],
+               *args: Any) -> Iterator[Any]:
+    """在进程池中执行 func(filepath, start, end, *args)，按区间顺序返回结果
+
+    区间可以带各自的附加参数 (start, end, *extra)，此时调用 func(filepath, start, end, *extra, *args)。
+    同时在途的任务数限制为进程数的两倍，消费方处理较慢时不会堆积全部结果。
+    """
+    pool = get_pool()
+    window = worker_count() * 2
+    pending: deque = deque()
+    try:
+        for start, end, *extra in ranges:
+            pending.append(pool.submit(_run_task, func, filepath, start, end, *extra, *args))
+            if len(pending) >= window:
+                yield _result(pending.popleft())
+        while pending:
+            yield _result(pending.popleft())
+    finally:
+        # 消费方提前结束时取消尚未开始的任务
+        for future in pending:
+            future.cancel()
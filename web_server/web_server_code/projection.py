@@ -0,0 +1,151 @@
+"""日志条目的字段投影
+
+/api/logs 和 /api/logs/tail 的 fields 参数为逗号分隔的字段名：顶层字段（ENTRY_FIELDS）或
+frame_info.<子字段>（FRAME_FIELDS），单独的 frame_info 表示整个帧信息。响应条目只包含这些字段。
+
+给出 fields 时按需选择解析深度（PARSE_LEVELS）：不需要帧信息时不解析帧，不需要 objects 时
+不解码全部信息对象。timestamp、direction_desc、各 *_desc 描述文字和 ctrl、raw_bytes 不在解析时生成，
+只在被请求时由 timestamp_ms、类型标识等换算；客户端可只请求数值字段，描述文字从 /api/dictionary 取一次后缓存。
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from iec104_parser import (CAUSE_OF_TRANSMISSION, DIRECTION_DESC, IEC104_FRAME_TYPES, TYPE_IDENTIFICATION,
+                           U_FRAME_FUNCTIONS, FastIEC104FrameParser, format_timestamp)
+
+ENTRY_FIELDS = ('timestamp', 'timestamp_ms', 'direction', 'direction_desc', 'length', 'data',
+                'frame_info', 'raw', 'line_num', 'file_line_num', 'offset')
+
+FRAME_FIELDS = ('type', 'type_desc', 'apdu_len', 'ctrl', 'raw_bytes', 'byte_count', 'send_seq', 'recv_seq',
+                'function', 'description', 'type_id', 'type_id_desc', 'sq', 'num_obj', 'cause', 'cause_desc',
+                'test', 'pn', 'asdu_addr', 'ioa', 'value', 'quality', 'qoi', 'qoi_desc', 'objects')
+
+# 解析深度，由浅到深：line 不解析帧，frame 解析帧但不解码全部信息对象，full 为完整条目
+PARSE_LEVELS = ('line', 'frame', 'full')
+
+
+def _frame_type_desc(entry: Dict[str, Any], frame_info: Dict[str, Any]) -> Optional[str]:
+    return IEC104_FRAME_TYPES.get(frame_info.get('type'))
+
+
+def _type_id_desc(entry: Dict[str, Any], frame_info: Dict[str, Any]) -> Optional[str]:
+    type_id = frame_info.get('type_id')
+    return None if type_id is None else TYPE_IDENTIFICATION.get(int(type_id, 16), '未知类型')
+
+
+def _cause_desc(entry: Dict[str, Any], frame_info: Dict[str, Any]) -> Optional[str]:
+    cause = frame_info.get('cause')
+    return None if cause is None else CAUSE_OF_TRANSMISSION.get(cause, f'未知原因({cause})')
+
+
+def _frame_bytes(entry: Dict[str, Any], frame_info: Dict[str, Any]) -> Optional[bytes]:
+    if 'apdu_len' not in frame_info:
+        return None  # 帧头无效时完整解析也不给出 ctrl 和 raw_bytes
+    return FastIEC104FrameParser.decode_hex(entry['data'])
+
+
+def _ctrl(entry: Dict[str, Any], frame_info: Dict[str, Any]) -> Optional[str]:
+    bytes_data = _frame_bytes(entry, frame_info)
+    return None if bytes_data is None else bytes_data[2:6].hex(' ').upper()
+
+
+def _raw_bytes(entry: Dict[str, Any], frame_info: Dict[str, Any]) -> Optional[str]:
+    bytes_data = _frame_bytes(entry, frame_info)
+    return None if bytes_data is None else bytes_data.hex(' ').upper()
+
+
+# 精简条目中省略、可由其他字段换算的帧信息子字段
+_DERIVED_FRAME_FIELDS = {
+    'type_desc': _frame_type_desc,
+    'type_id_desc': _type_id_desc,
+    'cause_desc': _cause_desc,
+    'ctrl': _ctrl,
+    'raw_bytes': _raw_bytes
+}
+
+
+class Projection:
+    """解析后的 fields 参数"""
+
+    def __init__(self, fields: Tuple[str, ...], frame_fields: Optional[Tuple[str, ...]]):
+        self.fields = fields              # 顶层字段（含 frame_info 时表示需要帧信息）
+        self.frame_fields = frame_fields  # frame_info 的子字段，None 表示整个 frame_info
+
+    def parse_level(self, filter_type: Optional[str] = None) -> str:
+        """满足投影（以及按帧类型过滤）所需的最浅解析深度"""
+        if 'frame_info' not in self.fields:
+            return 'frame' if filter_type else 'line'
+        if self.frame_fields is None or 'objects' in self.frame_fields:
+            return 'full'
+        return 'frame'
+
+    def apply(self, entry: Dict[str, Any], line_num: int, file_line_num: Optional[int],
+              offset: int) -> Dict[str, Any]:
+        """由（完整或精简的）已解析条目生成投影后的响应条目"""
+        result = {}
+        for name in self.fields:
+            if name == 'frame_info':
+                result[name] = self._frame_info(entry)
+            elif name == 'line_num':
+                result[name] = line_num
+            elif name == 'file_line_num':
+                result[name] = file_line_num
+            elif name == 'offset':
+                result[name] = offset
+            elif name in entry:
+                result[name] = entry[name]
+            elif name == 'timestamp':
+                result[name] = format_timestamp(entry['timestamp_ms'])
+            elif name == 'direction_desc':
+                result[name] = DIRECTION_DESC.get(entry['direction'], '未知方向')
+        return result
+
+    def _frame_info(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        frame_info = entry['frame_info']
+        if self.frame_fields is None:
+            return frame_info
+        result = {}
+        for name in self.frame_fields:
+            if name in frame_info:
+                result[name] = frame_info[name]
+            elif name in _DERIVED_FRAME_FIELDS:
+                value = _DERIVED_FRAME_FIELDS[name](entry, frame_info)
+                if value is not None:
+                    result[name] = value
+        return result
+
+
+def parse_fields(value: Optional[str]) -> Tuple[Optional[Projection], Optional[str]]:
+    """解析 fields 参数，返回 (投影, 错误信息)；参数缺省时投影为 None（返回完整条目）"""
+    names = [name.strip() for name in (value or '').split(',') if name.strip()]
+    if not names:
+        return None, None
+    fields = []
+    frame_fields: Optional[List[str]] = []
+    for name in names:
+        if name.startswith('frame_info.'):
+            sub = name[len('frame_info.'):]
+            if sub not in FRAME_FIELDS:
+                return None, f'未知的帧信息字段: {sub}'
+            if frame_fields is not None and sub not in frame_fields:
+                frame_fields.append(sub)
+            name = 'frame_info'
+        elif name not in ENTRY_FIELDS:
+            return None, f'未知的字段: {name}'
+        elif name == 'frame_info':
+            frame_fields = None
+        if name not in fields:
+            fields.append(name)
+    return Projection(tuple(fields), None if frame_fields is None else tuple(frame_fields)), None
+
+
+def dictionary() -> Dict[str, Any]:
+    """代码到描述文字的对照表（/api/dictionary），键与条目中的取值一致"""
+    return {
+        'directions': dict(DIRECTION_DESC),
+        'frame_types': dict(IEC104_FRAME_TYPES),
+        'type_ids': {f'0x{type_id:02X}': desc for type_id, desc in TYPE_IDENTIFICATION.items()},
+        'causes': {str(cause): desc for cause, desc in CAUSE_OF_TRANSMISSION.items()},
+        'u_functions': {f'0x{code:02X}': name for code, name in U_FRAME_FUNCTIONS.items()},
+        'entry_fields': list(ENTRY_FIELDS),
+        'frame_fields': list(FRAME_FIELDS)
+    }
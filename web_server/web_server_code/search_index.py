@@ -0,0 +1,513 @@
+"""跨文件检索索引
+
+以行偏移索引的块（INDEX_BLOCK_LINES 行）为单位，为每个日志文件维护：
+- 倒排表：类型标识/传输原因/公共地址/信息对象地址 -> 出现该值的块号；
+- 每块一个报文三字节组（trigram）位图，用于原始报文十六进制子串的预筛选（可能误报，不会漏报）。
+
+检索先按倒排表和位图求候选块，只读取候选块逐行校验。已完成的块只索引一次并持久化为
+sidecar 文件（<文件名>.search），未写满的最后一块每次文件增长时重新索引；
+文件截断或轮转时随行偏移索引一起重建。后台线程定期扫描日志目录，新文件和追加内容自动入索引。
+"""
+import base64
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import config
+from binary_log import direction_name, is_binary_log, iter_records
+from event_log import log_event
+from file_catalog import get_catalog
+from frame_query import TYPE_NAMES, QueryError
+from frame_store import decode_frame_header
+from iec104_parser import (INFORMATION_OBJECT_LAYOUTS, CP56TIME2A_LENGTH, FastIEC104FrameParser,
+                           classify_direction, extract_log_fields)
+from log_index import LogIndex, get_log_index
+from log_source import open_log
+from metrics import SIDECAR_LOOKUPS
+from parallel_parse import group_blocks, map_ranges, parallel_enabled
+
+SEARCH_VERSION = 1
+
+SEARCH_FIELDS = ('type_id', 'cause', 'asdu_addr', 'ioa')
+
+_GRAM_BYTES = (1 << config.SEARCH_GRAM_BITS) // 8
+_GRAM_SHIFT = 32 - config.SEARCH_GRAM_BITS
+
+
+def gram_hashes(pattern: bytes) -> Set[int]:
+    """字节串中全部三字节组在位图中的位置"""
+    return {_gram_hash(pattern[i:i + 3]) for i in range(len(pattern) - 2)}
+
+
+def _gram_hash(gram: bytes) -> int:
+    # Fibonacci 散列：取32位乘积的高位
+    return ((int.from_bytes(gram, 'big') * 2654435761) & 0xFFFFFFFF) >> _GRAM_SHIFT
+
+
+def frame_ioas(payload: bytes, type_id: int, first_ioa: int, count: int) -> Iterable[int]:
+    """I帧中全部信息对象地址（未知类型只取首个地址）"""
+    if first_ioa < 0:
+        return ()
+    layout = INFORMATION_OBJECT_LAYOUTS.get(type_id)
+    if layout is None or count <= 1:
+        return (first_ioa,)
+    if payload[7] & 0x80:  # SQ=1
+        return range(first_ioa, first_ioa + count)
+    step = layout[0] + (CP56TIME2A_LENGTH if layout[2] else 0) + 3
+    return [payload[pos] | (payload[pos + 1] << 8) | (payload[pos + 2] << 16)
+            for pos in range(12, min(len(payload) - 2, 12 + step * count), step)]
+
+
+def iter_block_frames(data: bytes, offset: int,
+                      binary: bool = False) -> Iterator[Tuple[int, int, str, int, bytes]]:
+    """块内带报文的帧：(块内行序号（从0计）, 行首偏移, 方向, time_ms, 报文)
+
+    data 为从 offset 开始的整块数据；binary 为 True 时按二进制日志记录切分。
+    """
+    if binary:
+        for i, (start, _, direction, time_ms, payload) in enumerate(iter_records(data, 0, len(data))):
+            if payload:
+                yield i, offset + start, direction_name(direction), time_ms, bytes(payload)
+        return
+    start = offset
+    for i, line in enumerate(data.split(b'\n')[:-1]):
+        line_start = start
+        start += len(line) + 1
+        fields = extract_log_fields(line.strip(), config.LOG_ENCODING) if line.strip() else None
+        if fields is None or not fields[2]:
+            continue
+        payload = FastIEC104FrameParser.decode_hex(fields[2])
+        if payload:
+            yield i, line_start, classify_direction(fields[0]), fields[1], payload
+
+
+class BlockTerms:
+    """一个块的索引项"""
+
+    def __init__(self):
+        self.values: Dict[str, Set[int]] = {field: set() for field in SEARCH_FIELDS}
+        self.grams = bytearray(_GRAM_BYTES)
+
+    def add_block(self, data: bytes, binary: bool = False) -> None:
+        grams: Set[bytes] = set()
+        values = self.values
+        for _, _, _, _, payload in iter_block_frames(data, 0, binary):
+            grams.update(payload[i:i + 3] for i in range(len(payload) - 2))
+            frame_type, type_id, cause, asdu_addr, _, _, ioa, _, count = decode_frame_header(payload)
+            if frame_type != 0 or type_id < 0:
+                continue
+            values['type_id'].add(type_id)
+            values['cause'].add(cause)
+            if asdu_addr >= 0:
+                values['asdu_addr'].add(asdu_addr)
+            values['ioa'].update(frame_ioas(payload, type_id, ioa, count))
+        bits = self.grams
+        for gram in grams:
+            position = _gram_hash(gram)
+            bits[position >> 3] |= 1 << (position & 7)
+
+
+def _grams_match(bits, hashes: Set[int]) -> bool:
+    return all(bits[position >> 3] >> (position & 7) & 1 for position in hashes)
+
+
+class FileSearchIndex:
+    """单个日志文件的块级倒排索引"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.search_path = filepath + config.SEARCH_SUFFIX
+        self.lock = threading.Lock()
+        self._reset()
+        self.generation = None
+
+    def _reset(self) -> None:
+        self.inode = 0
+        self.head = ''
+        self.blocks = 0       # 已完成（已写满）并入倒排表的块数
+        self.end_offset = 0   # 已完成块的结束字节偏移
+        self.postings: Dict[str, Dict[int, array]] = {field: {} for field in SEARCH_FIELDS}
+        self.grams: List[bytes] = []
+        self.tail: Optional[BlockTerms] = None  # 未写满的最后一块
+        self.tail_end = 0
+
+    # ---------- 持久化 ----------
+
+    def load(self) -> bool:
+        """从 sidecar 文件恢复已完成块的索引"""
+        try:
+            with open(self.search_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (data.get('version') != SEARCH_VERSION
+                    or data.get('block_lines') != config.INDEX_BLOCK_LINES
+                    or data.get('gram_bits') != config.SEARCH_GRAM_BITS):
+                return False
+            self.inode = data['inode']
+            self.head = data['head']
+            self.blocks = data['blocks']
+            self.end_offset = data['end_offset']
+            self.postings = {field: {int(value): array('i', blocks)
+                                     for value, blocks in data['postings'][field].items()}
+                             for field in SEARCH_FIELDS}
+            grams = zlib.decompress(base64.b64decode(data['grams']))
+            self.grams = [grams[i:i + _GRAM_BYTES] for i in range(0, len(grams), _GRAM_BYTES)]
+            if len(self.grams) != self.blocks:
+                raise ValueError('位图块数不一致')
+        except (OSError, ValueError, KeyError, TypeError, AttributeError, zlib.error):
+            self._reset()
+            return False
+        return True
+
+    def save(self) -> None:
+        """写入 sidecar 文件，目录不可写时仅保留内存索引"""
+        data = {
+            'version': SEARCH_VERSION,
+            'block_lines': config.INDEX_BLOCK_LINES,
+            'gram_bits': config.SEARCH_GRAM_BITS,
+            'inode': self.inode,
+            'head': self.head,
+            'blocks': self.blocks,
+            'end_offset': self.end_offset,
+            'postings': {field: {value: blocks.tolist() for value, blocks in values.items()}
+                         for field, values in self.postings.items()},
+            'grams': base64.b64encode(zlib.compress(b''.join(self.grams))).decode('ascii'),
+        }
+        tmp_path = self.search_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.search_path)
+        except OSError as e:
+            log_event('sidecar_write_failed', logging.ERROR, kind='search', path=self.search_path, error=str(e))
+
+    # ---------- 增量构建 ----------
+
+    def _matches(self, index: LogIndex) -> bool:
+        """已有内容（内存中或从 sidecar 加载）是否仍对应当前文件"""
+        if self.inode != index.inode or not index.head.startswith(self.head):
+            return False
+        if self.blocks > index.block_count:
+            return False
+        if self.blocks == 0:
+            return True
+        expected = (index.offsets[self.blocks] if self.blocks < index.block_count
+                    else index.indexed_size)
+        return expected == self.end_offset
+
+    def _add(self, block: int, terms: BlockTerms) -> None:
+        for field, values in terms.values.items():
+            postings = self.postings[field]
+            for value in values:
+                blocks = postings.get(value)
+                if blocks is None:
+                    blocks = postings[value] = array('i')
+                blocks.append(block)
+        self.grams.append(bytes(terms.grams))
+
+    def refresh(self) -> 'FileSearchIndex':
+        """索引新增的块，文件轮转时重建
+
+        只在取块范围时持有行偏移索引的锁，读文件和建索引期间不阻塞其他请求。
+        """
+        index = get_log_index(self.filepath)
+        with self.lock:
+            with index.lock:
+                if index.generation != self.generation:
+                    if not self._matches(index):
+                        self._reset()
+                    self.generation = index.generation
+                    self.tail = None
+                complete = index.block_count
+                if complete and index.line_count % index.block_lines:
+                    complete -= 1
+                ranges = [(block, index.block_range(block)) for block in range(self.blocks, complete)]
+                has_tail = complete < index.block_count
+                if has_tail and (self.tail is None or self.tail_end != index.indexed_size):
+                    ranges.append((complete, index.block_range(complete)))
+                inode, head, indexed_size = index.inode, index.head, index.indexed_size
+
+            if not has_tail:
+                self.tail = None
+            if not ranges:
+                return self
+
+            binary = is_binary_log(self.filepath)
+            with open_log(self.filepath) as f:
+                for block, (start, end) in ranges:
+                    f.seek(start)
+                    terms = BlockTerms()
+                    terms.add_block(f.read(end - start), binary)
+                    if block < complete:
+                        self._add(block, terms)
+                        self.end_offset = end
+                    else:
+                        self.tail = terms
+                        self.tail_end = indexed_size
+            if self.blocks < complete:
+                self.blocks = complete
+                self.inode = inode
+                self.head = head
+                self.save()
+        return self
+
+    # ---------- 检索 ----------
+
+    def candidates(self, criteria: Dict[str, Set[int]], hashes: Set[int],
+                   blocks: Optional[Iterable[int]] = None) -> List[int]:
+        """可能包含匹配帧的块号（criteria 为字段 -> 可选值集合，值集合之间为 AND）"""
+        with self.lock:
+            total = self.blocks + (1 if self.tail is not None else 0)
+            result = set(range(total)) if blocks is None else {block for block in blocks
+                                                               if block < total}
+            for field, values in criteria.items():
+                matched = set()
+                postings = self.postings[field]
+                for value in values:
+                    matched.update(postings.get(value, ()))
+                if self.tail is not None and self.tail.values[field] & values:
+                    matched.add(self.blocks)
+                result &= matched
+            if hashes:
+                result = {block for block in result
+                          if _grams_match(self.grams[block] if block < self.blocks else self.tail.grams,
+                                          hashes)}
+            return sorted(result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'blocks': self.blocks + (1 if self.tail is not None else 0),
+                'terms': sum(len(values) for values in self.postings.values()),
+                'bytes': _GRAM_BYTES * len(self.grams)
+                + sum(blocks.itemsize * len(blocks)
+                      for values in self.postings.values() for blocks in values.values())
+            }
+
+
+def _frame_matches(payload: bytes, criteria: Dict[str, Set[int]], pattern: bytes) -> bool:
+    if pattern and pattern not in payload:
+        return False
+    if not criteria:
+        return True
+    frame_type, type_id, cause, asdu_addr, _, _, ioa, _, count = decode_frame_header(payload)
+    if frame_type != 0:
+        return False
+    header = {'type_id': type_id, 'cause': cause, 'asdu_addr': asdu_addr}
+    for field, values in criteria.items():
+        if field == 'ioa':
+            if values.isdisjoint(frame_ioas(payload, type_id, ioa, count)):
+                return False
+        elif header[field] not in values:
+            return False
+    return True
+
+
+def _scan_range(filepath: str, start: int, end: int, first_line: int, criteria: Dict[str, Set[int]],
+                pattern: bytes, from_ms: Optional[int], to_ms: Optional[int],
+                limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+    """逐行校验 [start, end) 内的完整行（进程池任务），返回 (匹配帧数, 前 limit 个匹配)"""
+    total = 0
+    matches: List[Dict[str, Any]] = []
+    with open_log(filepath) as f:
+        f.seek(start)
+        data = f.read(end - start)
+    for i, offset, direction, time_ms, payload in iter_block_frames(data, start, is_binary_log(filepath)):
+        if (from_ms is not None and time_ms < from_ms) or (to_ms is not None and time_ms > to_ms):
+            continue
+        if not _frame_matches(payload, criteria, pattern):
+            continue
+        total += 1
+        if len(matches) < limit:
+            matches.append({
+                'line_no': first_line + i,
+                'offset': offset,
+                'time_ms': time_ms,
+                'direction': direction,
+                'raw': payload.hex(' ')
+            })
+    return total, matches
+
+
+def scan_blocks(index: LogIndex, blocks: List[int], criteria: Dict[str, Set[int]], pattern: bytes,
+                from_ms: Optional[int], to_ms: Optional[int], limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+    """逐行校验候选块，返回 (匹配帧数, 前 limit 个匹配)
+
+    相邻的候选块合并为一个区间，数据量超过阈值时在进程池中校验，子进程只传回计数和前 limit 个匹配。
+    """
+    ranges = [(index.block_range(group[0])[0], index.block_range(group[-1])[1],
+               group[0] * index.block_lines + 1) for group in group_blocks(index, blocks)]
+    args = (criteria, pattern, from_ms, to_ms, limit)
+    if parallel_enabled(sum(end - start for start, end, _ in ranges), index.filepath):
+        parts: Iterable[Tuple[int, List[Dict[str, Any]]]] = map_ranges(_scan_range, index.filepath, ranges, *args)
+    else:
+        parts = (_scan_range(index.filepath, start, end, first_line, *args) for start, end, first_line in ranges)
+    total = 0
+    matches: List[Dict[str, Any]] = []
+    for count, found in parts:
+        total += count
+        matches.extend(found[:limit - len(matches)])
+    return total, matches
+
+
+_indexes: Dict[str, FileSearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(filepath: str) -> FileSearchIndex:
+    """获取（必要时加载并增量更新）日志文件的检索索引"""
+    filepath = os.path.abspath(filepath)
+    with _indexes_lock:
+        search_index = _indexes.get(filepath)
+        if search_index is None:
+            search_index = FileSearchIndex(filepath)
+            SIDECAR_LOOKUPS.inc('search', 'sidecar' if search_index.load() else 'build')
+            _indexes[filepath] = search_index
+        else:
+            SIDECAR_LOOKUPS.inc('search', 'memory')
+    return search_index.refresh()
+
+
+def list_log_paths() -> List[Tuple[str, str]]:
+    """日志目录下全部 (类型, 路径)"""
+    result = []
+    for log_type in ('client', 'server'):
+        result.extend((log_type, path) for path in get_catalog(log_type).paths())
+    return sorted(result)
+
+
+def refresh_all() -> int:
+    """更新全部日志文件的检索索引，移除已删除文件的索引，返回文件数"""
+    paths = list_log_paths()
+    for _, path in paths:
+        try:
+            get_search_index(path)
+        except OSError as e:
+            log_event('search_index_failed', logging.ERROR, path=path, error=str(e))
+    existing = {os.path.abspath(path) for _, path in paths}
+    with _indexes_lock:
+        for path in list(_indexes):
+            if path not in existing:
+                del _indexes[path]
+    return len(paths)
+
+
+class SearchIndexer(threading.Thread):
+    """后台索引线程：定期扫描日志目录"""
+
+    def __init__(self):
+        super().__init__(name='search-indexer', daemon=True)
+        self.ready = threading.Event()  # 第一轮扫描完成
+
+    def run(self) -> None:
+        while True:
+            try:
+                refresh_all()
+            except Exception as e:  # 后台线程不退出
+                log_event('search_indexer_failed', logging.ERROR, error=str(e))
+            self.ready.set()
+            time.sleep(config.SEARCH_INDEX_INTERVAL)
+
+
+_indexer: Optional[SearchIndexer] = None
+_indexer_lock = threading.Lock()
+
+
+def start_indexer() -> Optional[SearchIndexer]:
+    """启动后台索引线程（只启动一次，配置关闭时返回 None）"""
+    global _indexer
+    if not config.ENABLE_SEARCH_INDEX:
+        return None
+    with _indexer_lock:
+        if _indexer is None or not _indexer.is_alive():
+            _indexer = SearchIndexer()
+            _indexer.start()
+        return _indexer
+
+
+def criteria_from_args(args) -> Tuple[Dict[str, Set[int]], bytes]:
+    """由查询参数构造检索条件：type_id/cause/asdu/ioa 为逗号分隔的值（任一匹配），hex 为报文子串"""
+    criteria: Dict[str, Set[int]] = {}
+    for key in ('type_id', 'cause', 'asdu', 'asdu_addr', 'ioa'):
+        text = args.get(key)
+        if not text:
+            continue
+        field = 'asdu_addr' if key == 'asdu' else key
+        values = set()
+        for item in text.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            if field == 'type_id' and item in TYPE_NAMES:
+                values.add(TYPE_NAMES[item])
+                continue
+            try:
+                values.add(int(item, 0))
+            except ValueError:
+                raise QueryError(f'{key} 的值无效: {item!r}')
+        criteria.setdefault(field, set()).update(values)
+
+    pattern = b''
+    text = args.get('hex', '')
+    if text:
+        try:
+            pattern = bytes.fromhex(text.replace(' ', '').replace(':', ''))
+        except ValueError:
+            raise QueryError(f'hex 的值无效: {text!r}')
+    return criteria, pattern
+
+
+def search(criteria: Dict[str, Set[int]], pattern: bytes = b'',
+           from_ms: Optional[int] = None, to_ms: Optional[int] = None,
+           log_type: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+    """跨文件检索：返回包含匹配帧的文件及前 limit 个匹配帧"""
+    hashes = gram_hashes(pattern)
+    files = []
+    matches: List[Dict[str, Any]] = []
+    scanned_blocks = 0
+    total_blocks = 0
+    for file_type, path in list_log_paths():
+        if log_type and file_type != log_type:
+            continue
+        search_index = get_search_index(path)
+        index = get_log_index(path)
+        time_blocks = (index.blocks_in_time_range(from_ms, to_ms)
+                       if from_ms is not None or to_ms is not None else None)
+        blocks = search_index.candidates(criteria, hashes, time_blocks)
+        total_blocks += index.block_count
+        if not blocks:
+            continue
+        scanned_blocks += len(blocks)
+        count, found = scan_blocks(index, blocks, criteria, pattern, from_ms, to_ms,
+                                   limit - len(matches))
+        if not count:
+            continue
+        name = os.path.basename(path)
+        files.append({'file': name, 'type': file_type, 'matches': count})
+        for match in found:
+            match['file'] = name
+            match['type'] = file_type
+        matches.extend(found)
+    return {
+        'files': files,
+        'total': sum(item['matches'] for item in files),
+        'matches': matches,
+        'blocks_scanned': scanned_blocks,
+        'blocks_total': total_blocks
+    }
+
+
+def search_index_stats() -> Dict[str, Any]:
+    with _indexes_lock:
+        indexes = dict(_indexes)
+    stores = {os.path.basename(path): item.stats() for path, item in indexes.items()}
+    return {
+        'files': len(stores),
+        'blocks': sum(item['blocks'] for item in stores.values()),
+        'bytes': sum(item['bytes'] for item in stores.values()),
+        'indexer_running': _indexer is not None and _indexer.is_alive()
+    }
@@ -0,0 +1,318 @@
+"""I帧序号与窗口分析
+
+按方向跟踪 N(S)/N(R)（TX 为服务端→客户端，RX 为客户端→服务端）：
+- N(S) 跳号（丢帧）、重复、乱序，以及 32767 -> 0 的回绕；
+- 每个方向未确认的I帧数（发送方的 k 窗口深度），超过 k 的次数，
+  以及接收方一次确认的帧数超过 w 的次数；确认了尚未发送的序号（N(R) 超前）；
+- 由 U 帧 STARTDT/STOPDT/TESTFR 划分的会话。STARTDT act 视为新会话开始，两个方向的序号从0重新计。
+
+分析状态是增量的：SequenceAnalysis 记录已处理到列式帧存储的第几帧，文件追加后只处理新增帧，
+文件轮转（存储代数变化）时从头重新分析。每秒窗口深度的桶数超过 SEQUENCE_MAX_WINDOW_BUCKETS 时
+桶宽加倍（取最大深度合并），长时间的抓包不会让窗口序列无限增长；保存分析状态的文件数
+不超过 SEQUENCE_MAX_FILES，按最近使用淘汰，文件删除后其状态随之丢弃。
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import config
+from frame_store import DIRECTIONS, FRAME_TYPES, get_frame_store
+from iec104_parser import U_FRAME_FUNCTIONS
+
+SEQ_MODULO = 32768
+_HALF_MODULO = SEQ_MODULO // 2
+
+STARTDT_ACT = 0x07
+STOPDT_CON = 0x23
+TESTFR_ACT = 0x43
+TESTFR_CON = 0x83
+
+EVENT_KINDS = ('gap', 'duplicate', 'out_of_order', 'wrap', 'k_exceeded', 'w_exceeded',
+               'ack_ahead', 'ack_backward', 'session')
+
+_OPPOSITE = {'TX': 'RX', 'RX': 'TX'}
+
+
+class _DirectionState:
+    """单个方向的序号状态与计数"""
+
+    def __init__(self):
+        self.next_ns: Optional[int] = None  # 期望的下一个 N(S)
+        self.last_ns: Optional[int] = None
+        self.acked: Optional[int] = None    # 对端最近一次确认的 N(R)
+        self.i_frames = 0
+        self.gaps = 0
+        self.missing = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.wraps = 0
+        self.k_exceeded = 0
+        self.w_exceeded = 0
+        self.max_depth = 0
+        self.max_depth_time: Optional[int] = None
+
+    def restart(self) -> None:
+        """新会话：序号从0开始"""
+        self.next_ns = 0
+        self.last_ns = None
+        self.acked = 0
+
+    @property
+    def depth(self) -> Optional[int]:
+        """已发送未确认的I帧数"""
+        if self.next_ns is None or self.acked is None:
+            return None
+        return (self.next_ns - self.acked) % SEQ_MODULO
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'i_frames': self.i_frames,
+            'gaps': self.gaps,
+            'missing': self.missing,
+            'duplicates': self.duplicates,
+            'out_of_order': self.out_of_order,
+            'wraps': self.wraps,
+            'k_exceeded': self.k_exceeded,
+            'w_exceeded': self.w_exceeded,
+            'max_depth': self.max_depth,
+            'max_depth_time_ms': self.max_depth_time,
+            'next_ns': self.next_ns,
+            'acked': self.acked,
+            'depth': self.depth
+        }
+
+
+class SequenceAnalyzer:
+    """逐帧输入的序号分析器（只保存状态和计数，事件列表有上限）"""
+
+    def __init__(self, k: int = config.IEC104_K, w: int = config.IEC104_W,
+                 max_events: int = config.SEQUENCE_MAX_EVENTS,
+                 max_window_buckets: int = config.SEQUENCE_MAX_WINDOW_BUCKETS):
+        self.k = k
+        self.w = w
+        self.max_events = max_events
+        self.max_window_buckets = max_window_buckets
+        self.directions = {'TX': _DirectionState(), 'RX': _DirectionState()}
+        self.frames = 0
+        self.ignored = 0  # 方向未知的帧
+        self.events: List[Dict[str, Any]] = []
+        self.event_counts = {kind: 0 for kind in EVENT_KINDS}
+        self.sessions: List[Dict[str, Any]] = []
+        self.window: Dict[int, List[int]] = {}  # 桶号 -> [TX 最大深度, RX 最大深度]
+        self.window_ms = 1000  # 窗口深度的桶宽（毫秒），桶数超出上限时加倍
+
+    def _event(self, kind: str, direction: Optional[str], line_no: int, time_ms: int,
+               **details: Any) -> None:
+        self.event_counts[kind] += 1
+        if len(self.events) < self.max_events:
+            event = {'kind': kind, 'direction': direction, 'line_no': line_no, 'time_ms': time_ms}
+            event.update(details)
+            self.events.append(event)
+
+    def _sample_depth(self, direction: str, time_ms: int) -> None:
+        state = self.directions[direction]
+        depth = state.depth
+        if depth is None:
+            return
+        if depth > state.max_depth:
+            state.max_depth = depth
+            state.max_depth_time = time_ms
+        if time_ms > 0:
+            bucket = self.window.get(time_ms // self.window_ms)
+            if bucket is None:
+                bucket = self.window[time_ms // self.window_ms] = [0, 0]
+                if len(self.window) > self.max_window_buckets:
+                    self._coarsen_window()
+                    bucket = self.window[time_ms // self.window_ms]
+            slot = 0 if direction == 'TX' else 1
+            if depth > bucket[slot]:
+                bucket[slot] = depth
+
+    def _coarsen_window(self) -> None:
+        """桶宽加倍，相邻两个桶取最大深度合并"""
+        window: Dict[int, List[int]] = {}
+        for key, (tx, rx) in self.window.items():
+            bucket = window.setdefault(key // 2, [0, 0])
+            bucket[0] = max(bucket[0], tx)
+            bucket[1] = max(bucket[1], rx)
+        self.window = window
+        self.window_ms *= 2
+
+    # ---------- 输入 ----------
+
+    def feed(self, direction: str, frame_type: str, send_seq: int, recv_seq: int,
+             u_function: Optional[int], time_ms: int, line_no: int) -> None:
+        """输入一帧（序号缺失时为 -1，u_function 为 U 帧控制域第一字节）"""
+        self.frames += 1
+        if direction not in self.directions:
+            self.ignored += 1
+            return
+
+        if frame_type == 'I':
+            self._send(direction, send_seq, time_ms, line_no)
+            self._ack(_OPPOSITE[direction], recv_seq, time_ms, line_no)
+        elif frame_type == 'S':
+            self._ack(_OPPOSITE[direction], recv_seq, time_ms, line_no)
+        elif frame_type == 'U' and u_function is not None:
+            self._control(direction, u_function, time_ms, line_no)
+
+    def _send(self, direction: str, ns: int, time_ms: int, line_no: int) -> None:
+        state = self.directions[direction]
+        state.i_frames += 1
+        if self.sessions and self.sessions[-1]['end_ms'] is None:
+            self.sessions[-1]['i_frames'] += 1
+
+        if state.next_ns is not None:
+            diff = (ns - state.next_ns) % SEQ_MODULO
+            if ns == state.last_ns:
+                state.duplicates += 1
+                self._event('duplicate', direction, line_no, time_ms, send_seq=ns)
+                return
+            if diff >= _HALF_MODULO:
+                # 序号回退（多为未记录 STARTDT 的重连）：记录后以新序号重新同步
+                state.out_of_order += 1
+                self._event('out_of_order', direction, line_no, time_ms,
+                            send_seq=ns, expected=state.next_ns)
+                state.acked = None  # 对端确认到哪里未知，等下一次确认
+            else:
+                if diff > 0:
+                    state.gaps += 1
+                    state.missing += diff
+                    self._event('gap', direction, line_no, time_ms,
+                                expected=state.next_ns, send_seq=ns, missing=diff)
+                if state.last_ns is not None and ns < state.last_ns:
+                    state.wraps += 1
+                    self._event('wrap', direction, line_no, time_ms, send_seq=ns)
+
+        state.last_ns = ns
+        state.next_ns = (ns + 1) % SEQ_MODULO
+        depth = state.depth
+        if depth is not None and depth > self.k:
+            state.k_exceeded += 1
+            self._event('k_exceeded', direction, line_no, time_ms, depth=depth, k=self.k)
+        self._sample_depth(direction, time_ms)
+
+    def _ack(self, sender: str, nr: int, time_ms: int, line_no: int) -> None:
+        """对端用 N(R) 确认 sender 方向发送的I帧"""
+        if nr < 0:
+            return
+        state = self.directions[sender]
+        acker = _OPPOSITE[sender]
+        if state.next_ns is not None and (state.next_ns - nr) % SEQ_MODULO >= _HALF_MODULO:
+            self._event('ack_ahead', acker, line_no, time_ms, recv_seq=nr, next_ns=state.next_ns)
+        if state.acked is not None:
+            acked = (nr - state.acked) % SEQ_MODULO
+            if acked >= _HALF_MODULO:
+                # 确认序号回退（对端已重新开始计数）：记录后重新同步，发送序号等下一个I帧确定
+                self._event('ack_backward', acker, line_no, time_ms, recv_seq=nr, acked=state.acked)
+                state.next_ns = None
+                state.last_ns = None
+            elif acked > self.w:
+                state.w_exceeded += 1
+                self._event('w_exceeded', acker, line_no, time_ms, acknowledged=acked, w=self.w)
+        state.acked = nr
+        self._sample_depth(sender, time_ms)
+
+    def _control(self, direction: str, function: int, time_ms: int, line_no: int) -> None:
+        name = U_FRAME_FUNCTIONS.get(function, f'0x{function:02X}')
+        session = self.sessions[-1] if self.sessions and self.sessions[-1]['end_ms'] is None else None
+
+        if function == STARTDT_ACT:
+            if session is not None:
+                # 上一个会话没有 STOPDT 就重新启动
+                session.update(end_ms=time_ms, end_line=line_no, end_reason='restart')
+            for state in self.directions.values():
+                state.restart()
+            if len(self.sessions) >= self.max_events:
+                self.sessions.pop(0)
+            self.sessions.append({
+                'start_ms': time_ms, 'start_line': line_no, 'initiator': direction,
+                'end_ms': None, 'end_line': None, 'end_reason': None,
+                'i_frames': 0, 'testfr_act': 0, 'testfr_con': 0
+            })
+        elif session is not None:
+            if function == STOPDT_CON:
+                session.update(end_ms=time_ms, end_line=line_no, end_reason='stopdt')
+            elif function == TESTFR_ACT:
+                session['testfr_act'] += 1
+            elif function == TESTFR_CON:
+                session['testfr_con'] += 1
+        self._event('session', direction, line_no, time_ms, function=name)
+
+    # ---------- 输出 ----------
+
+    def summary(self, event_limit: int = 100, event_offset: int = 0,
+                kinds: Optional[List[str]] = None, include_window: bool = False) -> Dict[str, Any]:
+        events = self.events if not kinds else [event for event in self.events
+                                                  if event['kind'] in kinds]
+        result = {
+            'frames': self.frames,
+            'ignored': self.ignored,
+            'k': self.k,
+            'w': self.w,
+            'directions': {name: state.summary() for name, state in self.directions.items()},
+            'event_counts': dict(self.event_counts),
+            'events_total': len(events),
+            'events_truncated': sum(self.event_counts.values()) > len(self.events),
+            'events': events[event_offset:event_offset + event_limit],
+            'sessions': list(self.sessions)
+        }
+        if include_window:
+            result['window_ms'] = self.window_ms
+            result['window'] = [[key * self.window_ms] + depths
+                                for key, depths in sorted(self.window.items())]
+        return result
+
+
+class SequenceAnalysis:
+    """绑定到日志文件的增量分析"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.generation = None
+        self.rows = 0
+        self.analyzer = SequenceAnalyzer()
+
+    def refresh(self) -> 'SequenceAnalysis':
+        """分析列式帧存储中新增的帧"""
+        store = get_frame_store(self.filepath)
+        with self.lock, store.lock:
+            if store.generation != self.generation:
+                self.generation = store.generation
+                self.rows = 0
+                self.analyzer = SequenceAnalyzer()
+            data = store.data
+            payload, offsets = data.payload, data.payload_offsets
+            feed = self.analyzer.feed
+            for row in range(self.rows, len(data)):
+                frame_type = FRAME_TYPES[data.frame_type[row]]
+                u_function = payload[offsets[row] + 2] if frame_type == 'U' else None
+                feed(DIRECTIONS[data.direction[row]], frame_type, data.send_seq[row],
+                     data.recv_seq[row], u_function, data.time_ms[row], data.line_no[row])
+            self.rows = len(data)
+        return self
+
+
+_analyses: 'OrderedDict[str, SequenceAnalysis]' = OrderedDict()
+_analyses_lock = threading.Lock()
+
+
+def get_sequence_analysis(filepath: str) -> SequenceAnalysis:
+    """获取（必要时创建并增量更新）日志文件的序号分析
+
+    丢弃文件已不存在的分析，文件数超出 SEQUENCE_MAX_FILES 时淘汰最久未用的文件。
+    """
+    filepath = os.path.abspath(filepath)
+    with _analyses_lock:
+        for path in [path for path in _analyses if path != filepath and not os.path.exists(path)]:
+            del _analyses[path]
+        analysis = _analyses.get(filepath)
+        if analysis is None:
+            analysis = SequenceAnalysis(filepath)
+            _analyses[filepath] = analysis
+        _analyses.move_to_end(filepath)
+        while len(_analyses) > config.SEQUENCE_MAX_FILES:
+            _analyses.popitem(last=False)
+    return analysis.refresh()
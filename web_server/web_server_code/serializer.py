@@ -0,0 +1,65 @@
+"""JSON 编解码
+
+日志行解析和接口响应都要做大量 JSON 编解码。安装了 orjson 或 ujson 时使用它们，
+否则使用标准库 json；编码结果均为紧凑格式，不转义非 ASCII 字符。
+后端由 config.JSON_BACKEND 选择。快速库无法编码的对象（超出 64 位的整数等）
+退回标准库编码，结果与标准库一致。
+"""
+import json
+from typing import Any, Callable, Optional
+
+import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+BACKENDS = ('orjson', 'ujson', 'json')
+
+
+def _select_backend(name: str) -> str:
+    installed = {'orjson': orjson is not None, 'ujson': ujson is not None, 'json': True}
+    if name == 'auto':
+        return next(backend for backend in BACKENDS if installed[backend])
+    if name not in installed:
+        print(f"未知的 JSON 后端: {name}，使用标准库 json")
+        return 'json'
+    if not installed[name]:
+        print(f"未安装 {name}，使用标准库 json")
+        return 'json'
+    return name
+
+
+backend = _select_backend(config.JSON_BACKEND)
+
+# orjson: 整数等非字符串键转为字符串（与标准库一致）；datetime 交给 default（与 Flask 一致）
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """编码为紧凑的 JSON 字符串，default 用于转换无法直接编码的对象"""
+    try:
+        if backend == 'orjson':
+            return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS).decode('utf-8')
+        if backend == 'ujson':
+            if default is None:
+                return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+            return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False, default=default)
+    except (TypeError, ValueError, OverflowError):
+        pass  # 由标准库重新编码（无法编码时抛出与标准库相同的异常）
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=default)
+
+
+def loads(data: Any) -> Any:
+    """解析 JSON 文本（str 或 bytes），格式错误时抛出 ValueError"""
+    if backend == 'orjson':
+        return orjson.loads(data)
+    if backend == 'ujson':
+        return ujson.loads(data)
+    return json.loads(data)
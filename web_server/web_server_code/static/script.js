@@ -11,6 +11,18 @@ let refreshInterval = null;  // 添加
 let lastTimestamp = 0;  // 添加：最后一条日志的时间戳
 
 let lastFilePosition = 0; // 添加：文件读取位置
+let lastFileInode = null; // 文件 inode，用于服务端识别轮转
+let eventSource = null; // 实时推送连接（SSE）
+
+// 列表只请求渲染用到的字段，描述文字由对照表在本地换算
+const LOG_FIELDS = [
+    'timestamp_ms', 'direction', 'data',
+    'frame_info.type', 'frame_info.send_seq', 'frame_info.recv_seq', 'frame_info.type_id',
+    'frame_info.cause', 'frame_info.asdu_addr', 'frame_info.ioa', 'frame_info.value',
+    'frame_info.num_obj', 'frame_info.function', 'frame_info.description'
+].join(',');
+let dictionaryPromise = null; // 代码到描述文字的对照表（只请求一次）
+let dictionary = null;
 
 // 初始化
 document.addEventListener('DOMContentLoaded', () => {
@@ -133,31 +145,77 @@ function renderFileList(containerId, files, type) {
     });
 }
 
+// 加载代码对照表
+function loadDictionary() {
+    if (!dictionaryPromise) {
+        dictionaryPromise = fetch(`${API_BASE}/api/dictionary`)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) throw new Error(data.error);
+                dictionary = data.dictionary;
+            })
+            .catch(error => {
+                dictionaryPromise = null;
+                throw error;
+            });
+    }
+    return dictionaryPromise;
+}
+
+function describe(table, key, fallback) {
+    const entries = dictionary ? dictionary[table] : null;
+    return entries && entries[key] !== undefined ? entries[key] : fallback;
+}
+
+function pad(value, width = 2) {
+    return String(value).padStart(width, '0');
+}
+
+// 毫秒时间戳格式化为本地时间（与服务端 timestamp 字段格式相同）
+function formatTimestamp(ms) {
+    if (!ms || ms <= 0) return 'N/A';
+    const d = new Date(ms);
+    return `${d.getFullYear()}-${pad(d.getMonth() + 1)}-${pad(d.getDate())} ` +
+        `${pad(d.getHours())}:${pad(d.getMinutes())}:${pad(d.getSeconds())}.${pad(ms % 1000, 3)}`;
+}
+
 // 加载日志内容
 async function loadLogs(fileName, fileType) {
     try {
         currentFile = fileName;
         currentType = fileType;
+        await loadDictionary();
 
         const tailLines = document.getElementById('tailLines').value;
         const frameFilter = document.getElementById('frameFilter').value;
 
-        let url = `${API_BASE}/api/logs?file=${encodeURIComponent(fileName)}&type=${fileType}`;
+        let url = `${API_BASE}/api/logs?file=${encodeURIComponent(fileName)}&type=${fileType}&fields=${LOG_FIELDS}`;
         if (tailLines) url += `&tail=${tailLines}`;
         if (frameFilter) url += `&filter=${frameFilter}`;
 
-        const response = await fetch(url);
-        const data = await response.json();
+        let fileInfo;
+        if (window.ReadableStream && window.TextDecoder) {
+            // 流式读取：边接收边渲染
+            fileInfo = await loadLogsStream(url + '&stream=ndjson');
+        } else {
+            const response = await fetch(url);
+            const data = await response.json();
 
-        if (!data.success) {
-            throw new Error(data.error);
+            if (!data.success) {
+                throw new Error(data.error);
+            }
+
+            fileInfo = data.file_info;
+            renderFileInfo(fileInfo);
+            renderLogs(data.logs);
         }
 
-        renderFileInfo(data.file_info);
-        renderLogs(data.logs);
+        // 重置文件位置（重新加载时）：从已读取的最后一个完整行之后开始，不落在未写完的行中间
+        lastFilePosition = fileInfo.position || 0;
+        lastFileInode = null;
 
-        // 重置文件位置（重新加载时）
-        lastFilePosition = data.file_info.file_size || 0;  // 添加：设置初始位置
+        // 切换文件后推送连接跟随新文件
+        if (autoRefresh && eventSource) openLogStream();
 
     } catch (error) {
         console.error('加载日志失败:', error);
@@ -166,6 +224,63 @@ async function loadLogs(fileName, fileType) {
 }
 
 
+// 以 NDJSON 流读取日志：首行文件信息，随后每行一条日志，末行汇总
+async function loadLogsStream(url) {
+    const response = await fetch(url);
+    if (!response.ok || !response.body) {
+        const data = await response.json();
+        throw new Error(data.error || `HTTP ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let fileInfo = null;
+    let trailer = null;
+    let batch = [];
+    let count = 0;
+
+    const flush = () => {
+        if (batch.length === 0) return;
+        if (count === 0) renderLogTable();
+        appendLogRows(batch);
+        count += batch.length;
+        lastTimestamp = Math.max(lastTimestamp, ...batch.map(log => log.timestamp_ms || 0));
+        batch = [];
+    };
+
+    lastTimestamp = 0;
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (!line) continue;
+            const item = JSON.parse(line);
+            if (item.file_info) {
+                fileInfo = item.file_info;
+                renderFileInfo({ ...fileInfo, total_lines: '加载中...' });
+            } else if (item.done) {
+                trailer = item;
+            } else {
+                batch.push(item);
+            }
+        }
+        // 每收到一批数据渲染一次
+        flush();
+    }
+    flush();
+
+    if (count === 0) renderLogs([]);
+    if (trailer && !trailer.success) throw new Error(trailer.error);
+    fileInfo.total_lines = count;
+    if (trailer) fileInfo.position = trailer.position;
+    renderFileInfo(fileInfo);
+    return fileInfo;
+}
+
 // 切换自动刷新
 function toggleAutoRefresh() {
     console.log('=== toggleAutoRefresh 被调用 ===');
@@ -201,6 +316,12 @@ function startAutoRefresh() {
         return;
     }
 
+    // 优先使用服务端推送，浏览器不支持时退回定时轮询
+    if (window.EventSource) {
+        openLogStream();
+        return;
+    }
+
     console.log('设置定时器，每2秒执行一次');
 
     // 立即执行一次
@@ -215,8 +336,60 @@ function startAutoRefresh() {
     console.log('refreshInterval ID:', refreshInterval);
 }
 
+// 建立 SSE 连接，服务端有新日志时推送
+function openLogStream() {
+    closeLogStream();
+
+    const url = `${API_BASE}/api/logs/stream?file=${encodeURIComponent(currentFile)}&type=${currentType}&position=${lastFilePosition}`;
+    eventSource = new EventSource(url);
+
+    eventSource.addEventListener('logs', (event) => {
+        const data = JSON.parse(event.data);
+        const statusIndicator = document.getElementById('refreshStatus');
+
+        if (data.logs.length > 0) {
+            appendLogs(data.logs);
+            lastTimestamp = Math.max(lastTimestamp, ...data.logs.map(log => log.timestamp_ms));
+            if (statusIndicator) {
+                statusIndicator.className = 'refresh-indicator active';
+                setTimeout(() => {
+                    if (autoRefresh) statusIndicator.className = 'refresh-indicator idle';
+                }, 500);
+            }
+        }
+        lastFilePosition = data.position;
+    });
+
+    // 文件被轮转/截断或客户端积压过多：重新加载
+    eventSource.addEventListener('reset', () => {
+        closeLogStream();
+        loadLogs(currentFile, currentType).then(() => {
+            if (autoRefresh) openLogStream();
+        });
+    });
+
+    // 连接断开：按最新位置重连（避免浏览器自动重连时使用旧位置）
+    eventSource.onerror = () => {
+        const statusIndicator = document.getElementById('refreshStatus');
+        if (statusIndicator) statusIndicator.className = 'refresh-indicator error';
+        closeLogStream();
+        setTimeout(() => {
+            if (autoRefresh && currentFile) openLogStream();
+        }, 3000);
+    };
+}
+
+// 关闭 SSE 连接
+function closeLogStream() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+}
+
 // 停止自动刷新
 function stopAutoRefresh() {
+    closeLogStream();
     if (refreshInterval) {
         clearInterval(refreshInterval);
         refreshInterval = null;
@@ -239,7 +412,8 @@ async function fetchNewLogs() {
     }
 
     try {
-        const url = `${API_BASE}/api/logs/tail?file=${encodeURIComponent(currentFile)}&type=${currentType}&since=${lastTimestamp}&position=${lastFilePosition}`;
+        let url = `${API_BASE}/api/logs/tail?file=${encodeURIComponent(currentFile)}&type=${currentType}&since=${lastTimestamp}&position=${lastFilePosition}&fields=${LOG_FIELDS}`;
+        if (lastFileInode !== null) url += `&inode=${lastFileInode}`;
         console.log('请求 URL:', url);
 
         const response = await fetch(url);
@@ -248,6 +422,13 @@ async function fetchNewLogs() {
         const data = await response.json();
         console.log('返回数据:', data);
 
+        // 文件被截断或轮转：重新加载整个视图
+        if (data.reset) {
+            lastFileInode = data.inode;
+            await loadLogs(currentFile, currentType);
+            return;
+        }
+
         if (data.success && data.logs.length > 0) {
             console.log(`✅ 获取到 ${data.logs.length} 条新日志`);
 
@@ -272,6 +453,12 @@ async function fetchNewLogs() {
             console.log('更新位置:', lastFilePosition, '->', data.position);
             lastFilePosition = data.position;
         }
+        if (data.inode !== undefined) lastFileInode = data.inode;
+
+        // 单次读取达到上限，立即继续追赶
+        if (data.more && autoRefresh) {
+            setTimeout(fetchNewLogs, 0);
+        }
 
     } catch (error) {
         console.error('❌ 获取新日志失败:', error);
@@ -340,6 +527,12 @@ function renderLogs(logs) {
     // 更新最后时间戳
     lastTimestamp = Math.max(...logs.map(log => log.timestamp_ms));  // 添加
 
+    renderLogTable(logs.map(log => renderLogRow(log)).join(''));
+}
+
+// 创建日志表格（rows 为初始行的 HTML）
+function renderLogTable(rows = '') {
+    const container = document.getElementById('logContent');
     container.innerHTML = `
         <table class="log-table">
             <thead>
@@ -352,15 +545,30 @@ function renderLogs(logs) {
                 </tr>
             </thead>
             <tbody>
-                ${logs.map(log => renderLogRow(log)).join('')}
+                ${rows}
             </tbody>
         </table>
     `;
 }
 
-// 渲染单行日志
+// 在表格末尾追加日志行（流式加载用）
+function appendLogRows(logs) {
+    const tbody = document.querySelector('.log-table tbody');
+    if (!tbody) return;
+    tbody.insertAdjacentHTML('beforeend', logs.map(log => renderLogRow(log)).join(''));
+}
+
+// 渲染单行日志（精简条目的描述文字由对照表换算，SSE 推送的完整条目直接使用）
 function renderLogRow(log) {
-    const frame = log.frame_info;
+    const frame = log.frame_info || {};
+    const timestamp = log.timestamp || formatTimestamp(log.timestamp_ms);
+    const directionDesc = log.direction_desc || describe('directions', log.direction, '未知方向');
+    const typeDesc = frame.type_desc || describe('frame_types', frame.type, frame.type);
+    const typeIdDesc = frame.type_id_desc ||
+        (frame.type_id !== undefined ? describe('type_ids', frame.type_id, '未知类型') : '');
+    const causeDesc = frame.cause_desc ||
+        (frame.cause !== undefined ? describe('causes', String(frame.cause), `未知原因(${frame.cause})`) : '');
+    const objectCount = frame.num_obj !== undefined ? frame.num_obj : (frame.objects ? frame.objects.ioa.length : 0);
     const dirClass = log.direction === 'TX' ? 'dir-tx' : 'dir-rx';
     const frameClass = `frame-${(frame.type || 'UNKNOWN').toLowerCase()}`;
 
@@ -370,11 +578,12 @@ function renderLogRow(log) {
         details = `
             <div><strong>发送序号:</strong> ${frame.send_seq}</div>
             <div><strong>接收序号:</strong> ${frame.recv_seq}</div>
-            ${frame.type_id_desc ? `<div><strong>类型:</strong> ${frame.type_id_desc}</div>` : ''}
-            ${frame.cause_desc ? `<div><strong>原因:</strong> ${frame.cause_desc}</div>` : ''}
+            ${typeIdDesc ? `<div><strong>类型:</strong> ${typeIdDesc}</div>` : ''}
+            ${causeDesc ? `<div><strong>原因:</strong> ${causeDesc}</div>` : ''}
             ${frame.asdu_addr !== undefined ? `<div><strong>ASDU地址:</strong> ${frame.asdu_addr}</div>` : ''}
             ${frame.ioa !== undefined ? `<div><strong>IOA:</strong> ${frame.ioa}</div>` : ''}
             ${frame.value !== undefined ? `<div><strong>值:</strong> ${frame.value}</div>` : ''}
+            ${objectCount > 1 ? `<div><strong>对象数:</strong> ${objectCount}</div>` : ''}
         `;
     } else if (frame.type === 'S') {
         details = `<div><strong>接收序号:</strong> ${frame.recv_seq}</div>`;
@@ -386,12 +595,12 @@ function renderLogRow(log) {
 
     return `
         <tr class="log-row ${dirClass} ${frameClass}">
-            <td class="timestamp">${log.timestamp}</td>
+            <td class="timestamp">${timestamp}</td>
             <td class="direction">
-                <span class="badge ${dirClass}">${log.direction_desc}</span>
+                <span class="badge ${dirClass}">${directionDesc}</span>
             </td>
             <td class="frame-type">
-                <span class="badge ${frameClass}">${frame.type_desc || frame.type || 'N/A'}</span>
+                <span class="badge ${frameClass}">${typeDesc || 'N/A'}</span>
             </td>
             <td class="details">${details}</td>
             <td class="raw-data">
@@ -445,6 +654,7 @@ function renderStats(stats) {
         <div class="stats-section">
             <h3>总体统计</h3>
             <p>总记录数: <strong>${stats.total}</strong></p>
+            ${stats.rate ? `<p>平均帧速率: <strong>${stats.rate.avg_fps}</strong> 帧/秒, 峰值: <strong>${stats.rate.peak_fps}</strong> 帧/秒</p>` : ''}
         </div>
         
         <div class="stats-section">
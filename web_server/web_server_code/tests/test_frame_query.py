@@ -0,0 +1,108 @@
+"""frame_query 的查询语义测试
+
+运行: python -m pytest -q tests（在 web_server_code 目录下）
+"""
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import frame_query  # noqa: E402
+import frame_store  # noqa: E402
+from frame_query import QueryError, evaluate, masks  # noqa: E402
+from frame_store import FrameColumns  # noqa: E402
+
+M_ME_NC_1 = 0x0D
+
+
+def _m_me_nc_1(send_seq: int, objects) -> bytes:
+    """SQ=0 的 M_ME_NC_1 帧，objects 为 (IOA, 品质) 列表"""
+    asdu = bytes([M_ME_NC_1, len(objects), 3, 0, 1, 0])
+    for ioa, quality in objects:
+        asdu += ioa.to_bytes(3, 'little') + struct.pack('<f', 1.5) + bytes([quality])
+    return bytes([0x68, len(asdu) + 4]) + struct.pack('<HH', send_seq << 1, 0) + asdu
+
+
+def _line(time_ms: int, frame: bytes) -> bytes:
+    data = ' '.join(f'{byte:02x}' for byte in frame) + ' '
+    return (f'{{"dir":"ser -> cli","time_ms":{time_ms},"len":{len(frame)},"data":"{data}"}}\n'
+            .encode('ascii'))
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def columns(request, monkeypatch):
+    if request.param == 'numpy':
+        if frame_store.np is None:
+            pytest.skip('未安装 NumPy')
+    else:
+        monkeypatch.setattr(frame_store, 'np', None)
+        monkeypatch.setattr(frame_query, 'masks', frame_query._PythonMasks)
+    frames = [
+        # 第1帧：IOA 1500 品质正常，IOA 5000 无效——没有一个对象同时满足区间和无效
+        _m_me_nc_1(0, [(1500, 0x00), (5000, 0x80)]),
+        # 第2帧：IOA 1200 无效
+        _m_me_nc_1(1, [(1200, 0x80)]),
+        # 第3帧：IOA 1800 溢出，IOA 7000 品质正常
+        _m_me_nc_1(2, [(1800, 0x01), (7000, 0x00)]),
+        # 第4帧：S 帧，没有信息对象
+        bytes([0x68, 0x04, 0x01, 0x00, 0x06, 0x00]),
+    ]
+    data = b''.join(_line(1000 + i, frame) for i, frame in enumerate(frames))
+    result = FrameColumns()
+    result.append_block(data, 0)
+    return result
+
+
+def _rows(columns, where, objects=False):
+    return frame_query.masks.select(evaluate(columns, where, objects), 0, 100, False)
+
+
+def test_object_subtable(columns):
+    assert len(columns) == 4
+    assert columns.object_count == 6
+    assert list(columns.object_ioa) == [1500, 5000, 1200, 1800, 7000, -1]
+
+
+def test_object_predicates_match_same_object(columns):
+    where = {'type_id': 'M_ME_NC_1', 'ioa': {'min': 1000, 'max': 2000}, 'quality': ['invalid']}
+    assert _rows(columns, where) == [1]
+
+
+def test_and_list_conjunction_matches_same_object(columns):
+    where = {'and': [{'ioa': {'min': 1000, 'max': 2000}}, {'quality': ['invalid']}]}
+    assert _rows(columns, where) == [1]
+
+
+def test_or_branches_reduce_separately(columns):
+    where = {'or': [{'ioa': 5000}, {'quality': ['overflow']}]}
+    assert _rows(columns, where) == [0, 2]
+
+
+def test_not_object_predicate(columns):
+    # 没有任何无效对象的帧
+    assert _rows(columns, {'not': {'quality': ['invalid']}}) == [2, 3]
+
+
+def test_single_object_predicates(columns):
+    assert _rows(columns, {'ioa': {'min': 1000, 'max': 2000}}) == [0, 1, 2]
+    assert _rows(columns, {'quality': 'invalid'}) == [0, 1]
+    assert _rows(columns, {'frame_type': 'S'}) == [3]
+
+
+def test_objects_mode(columns):
+    where = {'ioa': {'min': 1000, 'max': 2000}, 'quality': ['invalid']}
+    assert _rows(columns, where, objects=True) == [2]
+    assert _rows(columns, {'send_seq': 2}, objects=True) == [3, 4]
+
+
+def test_invalid_queries(columns):
+    with pytest.raises(QueryError):
+        evaluate(columns, {'nope': 1})
+    with pytest.raises(QueryError):
+        evaluate(columns, {'quality': ['bogus']})
+    with pytest.raises(QueryError):
+        evaluate(columns, {'and': {'ioa': 1}})
+    assert masks.name in ('numpy', 'python')
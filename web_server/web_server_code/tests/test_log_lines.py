@@ -0,0 +1,53 @@
+"""日志行解析：各模块使用的字段提取与 /api/logs 的条目解析对同一行的取舍一致"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iec104_parser import decode_log_line, extract_log_fields, parse_log_line_json  # noqa: E402
+
+VALID = [
+    '{"dir":"cli -> ser","time_ms":1762852273860,"len":6,"data":"68 04 07 00 00 00 "}',
+    # 非固定格式（空白、字段顺序不同、缺少 len）走通用JSON解析
+    '{"dir": "ser -> cli", "time_ms": 1762852273860, "len": 6, "data": "68 04 0b 00 00 00"}',
+    '{"time_ms":1762852273860,"dir":"ser -> cli","data":"68 04 0b 00 00 00 "}',
+    '{"dir":"ser -> cli","time_ms":0,"len":6,"data":"68 04 0b 00 00 00 "}',
+]
+
+MALFORMED = [
+    # 缺少右括号 / 行尾多余内容 / 写了一半的行
+    '{"dir":"ser -> cli","time_ms":1762852273860,"len":6,"data":"68 04 0b 00 00 00 "',
+    '{"dir":"ser -> cli","time_ms":1762852273860,"len":6,"data":"68 04 0b 00 00 00 "}xyz',
+    '{"dir":"ser -> cli","time_ms":1762852273860,"len":6,"da',
+    # 字段类型不对
+    '{"dir":"ser -> cli","time_ms":"1762852273860","len":6,"data":"68 04 0b 00 00 00 "}',
+    '{"dir":"ser -> cli","time_ms":true,"len":6,"data":"68 04 0b 00 00 00 "}',
+    '{"dir":"ser -> cli","time_ms":1762852273860,"len":"6","data":"68 04 0b 00 00 00 "}',
+    '{"dir":1,"time_ms":1762852273860,"len":6,"data":"68 04 0b 00 00 00 "}',
+    '{"dir":"ser -> cli","time_ms":1762852273860,"len":6,"data":null}',
+    # 前导零不是合法的JSON数字
+    '{"dir":"ser -> cli","time_ms":01762852273860,"len":6,"data":"68 04 0b 00 00 00 "}',
+    # 字符串中的控制字符
+    '{"dir":"ser\t-> cli","time_ms":1762852273860,"len":6,"data":"68 04 0b 00 00 00 "}',
+    # 不是对象
+    '["dir","ser -> cli"]',
+    'garbage',
+]
+
+
+@pytest.mark.parametrize('line', VALID)
+def test_valid_lines_agree(line):
+    fields = extract_log_fields(line.encode('utf-8'))
+    entry = parse_log_line_json(line)
+    assert fields is not None and entry is not None
+    direction, time_ms, _, data_hex = decode_log_line(line)
+    assert fields == (direction, time_ms, data_hex.strip())
+    assert entry['timestamp_ms'] == time_ms and entry['data'] == data_hex.strip()
+
+
+@pytest.mark.parametrize('line', MALFORMED)
+def test_malformed_lines_rejected_everywhere(line):
+    assert extract_log_fields(line.encode('utf-8')) is None
+    assert parse_log_line_json(line) is None
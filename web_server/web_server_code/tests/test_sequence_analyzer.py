@@ -0,0 +1,76 @@
+"""序号分析的内存上限：窗口深度桶宽随抓包时长加倍，分析状态按文件数淘汰"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import sequence_analyzer  # noqa: E402
+from sequence_analyzer import SequenceAnalyzer  # noqa: E402
+
+
+def _feed_seconds(analyzer: SequenceAnalyzer, seconds: int) -> None:
+    """每秒一个 TX I帧，第 i 秒未确认深度为 i % 5 + 1"""
+    ns = 0
+    for second in range(seconds):
+        time_ms = 1762852273000 + second * 1000
+        acked = max(0, ns - second % 5)
+        analyzer.feed('RX', 'S', -1, acked, None, time_ms, 2 * second + 1)
+        analyzer.feed('TX', 'I', ns, 0, None, time_ms, 2 * second + 2)
+        ns += 1
+
+
+def test_window_is_per_second_below_limit():
+    analyzer = SequenceAnalyzer(max_window_buckets=100)
+    analyzer.feed('RX', 'U', -1, -1, 0x07, 1762852273000, 0)
+    _feed_seconds(analyzer, 50)
+    result = analyzer.summary(include_window=True)
+    assert result['window_ms'] == 1000
+    assert len(result['window']) == 50
+
+
+def test_window_coarsens_and_keeps_max_depth():
+    fine = SequenceAnalyzer(max_window_buckets=10 ** 6)
+    coarse = SequenceAnalyzer(max_window_buckets=64)
+    for analyzer in (fine, coarse):
+        analyzer.feed('RX', 'U', -1, -1, 0x07, 1762852273000, 0)
+        _feed_seconds(analyzer, 1000)
+
+    assert len(coarse.window) <= 64
+    width = coarse.window_ms // 1000
+    assert width > 1 and width & (width - 1) == 0
+    expected = {}
+    for second, (tx, rx) in fine.window.items():
+        bucket = expected.setdefault(second // width, [0, 0])
+        bucket[0], bucket[1] = max(bucket[0], tx), max(bucket[1], rx)
+    assert coarse.window == expected
+    assert coarse.summary()['directions'] == fine.summary()['directions']
+
+
+class _Analysis:
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    def refresh(self):
+        return self
+
+
+def test_analyses_evicted_by_count_and_missing_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(sequence_analyzer, 'SequenceAnalysis', _Analysis)
+    monkeypatch.setattr(sequence_analyzer, '_analyses', sequence_analyzer.OrderedDict())
+    monkeypatch.setattr(config, 'SEQUENCE_MAX_FILES', 3)
+    paths = []
+    for i in range(4):
+        path = tmp_path / f'{i}.log'
+        path.write_text('')
+        paths.append(str(path))
+
+    for path in paths[:3]:
+        sequence_analyzer.get_sequence_analysis(path)
+    sequence_analyzer.get_sequence_analysis(paths[0])  # 0 变为最近使用
+    sequence_analyzer.get_sequence_analysis(paths[3])
+    assert list(sequence_analyzer._analyses) == [paths[2], paths[0], paths[3]]
+
+    os.remove(paths[2])
+    sequence_analyzer.get_sequence_analysis(paths[3])
+    assert list(sequence_analyzer._analyses) == [paths[0], paths[3]]
@@ -0,0 +1,161 @@
+"""单个信息对象的时间序列
+
+从列式帧存储中按 (公共地址, 信息对象地址) 取出测量值序列：先用查询掩码筛选出公共地址
+匹配、类型可解码且含有该地址信息对象的I帧，再只对这些报文解码全部信息对象。
+对象带 CP56Time2a 时标时使用时标时间，否则使用日志记录时间；非有限的浮点值（NaN/Inf）被丢弃。
+序列可按目标点数降采样（LTTB、每桶最小/最大值、每桶均值），降采样按点序号等分桶。
+"""
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from frame_query import evaluate, masks
+from frame_store import FrameStore
+from iec104_parser import INFORMATION_OBJECT_LAYOUTS, decode_information_objects
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax', 'mean', 'none')
+
+Point = Tuple[int, float]
+
+
+def extract_series(store: FrameStore, asdu_addr: int, ioa: int,
+                   from_ms: Optional[int] = None,
+                   to_ms: Optional[int] = None) -> Dict[str, List[Any]]:
+    """取出信息对象的全部 (时间, 值, 品质)，按时间排序"""
+    where: Dict[str, Any] = {
+        'frame_type': 'I',
+        'asdu_addr': asdu_addr,
+        'type_id': sorted(INFORMATION_OBJECT_LAYOUTS),
+        'ioa': ioa,
+    }
+    if from_ms is not None or to_ms is not None:
+        where['time_ms'] = {'min': from_ms, 'max': to_ms}
+
+    points: List[Tuple[int, Any, int]] = []
+    type_ids = set()
+    with store.lock:
+        mask = evaluate(store, where)
+        rows = masks.select(mask, 0, masks.count(mask), False)
+        del mask
+        data = store.data
+        for row in rows:
+            payload = store.payload(row)
+            objects = decode_information_objects(payload, data.type_id[row], payload[7])
+            if not objects:
+                continue
+            for i, object_ioa in enumerate(objects['ioa']):
+                if object_ioa != ioa:
+                    continue
+                value = objects['value'][i]
+                if isinstance(value, float) and not math.isfinite(value):
+                    continue
+                time_ms = objects['time'][i]
+                if time_ms is None:
+                    time_ms = data.time_ms[row]
+                points.append((time_ms, value, objects['quality'][i]))
+                type_ids.add(data.type_id[row])
+
+    # 带时标的对象可能乱序到达
+    points.sort(key=lambda point: point[0])
+    if from_ms is not None or to_ms is not None:
+        points = [point for point in points
+                  if (from_ms is None or point[0] >= from_ms) and (to_ms is None or point[0] <= to_ms)]
+    return {
+        'time': [point[0] for point in points],
+        'value': [point[1] for point in points],
+        'quality': [point[2] for point in points],
+        'type_ids': sorted(type_ids)
+    }
+
+
+# ---------- 降采样 ----------
+
+def _buckets(size: int, count: int) -> List[Tuple[int, int]]:
+    """把 [0, size) 等分为 count 个下标区间"""
+    step = size / count
+    return [(int(i * step), int((i + 1) * step)) for i in range(count)
+            if int((i + 1) * step) > int(i * step)]
+
+
+def downsample_lttb(times: Sequence[int], values: Sequence[float], threshold: int) -> List[Point]:
+    """Largest-Triangle-Three-Buckets：保留视觉形状的降采样"""
+    size = len(times)
+    if threshold >= size or threshold < 3:
+        return list(zip(times, values))
+
+    result = [(times[0], values[0])]
+    every = (size - 2) / (threshold - 2)
+    selected = 0
+    for i in range(threshold - 2):
+        # 下一个桶的平均点
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, size)
+        avg_count = avg_end - avg_start
+        avg_time = sum(times[avg_start:avg_end]) / avg_count
+        avg_value = sum(values[avg_start:avg_end]) / avg_count
+
+        # 当前桶中与上一个选中点、下一个桶平均点构成最大三角形的点
+        point_time, point_value = times[selected], values[selected]
+        best_area = -1.0
+        best = int(i * every) + 1
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((point_time - avg_time) * (values[j] - point_value)
+                       - (point_time - times[j]) * (avg_value - point_value))
+            if area > best_area:
+                best_area = area
+                best = j
+        result.append((times[best], values[best]))
+        selected = best
+
+    result.append((times[-1], values[-1]))
+    return result
+
+
+def downsample_minmax(times: Sequence[int], values: Sequence[float], threshold: int) -> List[Point]:
+    """每桶保留最小值和最大值两个点（按时间先后），不丢失尖峰"""
+    size = len(times)
+    if threshold >= size or threshold < 2:
+        return list(zip(times, values))
+
+    result = []
+    for start, end in _buckets(size, threshold // 2):
+        low = min(range(start, end), key=values.__getitem__)
+        high = max(range(start, end), key=values.__getitem__)
+        for index in sorted({low, high}):
+            result.append((times[index], values[index]))
+    return result
+
+
+def downsample_mean(times: Sequence[int], values: Sequence[float], threshold: int) -> List[Point]:
+    """每桶一个点：桶内时间和值的平均"""
+    size = len(times)
+    if threshold >= size or threshold < 1:
+        return list(zip(times, values))
+
+    result = []
+    for start, end in _buckets(size, threshold):
+        count = end - start
+        result.append((int(sum(times[start:end]) / count), sum(values[start:end]) / count))
+    return result
+
+
+def downsample(times: Sequence[int], values: Sequence[float], threshold: int,
+               method: str = 'lttb') -> List[Point]:
+    """按方法降采样到约 threshold 个点"""
+    if method == 'none':
+        return list(zip(times, values))
+    if method == 'minmax':
+        return downsample_minmax(times, values, threshold)
+    if method == 'mean':
+        return downsample_mean(times, values, threshold)
+    return downsample_lttb(times, values, threshold)
+
+
+def series_summary(values: Sequence[float]) -> Dict[str, Any]:
+    """原始序列的最小/最大/平均值"""
+    if not values:
+        return {'min': None, 'max': None, 'mean': None}
+    return {
+        'min': min(values),
+        'max': max(values),
+        'mean': round(sum(values) / len(values), 6)
+    }